@@ -57,6 +57,7 @@ app.lock = lock # Attach the lock object
 app.scheduler = scheduler # Attach the scheduler object
 app.status_messages = status_messages # Attach the actual status list
 app.shared_state = shared_state # Attach the shared state dictionary
+app.browser_pool = None # BrowserPool when config.BROWSER_POOL is on (created at start-up below)
 
 # --- Import Blueprints AFTER app is created and configured ---
 from blueprints.email.routes_email import email_bp
@@ -148,7 +149,15 @@ def index():
         'index.html',
         templates={},
         default_email=getattr(config, 'DEFAULT_EMAIL', ''),
-        default_password=getattr(config, 'DEFAULT_PASSWORD', '')
+        default_password=getattr(config, 'DEFAULT_PASSWORD', ''),
+        # Per-run option defaults from config/env: the form starts from them and only sends what the user changed
+        default_tabs=config.DOWNLOAD_TABS,
+        run_flag_defaults={
+            'pipeline': config.DOWNLOAD_PIPELINE, 'reuse_page': config.REUSE_REPORT_PAGE,
+            'fast_fill': config.FAST_FORM_FILL, 'http_export': config.HTTP_EXPORT,
+            'lean_profile': config.LEAN_BROWSER_PROFILE, 'persistent_profile': config.PERSISTENT_BROWSER_PROFILE,
+            'reuse_session': config.SESSION_STORE, 'session_keepalive': config.SESSION_KEEPALIVE,
+        }
     )
 
 # --- Download Routes Moved to blueprints/download.py ---
@@ -185,6 +194,51 @@ if __name__ == '__main__':
             print(f"CRITICAL ERROR: Failed to start APScheduler: {e}")
             traceback.print_exc()
 
+    # Orphaned Browser Reaper (before any browser starts)
+    import process_registry
+    process_registry.init_registry(config.PROCESS_REGISTRY_PATH).start_reaper(config.PROCESS_REAP_MINUTES * 60)
+
+    # Known-Empty Export Cache
+    if config.EMPTY_RANGE_CACHE:
+        import empty_range_cache
+        cache = empty_range_cache.init_empty_cache(config.EMPTY_RANGE_CACHE_PATH, closed_days=config.EMPTY_RANGE_CLOSED_DAYS,
+                                                   max_age_days=config.EMPTY_RANGE_MAX_AGE_DAYS)
+        print(f"Empty range cache: {len(cache)} known empty export(s) in {config.EMPTY_RANGE_CACHE_PATH}.")
+
+    # Adaptive Chunk Planner (chunk size "auto")
+    if config.CHUNK_PLANNER:
+        import chunk_planner
+        chunk_planner.init_chunk_planner(config.CHUNK_PLANNER_PATH, target_seconds=config.CHUNK_TARGET_SECONDS,
+                                         target_mb=config.CHUNK_TARGET_MB, min_days=config.CHUNK_MIN_DAYS,
+                                         max_days=config.CHUNK_MAX_DAYS)
+        print(f"Chunk planner: target {config.CHUNK_TARGET_SECONDS}s per export, costs in {config.CHUNK_PLANNER_PATH}.")
+
+    # Click Strategy Cache
+    if config.CLICK_STRATEGY_CACHE:
+        import click_strategy_cache
+        click_cache = click_strategy_cache.init_click_cache(config.CLICK_STRATEGY_CACHE_PATH, max_age_days=config.CLICK_STRATEGY_MAX_AGE_DAYS)
+        print(f"Click strategy cache: {len(click_cache)} known button(s) in {config.CLICK_STRATEGY_CACHE_PATH}.")
+
+    # Warm Browser Pool
+    if config.BROWSER_POOL:
+        from browser_pool import BrowserPool
+        app.browser_pool = BrowserPool(
+            config.DRIVER_PATH, os.path.join(config.DOWNLOAD_BASE_PATH, '_browser_pool'),
+            max_size=config.BROWSER_POOL_SIZE, idle_timeout=config.BROWSER_POOL_IDLE_MINUTES * 60
+        )
+        atexit.register(app.browser_pool.shutdown)
+        if config.BROWSER_POOL_PREWARM > 0:
+            from blueprints.download import resolve_browser_options
+            # Same options a run gets with the default settings, so its lease matches these browsers
+            launch_options, session_store = resolve_browser_options({}, log_func=lambda message: None)
+            login_params = None
+            if config.BROWSER_POOL_PREAUTH and config.OTP_SECRET:
+                login_params = {'login_url': config.REPORTS[0]['url'], 'email': config.DEFAULT_EMAIL,
+                                'password': config.DEFAULT_PASSWORD, 'otp_secret': config.OTP_SECRET,
+                                'session_store': session_store}
+            app.browser_pool.prewarm(config.BROWSER_POOL_PREWARM, launch_options, login_params=login_params)
+        print(f"Browser pool enabled (max {config.BROWSER_POOL_SIZE} browsers).")
+
     # Run Flask App
     print("Starting Flask application...")
     HOST = '127.0.0.1'
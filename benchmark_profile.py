@@ -0,0 +1,111 @@
+# filename: benchmark_profile.py
+"""
+Compares the standard browser profile with the lean profile (headless, eager page loads,
+blocked images/fonts/analytics) on the real report site.
+
+For every profile it measures Chrome start-up, login, N fresh loads of the report page and
+the full time of each date chunk (fill + export + download + rename), then prints a table.
+
+Example:
+    python benchmark_profile.py --report "FAF002 - Dosage Report" --from 2024-01-01 --to 2024-01-05 --chunk-size 1
+"""
+import os
+import time
+import argparse
+import statistics
+from datetime import datetime
+
+import config
+import link_report
+from logic_download import WebAutomation, split_date_range
+
+PROFILES = {
+    'standard': {'lean_profile': False},
+    'lean': {'lean_profile': True},
+}
+
+
+def make_logger(verbose):
+    """Prints everything with --verbose, otherwise only warnings and errors."""
+    def log(message):
+        if verbose or 'ERROR' in message or 'WARNING' in message.upper():
+            print(f"    {message}")
+    return log
+
+
+def summarize(samples):
+    if not samples:
+        return "-"
+    return f"{statistics.median(samples):.1f}s med / {statistics.mean(samples):.1f}s avg (n={len(samples)})"
+
+
+def benchmark_profile(name, options, args, report_url, date_ranges):
+    log = make_logger(args.verbose)
+    run_folder = os.path.join(config.DOWNLOAD_BASE_PATH, f"_benchmark_{name}_{datetime.now().strftime('%Y%m%d%H%M%S')}")
+    os.makedirs(run_folder, exist_ok=True)
+    result = {'profile': name, 'startup': None, 'login': None, 'page_loads': [], 'chunks': [], 'chunk_ok': 0}
+    print(f"\n== Profile '{name}' (files in {run_folder}) ==")
+
+    started = time.time()
+    automation = WebAutomation(config.DRIVER_PATH, run_folder, status_callback=log, **options)
+    result['startup'] = time.time() - started
+    try:
+        started = time.time()
+        if not automation.login(report_url, args.email, args.password, config.OTP_SECRET, status_callback=log):
+            print("    Login failed; skipping this profile.")
+            return result
+        result['login'] = time.time() - started
+
+        for sample in range(args.loads):
+            automation._page_state.clear() # Force a real navigation
+            started = time.time()
+            automation._open_report_page(report_url, log)
+            result['page_loads'].append(time.time() - started)
+            print(f"    page load {sample + 1}/{args.loads}: {result['page_loads'][-1]:.1f}s")
+
+        for from_date, to_date in date_ranges:
+            started = time.time()
+            ok = automation.download_generic_report(report_url, from_date, to_date, status_callback=log)
+            result['chunks'].append(time.time() - started)
+            result['chunk_ok'] += 1 if ok else 0
+            print(f"    chunk {from_date} -> {to_date}: {result['chunks'][-1]:.1f}s ({'ok' if ok else 'FAILED'})")
+    finally:
+        automation.close()
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark standard vs lean browser profile.")
+    parser.add_argument('--report', default="FAF002 - Dosage Report", help="Report type key (see link_report.py)")
+    parser.add_argument('--from', dest='from_date', required=True, help="Start date YYYY-MM-DD")
+    parser.add_argument('--to', dest='to_date', required=True, help="End date YYYY-MM-DD")
+    parser.add_argument('--chunk-size', default='1', help="Days per chunk or 'month'")
+    parser.add_argument('--loads', type=int, default=5, help="Fresh report page loads per profile")
+    parser.add_argument('--profiles', default='standard,lean', help="Comma separated: " + ", ".join(PROFILES))
+    parser.add_argument('--email', default=config.DEFAULT_EMAIL)
+    parser.add_argument('--password', default=config.DEFAULT_PASSWORD)
+    parser.add_argument('--verbose', action='store_true', help="Print every automation status message")
+    args = parser.parse_args()
+
+    report_url = link_report.get_report_url(args.report)
+    if not report_url:
+        parser.error(f"Unknown report type '{args.report}'.")
+    chunk_size = args.chunk_size if args.chunk_size == 'month' else int(args.chunk_size)
+    date_ranges = split_date_range(args.from_date, args.to_date, chunk_size)
+
+    results = []
+    for name in [p.strip() for p in args.profiles.split(',') if p.strip()]:
+        if name not in PROFILES:
+            parser.error(f"Unknown profile '{name}'.")
+        results.append(benchmark_profile(name, PROFILES[name], args, report_url, date_ranges))
+
+    print("\n== Results ==")
+    for result in results:
+        login = f"{result['login']:.1f}s" if result['login'] is not None else "failed"
+        print(f"{result['profile']:>9}: start-up {result['startup']:.1f}s, login {login}")
+        print(f"{'':>9}  page load: {summarize(result['page_loads'])}")
+        print(f"{'':>9}  per chunk: {summarize(result['chunks'])}, {result['chunk_ok']}/{len(result['chunks'])} ok")
+
+
+if __name__ == '__main__':
+    main()
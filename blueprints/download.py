@@ -18,6 +18,11 @@ import numpy as np
 import config
 import link_report
 from logic_download import WebAutomation, regions_data, DownloadFailedException # Added
+from download_pool import DownloadWorkerPool, build_download_tasks
+from concurrency import AdaptiveConcurrency
+from session_store import SessionStore
+from login_broker import LoginBroker
+from process_registry import get_registry
 from utils import load_configs, save_configs, stream_status_update # Import from utils
 
 # --- Remove direct import from app --- 
@@ -35,11 +40,144 @@ download_bp = Blueprint('download', __name__, url_prefix='/download')
 # Ví dụ: stream_status_update, load_configs, save_configs có thể ở module riêng
 
 # --- Download Process Function (Uses current_app) ---
+def parse_chunk_size(chunk_size_str, report_type_key=""):
+    """Converts the UI chunk size ('5', 'month', 'auto', ...) into the value split_date_range expects ('auto' is resolved per report by the chunk planner)."""
+    chunk_size = 5
+    try:
+        if isinstance(chunk_size_str, str) and chunk_size_str.strip().lower() in ('month', 'auto'):
+            chunk_size = chunk_size_str.strip().lower()
+        elif chunk_size_str:
+            chunk_size_days = int(chunk_size_str)
+            chunk_size = chunk_size_days if chunk_size_days > 0 else 5
+    except (ValueError, TypeError):
+        stream_status_update(f"Warning: Invalid chunk size '{chunk_size_str}' for '{report_type_key}'. Using default: 5 days.")
+        chunk_size = 5
+    return chunk_size
+
+def parse_run_count(value, default, maximum, label):
+    """Reads a per-run positive integer option (workers, tabs), clamped to [1, maximum]."""
+    try:
+        count = int(value) if value not in (None, '') else default
+    except (ValueError, TypeError):
+        stream_status_update(f"Warning: Invalid {label} '{value}'. Using default: {default}.")
+        count = default
+    return max(1, min(count, maximum))
+
+def parse_run_flag(value, default):
+    """Reads a per-run on/off option sent as bool or string ('true', '1', 'on')."""
+    if value in (None, ''):
+        return default
+    if isinstance(value, str):
+        return value.strip().lower() in ('1', 'true', 'yes', 'on')
+    return bool(value)
+
+def resolve_browser_options(params, log_func=stream_status_update):
+    """
+    WebAutomation options shared by every browser of a run (profile, download tracking, keepalive,
+    recycling, stall limits, time and retry budgets) and the SessionStore, from the per-run flags with config defaults.
+    Returns (launch_options, session_store).
+    """
+    lean_profile = parse_run_flag(params.get('lean_profile'), config.LEAN_BROWSER_PROFILE)
+    launch_options = {'lean_profile': lean_profile, 'download_events': config.DOWNLOAD_EVENTS,
+                      'recycle_after_downloads': config.BROWSER_RECYCLE_DOWNLOADS, 'recycle_rss_mb': config.BROWSER_RECYCLE_RSS_MB,
+                      'stall_timeout': config.DOWNLOAD_STALL_SECONDS, 'start_timeout': config.DOWNLOAD_START_SECONDS,
+                      'stall_retries': config.DOWNLOAD_STALL_RETRIES,
+                      'step_budget': config.STEP_BUDGET_SECONDS, 'chunk_budget': config.CHUNK_BUDGET_SECONDS,
+                      'retry_run_limit': config.RETRY_RUN_LIMIT, 'retry_chunk_limit': config.RETRY_CHUNK_LIMIT}
+    if lean_profile:
+        log_func("Lean browser profile enabled: headless Chrome, eager page loads, images/fonts/analytics blocked.")
+    if parse_run_flag(params.get('persistent_profile'), config.PERSISTENT_BROWSER_PROFILE):
+        launch_options.update(profile_dir=config.BROWSER_PROFILE_DIR, profile_size_cap_mb=config.BROWSER_PROFILE_SIZE_CAP_MB)
+        log_func(f"Persistent browser profiles enabled ({config.BROWSER_PROFILE_DIR}).")
+    session_store = None
+    if parse_run_flag(params.get('reuse_session'), config.SESSION_STORE):
+        session_store = SessionStore(config.SESSION_STORE_DIR, ttl_seconds=config.SESSION_TTL_MINUTES * 60)
+        log_func(f"Session reuse enabled: a saved login younger than {config.SESSION_TTL_MINUTES} min is reused without OTP.")
+    if parse_run_flag(params.get('session_keepalive'), config.SESSION_KEEPALIVE):
+        launch_options['session_monitor_options'] = {
+            'keepalive_url': config.SESSION_KEEPALIVE_URL,
+            'keepalive_interval': config.SESSION_KEEPALIVE_SECONDS,
+            'idle_timeout': config.SESSION_IDLE_TIMEOUT_MINUTES * 60,
+            'max_age': config.SESSION_MAX_AGE_MINUTES * 60,
+            'reauth_margin': config.SESSION_REAUTH_MARGIN_SECONDS,
+        }
+        log_func(f"Session keepalive enabled: ping every {config.SESSION_KEEPALIVE_SECONDS}s when idle, re-login ahead of expiry.")
+    return launch_options, session_store
+
+def run_with_worker_pool(params, download_folder, worker_count, automation_options=None, session_store=None, run_deadline=None):
+    """Expands all reports into (report, chunk, region) tasks and runs them on a worker pool."""
+    reports_to_download = params.get('reports', [])
+    selected_regions = params.get('regions', [])
+    tasks = []
+    all_ok = True
+
+    for report_info in reports_to_download:
+        report_type_key = report_info.get('report_type')
+        from_date = report_info.get('from_date')
+        to_date = report_info.get('to_date')
+        if not all([report_type_key, from_date, to_date]):
+            stream_status_update(f"Warning: Skipping report entry due to missing info: {report_info}")
+            all_ok = False
+            continue
+        report_url = link_report.get_report_url(report_type_key)
+        if not report_url:
+            stream_status_update(f"Error: Could not find URL for report type '{report_type_key}'. Skipping.")
+            all_ok = False
+            continue
+
+        region_indices = None
+        if report_url in config.REGION_REQUIRED_REPORT_URLS:
+            try:
+                region_indices = [int(idx) for idx in selected_regions]
+            except (ValueError, TypeError) as region_err:
+                region_indices = []
+                stream_status_update(f"Error processing region indices for '{report_type_key}': {region_err}.")
+            if not region_indices:
+                stream_status_update(f"Error: Report '{report_type_key}' requires region selection, but none provided. Skipping.")
+                all_ok = False
+                continue
+
+        chunk_size = parse_chunk_size(report_info.get('chunk_size', '5'), report_type_key)
+        report_tasks = build_download_tasks(report_type_key, report_url, from_date, to_date, chunk_size,
+                                            region_indices=region_indices, log_func=stream_status_update)
+        stream_status_update(f"Queued {len(report_tasks)} task(s) for '{report_type_key}' ({from_date} to {to_date}, chunk: {chunk_size}).")
+        tasks.extend(report_tasks)
+
+    if not tasks:
+        stream_status_update("Warning: No download tasks to run.")
+        return False
+
+    concurrency = None
+    if config.ADAPTIVE_CONCURRENCY and worker_count > 1:
+        concurrency = AdaptiveConcurrency(worker_count, cooldown=config.CIRCUIT_BREAKER_COOLDOWN_SECONDS, log_func=stream_status_update)
+        stream_status_update(f"Adaptive concurrency enabled: starting with {int(concurrency.limit)} of {worker_count} exports in flight.")
+
+    first_report_url = tasks[0]['report_url']
+    pool = DownloadWorkerPool(
+        config.DRIVER_PATH, download_folder, worker_count,
+        login_params={
+            'login_url': first_report_url,
+            'email': params['email'],
+            'password': params['password'],
+            'otp_secret': config.OTP_SECRET,
+        },
+        status_callback=stream_status_update,
+        app=current_app._get_current_object(),
+        automation_options=automation_options,
+        session_store=session_store,
+        browser_pool=getattr(current_app, 'browser_pool', None),
+        run_deadline=run_deadline,
+        concurrency=concurrency
+    )
+    summary = pool.run(tasks)
+    return all_ok and summary['failed'] == 0
+
 def run_download_process(params):
     """Main download function executed in a background thread."""
     # --- Remove global usage ---
     # global is_running, status_messages, lock 
     automation = None
+    browser_pool = None
     process_successful = True
 
     try:
@@ -75,10 +213,57 @@ def run_download_process(params):
             stream_status_update(f"Download folder for this run: {specific_download_folder}")
         except OSError as e:
             raise RuntimeError(f"Failed to create download directory '{specific_download_folder}': {e}")
+        get_registry().start_run(f"{timestamp_folder}-{datetime.now().strftime('%H%M%S')}", specific_download_folder)
+
+        launch_options, session_store = resolve_browser_options(params)
+        browser_pool = getattr(current_app, 'browser_pool', None)
+        run_deadline = time.time() + config.RUN_BUDGET_MINUTES * 60 if config.RUN_BUDGET_MINUTES > 0 else None
+        if run_deadline:
+            stream_status_update(f"Run time budget: {config.RUN_BUDGET_MINUTES} min.")
+
+        # --- Run Options ---
+        tab_count = parse_run_count(params.get('tabs'), config.DOWNLOAD_TABS, config.MAX_DOWNLOAD_TABS, "tab count")
+        pipeline = parse_run_flag(params.get('pipeline'), config.DOWNLOAD_PIPELINE)
+        reuse_page = parse_run_flag(params.get('reuse_page'), config.REUSE_REPORT_PAGE)
+        if reuse_page:
+            stream_status_update("Page reuse enabled: report pages are loaded once and only the form is rewritten per chunk.")
+        fast_fill = parse_run_flag(params.get('fast_fill'), config.FAST_FORM_FILL)
+        if fast_fill:
+            stream_status_update("Scripted form fill enabled: form is filled and exported with one browser script per chunk.")
+        http_export = parse_run_flag(params.get('http_export'), config.HTTP_EXPORT)
+
+        # --- Parallel Mode: one browser per worker, tasks from a shared queue ---
+        worker_count = parse_run_count(params.get('workers'), config.DOWNLOAD_WORKERS, config.MAX_DOWNLOAD_WORKERS, "worker count")
+        if worker_count > 1:
+            if not config.OTP_SECRET:
+                raise ValueError("OTP_SECRET is not configured.")
+            stream_status_update(f"Running with {worker_count} parallel browser workers.")
+            # Workers export one (report, chunk, region) task at a time, so the chunk-loop modes do not apply
+            ignored = [name for name, enabled in (("tabs", tab_count > 1), ("pipeline", pipeline), ("HTTP export", http_export)) if enabled]
+            if ignored:
+                stream_status_update(f"Warning: {', '.join(ignored)} not used with parallel workers (each worker exports one chunk at a time).")
+            pool_options = dict(launch_options, reuse_page=reuse_page, fast_fill=fast_fill)
+            if not run_with_worker_pool(params, specific_download_folder, worker_count, automation_options=pool_options, session_store=session_store, run_deadline=run_deadline):
+                process_successful = False
+            return # finally block reports and resets state
 
         # --- Initialize Automation ---
         stream_status_update("Initializing browser automation...")
-        automation = WebAutomation(config.DRIVER_PATH, specific_download_folder, status_callback=stream_status_update)
+        if tab_count > 1:
+            stream_status_update(f"Concurrent exports enabled: {tab_count} tabs in one browser session.")
+        if pipeline:
+            stream_status_update("Pipelined exports enabled: next chunk starts while the previous file downloads.")
+        if http_export:
+            stream_status_update(f"HTTP export enabled: chunks are exported directly over HTTP ({config.HTTP_EXPORT_WORKERS} at a time), browser as fallback.")
+        automation_options = dict(launch_options, tab_count=tab_count, pipeline=pipeline, reuse_page=reuse_page, fast_fill=fast_fill,
+                                  http_export=http_export, http_export_workers=config.HTTP_EXPORT_WORKERS)
+        if browser_pool:
+            automation = browser_pool.lease(specific_download_folder, options=automation_options, status_callback=stream_status_update)
+        else:
+            automation = WebAutomation(config.DRIVER_PATH, specific_download_folder, status_callback=stream_status_update, **automation_options)
+        automation.wait_stats.reset() # A pooled browser carries the totals of its previous run
+        automation.deadlines.reset(run_deadline)
+        automation.retry_budget.reset()
 
         # --- Login ---
         stream_status_update(f"Logging in with user: {email}...")
@@ -89,7 +274,9 @@ def run_download_process(params):
         if not config.OTP_SECRET:
             raise ValueError("OTP_SECRET is not configured.")
 
-        if not automation.login(first_report_url, email, password, config.OTP_SECRET, status_callback=stream_status_update):
+        login_broker = LoginBroker(first_report_url, email, password, config.OTP_SECRET,
+                                   session_store=session_store, log_func=stream_status_update)
+        if not login_broker.attach(automation, stream_status_update):
             raise RuntimeError("Login failed after multiple attempts. Cannot proceed.")
         stream_status_update("Login successful.")
 
@@ -105,16 +292,7 @@ def run_download_process(params):
                  process_successful = False
                  continue
 
-            chunk_size = 5
-            try:
-                if isinstance(chunk_size_str, str) and chunk_size_str.lower() == 'month':
-                    chunk_size = 'month'
-                elif chunk_size_str:
-                    chunk_size_days = int(chunk_size_str)
-                    chunk_size = chunk_size_days if chunk_size_days > 0 else 5
-            except (ValueError, TypeError):
-                stream_status_update(f"Warning: Invalid chunk size '{chunk_size_str}' for '{report_type_key}'. Using default: 5 days.")
-                chunk_size = 5
+            chunk_size = parse_chunk_size(chunk_size_str, report_type_key)
 
             report_url = link_report.get_report_url(report_type_key)
             if not report_url:
@@ -127,50 +305,51 @@ def run_download_process(params):
 
             report_failed = False
             try:
-                if report_url in config.REGION_REQUIRED_REPORT_URLS:
-                    if not selected_regions_indices_str:
-                        stream_status_update(f"Error: Report '{report_type_key}' requires region selection, but none provided. Skipping.")
-                        report_failed = True
-                    else:
-                        try:
-                            selected_regions_indices_int = [int(idx) for idx in selected_regions_indices_str]
-                            region_names = [regions_data[i]['name'] for i in selected_regions_indices_int if i in regions_data]
-                            stream_status_update(f"Downloading '{report_type_key}' for regions: {', '.join(region_names)}")
-
-                            if hasattr(automation, 'download_reports_for_all_regions'):
-                                automation.download_reports_for_all_regions(
-                                    report_url, from_date, to_date, chunk_size,
-                                    region_indices=selected_regions_indices_int,
-                                    status_callback=stream_status_update
-                                )
-                            else:
-                                stream_status_update("ERROR: 'download_reports_for_all_regions' method missing.")
-                                report_failed = True
-                        except (ValueError, TypeError, KeyError) as region_err:
-                            stream_status_update(f"Error processing region indices for '{report_type_key}': {region_err}. Skipping.")
+                with automation.deadlines.scope(f"report {report_type_key}", config.REPORT_BUDGET_MINUTES * 60):
+                    if report_url in config.REGION_REQUIRED_REPORT_URLS:
+                        if not selected_regions_indices_str:
+                            stream_status_update(f"Error: Report '{report_type_key}' requires region selection, but none provided. Skipping.")
                             report_failed = True
-                elif report_type_key == "FAF001 - Sales Report" and hasattr(automation, 'download_reports_in_chunks_1'):
-                    automation.download_reports_in_chunks_1(report_url, from_date, to_date, chunk_size, stream_status_update)
-                elif report_type_key == "FAF004N - Internal Rotation Report (Imports)" and hasattr(automation, 'download_reports_in_chunks_4n'):
-                     automation.download_reports_in_chunks_4n(report_url, from_date, to_date, chunk_size, stream_status_update)
-                elif report_type_key == "FAF004X - Internal Rotation Report (Exports)" and hasattr(automation, 'download_reports_in_chunks_4x'):
-                     automation.download_reports_in_chunks_4x(report_url, from_date, to_date, chunk_size, stream_status_update)
-                elif report_type_key == "FAF002 - Dosage Report" and hasattr(automation, 'download_reports_in_chunks_2'):
-                     automation.download_reports_in_chunks_2(report_url, from_date, to_date, chunk_size, stream_status_update)
-                elif report_type_key == "FAF003 - Report Of Other Imports And Exports" and hasattr(automation, 'download_reports_in_chunks_3'):
-                     automation.download_reports_in_chunks_3(report_url, from_date, to_date, chunk_size, stream_status_update)
-                elif report_type_key == "FAF005 - Detailed Report Of Imports" and hasattr(automation, 'download_reports_in_chunks_5'):
-                     automation.download_reports_in_chunks_5(report_url, from_date, to_date, chunk_size, stream_status_update)
-                elif report_type_key == "FAF006 - Supplier Return Report" and hasattr(automation, 'download_reports_in_chunks_6'):
-                     automation.download_reports_in_chunks_6(report_url, from_date, to_date, chunk_size, stream_status_update)
-                elif report_type_key == "FAF028 - Detailed Import - Export Transaction Report" and hasattr(automation, 'download_reports_in_chunks_28'):
-                     automation.download_reports_in_chunks_28(report_url, from_date, to_date, chunk_size, stream_status_update)
-                elif hasattr(automation, 'download_reports_in_chunks'):
-                    stream_status_update(f"Using generic chunking download logic for '{report_type_key}'.")
-                    automation.download_reports_in_chunks(report_url, from_date, to_date, chunk_size, stream_status_update)
-                else:
-                    stream_status_update(f"ERROR: No suitable download method found for report type '{report_type_key}'. Skipping.")
-                    report_failed = True
+                        else:
+                            try:
+                                selected_regions_indices_int = [int(idx) for idx in selected_regions_indices_str]
+                                region_names = [regions_data[i]['name'] for i in selected_regions_indices_int if i in regions_data]
+                                stream_status_update(f"Downloading '{report_type_key}' for regions: {', '.join(region_names)}")
+
+                                if hasattr(automation, 'download_reports_for_all_regions'):
+                                    automation.download_reports_for_all_regions(
+                                        report_url, from_date, to_date, chunk_size,
+                                        region_indices=selected_regions_indices_int,
+                                        status_callback=stream_status_update
+                                    )
+                                else:
+                                    stream_status_update("ERROR: 'download_reports_for_all_regions' method missing.")
+                                    report_failed = True
+                            except (ValueError, TypeError, KeyError) as region_err:
+                                stream_status_update(f"Error processing region indices for '{report_type_key}': {region_err}. Skipping.")
+                                report_failed = True
+                    elif report_type_key == "FAF001 - Sales Report" and hasattr(automation, 'download_reports_in_chunks_1'):
+                        automation.download_reports_in_chunks_1(report_url, from_date, to_date, chunk_size, stream_status_update)
+                    elif report_type_key == "FAF004N - Internal Rotation Report (Imports)" and hasattr(automation, 'download_reports_in_chunks_4n'):
+                         automation.download_reports_in_chunks_4n(report_url, from_date, to_date, chunk_size, stream_status_update)
+                    elif report_type_key == "FAF004X - Internal Rotation Report (Exports)" and hasattr(automation, 'download_reports_in_chunks_4x'):
+                         automation.download_reports_in_chunks_4x(report_url, from_date, to_date, chunk_size, stream_status_update)
+                    elif report_type_key == "FAF002 - Dosage Report" and hasattr(automation, 'download_reports_in_chunks_2'):
+                         automation.download_reports_in_chunks_2(report_url, from_date, to_date, chunk_size, stream_status_update)
+                    elif report_type_key == "FAF003 - Report Of Other Imports And Exports" and hasattr(automation, 'download_reports_in_chunks_3'):
+                         automation.download_reports_in_chunks_3(report_url, from_date, to_date, chunk_size, stream_status_update)
+                    elif report_type_key == "FAF005 - Detailed Report Of Imports" and hasattr(automation, 'download_reports_in_chunks_5'):
+                         automation.download_reports_in_chunks_5(report_url, from_date, to_date, chunk_size, stream_status_update)
+                    elif report_type_key == "FAF006 - Supplier Return Report" and hasattr(automation, 'download_reports_in_chunks_6'):
+                         automation.download_reports_in_chunks_6(report_url, from_date, to_date, chunk_size, stream_status_update)
+                    elif report_type_key == "FAF028 - Detailed Import - Export Transaction Report" and hasattr(automation, 'download_reports_in_chunks_28'):
+                         automation.download_reports_in_chunks_28(report_url, from_date, to_date, chunk_size, stream_status_update)
+                    elif hasattr(automation, 'download_reports_in_chunks'):
+                        stream_status_update(f"Using generic chunking download logic for '{report_type_key}'.")
+                        automation.download_reports_in_chunks(report_url, from_date, to_date, chunk_size, stream_status_update)
+                    else:
+                        stream_status_update(f"ERROR: No suitable download method found for report type '{report_type_key}'. Skipping.")
+                        report_failed = True
 
             except DownloadFailedException as report_err:
                  stream_status_update(f"ERROR downloading report {report_type_key}: {report_err}")
@@ -209,7 +388,13 @@ def run_download_process(params):
         process_successful = False
 
     finally:
-        if automation:
+        run_metrics = get_registry().finish_run() # Before the browser closes, so its last CPU/memory sample counts
+        wait_summary = automation.wait_stats.describe() if automation else None
+        retry_summary = automation.retry_budget.describe() if automation else None
+        if automation and browser_pool:
+            stream_status_update("Returning browser to the pool...")
+            browser_pool.release(automation)
+        elif automation:
             try:
                 stream_status_update("Attempting to close browser...")
                 automation.close()
@@ -224,6 +409,13 @@ def run_download_process(params):
         else:
              final_message += " Check logs and CSV file for individual report status."
         stream_status_update(f"--- {final_message} ---")
+        if run_metrics:
+            stream_status_update(f"Run resources: {run_metrics['cpu_seconds']}s browser CPU, peak {run_metrics['peak_rss_mb']} MB RSS "
+                                 f"in {run_metrics['peak_processes']} processes, {run_metrics['browsers']} browser(s).")
+        if wait_summary:
+            stream_status_update(f"Run wait time: {wait_summary}.")
+        if retry_summary:
+            stream_status_update(f"Run retry time: {retry_summary}.")
 
         try:
             # Reset running state using current_app
@@ -284,6 +476,25 @@ def trigger_scheduled_download(config_name):
         print(f"Scheduler ERROR for job '{config_name}': {e}")
         traceback.print_exc()
 
+PREWARM_JOB_SUFFIX = '_prewarm'
+
+def prewarm_scheduled_browsers(app, config_name):
+    """Runs BROWSER_POOL_LEAD_MINUTES before a scheduled job: starts (and logs in) the browsers it will lease."""
+    with app.app_context():
+        browser_pool = getattr(app, 'browser_pool', None)
+        params = load_configs().get(config_name)
+        if not browser_pool or not params:
+            return
+        launch_options, session_store = resolve_browser_options(params, log_func=lambda message: None)
+        worker_count = parse_run_count(params.get('workers'), config.DOWNLOAD_WORKERS, config.MAX_DOWNLOAD_WORKERS, "worker count")
+        login_params = None
+        first_report_url = link_report.get_report_url((params.get('reports') or [{}])[0].get('report_type'))
+        if config.BROWSER_POOL_PREAUTH and first_report_url and config.OTP_SECRET:
+            login_params = {'login_url': first_report_url, 'email': params['email'], 'password': params['password'],
+                            'otp_secret': config.OTP_SECRET, 'session_store': session_store}
+        print(f"Scheduler: Prewarming {worker_count} browser(s) for '{config_name}'.")
+        browser_pool.prewarm(worker_count, launch_options, login_params=login_params)
+
 # --- Routes (Use current_app) ---
 
 @download_bp.route('/get-reports-regions', methods=['GET'])
@@ -533,6 +744,15 @@ def schedule_job():
                 id=job_id, name=f"Download: {config_name}", replace_existing=False,
                 misfire_grace_time=600 
             )
+            browser_pool = getattr(current_app, 'browser_pool', None)
+            prewarm_at = run_datetime_naive - timedelta(minutes=config.BROWSER_POOL_LEAD_MINUTES)
+            if browser_pool and config.BROWSER_POOL_LEAD_MINUTES > 0 and prewarm_at > datetime.now():
+                scheduler.add_job(
+                    func=prewarm_scheduled_browsers, trigger=DateTrigger(run_date=prewarm_at),
+                    args=[current_app._get_current_object(), config_name],
+                    id=job_id + PREWARM_JOB_SUFFIX, name=f"Prewarm: {config_name}", replace_existing=False,
+                    misfire_grace_time=300
+                )
         current_app.logger.info(f"Successfully added job {job_id} to scheduler.")
         return jsonify({'status': 'success', 'message': f'Job scheduled for config "{config_name}".', 'job_id': job_id})
 
@@ -551,6 +771,8 @@ def get_schedules():
         with lock: 
             jobs = scheduler.get_jobs()
             for job in jobs:
+                if job.id.endswith(PREWARM_JOB_SUFFIX):
+                    continue # Internal companion of a download job (args hold the app object)
                 next_run_iso = None
                 if job.next_run_time:
                     try: 
@@ -579,6 +801,10 @@ def cancel_schedule(job_id):
         current_app.logger.info(f"Received request to cancel job: {job_id}")
         with lock: 
             scheduler.remove_job(job_id)
+            try:
+                scheduler.remove_job(job_id + PREWARM_JOB_SUFFIX)
+            except JobLookupError:
+                pass
         current_app.logger.info(f"Removed job {job_id} from scheduler.")
         return jsonify({'status': 'success', 'message': f'Job "{job_id}" cancelled.'})
     except JobLookupError:
@@ -589,6 +815,12 @@ def cancel_schedule(job_id):
         traceback.print_exc()
         return jsonify({'status': 'error', 'message': f'Failed to cancel job "{job_id}": {e}'}), 500
 
+@download_bp.route('/run-metrics', methods=['GET'])
+def get_run_metrics():
+    """CPU/memory of the browsers of the current run (so far) and of the last finished run."""
+    registry = get_registry()
+    return jsonify({'status': 'success', 'current': registry.run_metrics(), 'last': registry.last_run_metrics})
+
 @download_bp.route('/get-advanced-settings', methods=['GET'])
 def get_advanced_settings():
     return jsonify({
@@ -0,0 +1,215 @@
+# filename: browser_pool.py
+import json
+import threading
+import time
+import traceback
+
+from selenium.common.exceptions import WebDriverException
+
+from logic_download import WebAutomation
+from login_broker import LoginBroker
+
+# WebAutomation arguments fixed when Chrome starts; a pooled browser only matches a lease with the same values.
+# Everything else (tabs, pipeline, fast fill, ...) is applied per lease with apply_run_options().
+LAUNCH_OPTION_KEYS = ('lean_profile', 'download_events', 'profile_dir', 'profile_size_cap_mb', 'session_monitor_options')
+REAPER_INTERVAL = 30    # Seconds between idle checks
+WARMING_WAIT = 120      # Max seconds a lease waits for a matching browser that is still starting
+
+
+def _launch_key(options):
+    return json.dumps({key: options.get(key) for key in LAUNCH_OPTION_KEYS}, sort_keys=True, default=str)
+
+
+class BrowserPool:
+    """
+    Keeps started (and optionally logged-in) WebAutomation browsers ready so a run does not
+    pay the ChromeDriver/Chrome cold start, e.g. right at a scheduled job's start time.
+
+    prewarm() starts browsers in the background, at app start or ahead of a scheduled job.
+    lease() hands out a healthy idle browser with matching launch options, moved to the run's
+    download folder, or starts a new one when none is ready. release() returns it; browsers
+    idle longer than idle_timeout are closed by a reaper thread, which shrinks the pool.
+    """
+
+    def __init__(self, driver_path, staging_folder, max_size=4, idle_timeout=900, log_func=None):
+        """
+        Args:
+            driver_path (str): Path to ChromeDriver.
+            staging_folder (str): Download folder of browsers waiting in the pool.
+            max_size (int, optional): Most browsers kept (idle + starting + leased); extra ones are closed on release.
+            idle_timeout (int, optional): Seconds an idle browser is kept before it is closed.
+            log_func (function, optional): Pool status messages (console by default).
+        """
+        self.driver_path = driver_path
+        self.staging_folder = staging_folder
+        self.max_size = max(1, int(max_size))
+        self.idle_timeout = int(idle_timeout)
+        self._log = log_func or (lambda message: print(f"[BrowserPool] {message}"))
+        self._cond = threading.Condition()
+        self._idle = []      # [(launch key, WebAutomation, idle since)]
+        self._warming = {}   # launch key -> browsers still starting
+        self._leased = set()
+        self._closed = False
+        self.stats = {'leased_warm': 0, 'leased_cold': 0, 'started': 0, 'closed_idle': 0}
+        self._reaper = threading.Thread(target=self._reap_loop, name="browser-pool-reaper", daemon=True)
+        self._reaper.start()
+
+    def _size(self):
+        return len(self._idle) + len(self._leased) + sum(self._warming.values())
+
+    # --- Prewarm ---
+    def prewarm(self, count, launch_options=None, login_params=None):
+        """
+        Starts up to count browsers in the background (never more than max_size in total).
+        With login_params (login_url, email, password, otp_secret, session_store) they also log in:
+        the first one does the OTP login and the others get its cookies through a LoginBroker.
+        """
+        launch_options = {key: value for key, value in (launch_options or {}).items() if key in LAUNCH_OPTION_KEYS}
+        key = _launch_key(launch_options)
+        with self._cond:
+            count = min(int(count), self.max_size - self._size())
+            if count <= 0:
+                return 0
+            self._warming[key] = self._warming.get(key, 0) + count
+        broker = LoginBroker(log_func=self._log, **login_params) if login_params else None
+        for _ in range(count):
+            threading.Thread(target=self._start_browser, args=(key, launch_options, broker), name="browser-pool-prewarm", daemon=True).start()
+        self._log(f"Prewarming {count} browser(s){' with login' if broker else ''}.")
+        return count
+
+    def _start_browser(self, key, launch_options, broker):
+        automation = None
+        try:
+            started = time.time()
+            automation = WebAutomation(self.driver_path, self.staging_folder, status_callback=self._log, **launch_options)
+            if broker and not broker.attach(automation, self._log):
+                self._log("Warning: Prewarmed browser could not log in. Keeping it logged out.")
+            automation.login_broker = None # Each run attaches its own broker
+            self._log(f"Browser ready in {time.time() - started:.1f}s.")
+        except Exception as e:
+            self._log(f"ERROR: Prewarming a browser failed: {type(e).__name__} - {e}")
+            traceback.print_exc()
+            if automation:
+                automation.close()
+            automation = None
+        with self._cond:
+            self._warming[key] -= 1
+            if automation:
+                self.stats['started'] += 1
+                if self._closed:
+                    automation.close()
+                else:
+                    self._idle.append((key, automation, time.time()))
+            self._cond.notify_all()
+
+    # --- Lease / Release ---
+    def lease(self, download_folder, options=None, status_callback=None):
+        """
+        Returns a WebAutomation for a run, moved to download_folder with the run's options.
+        A ready browser with the same launch options is reused; if one is still starting it is
+        waited for (up to WARMING_WAIT); otherwise a new browser is started.
+        Raises the WebAutomation start-up error if a new browser cannot be started.
+        """
+        options = dict(options or {})
+        launch_options = {key: value for key, value in options.items() if key in LAUNCH_OPTION_KEYS}
+        run_options = {key: value for key, value in options.items() if key not in LAUNCH_OPTION_KEYS}
+        log_func = status_callback or self._log
+        key = _launch_key(launch_options)
+        deadline = time.time() + WARMING_WAIT
+        while True:
+            with self._cond:
+                automation = self._take_idle(key)
+                if not automation and self._warming.get(key) and time.time() < deadline:
+                    log_func("Waiting for a prewarmed browser to finish starting...")
+                    self._cond.wait(timeout=max(0.1, deadline - time.time()))
+                    continue
+                if not automation:
+                    break
+                self._leased.add(automation)
+            if self._ready(automation, download_folder, run_options, log_func):
+                self.stats['leased_warm'] += 1
+                log_func(f"Using a prewarmed browser{' (already logged in as ' + automation.email + ')' if automation.email else ''}.")
+                return automation
+            with self._cond:
+                self._leased.discard(automation)
+            automation.close()
+
+        log_func("No prewarmed browser available. Starting a new one...")
+        automation = WebAutomation(self.driver_path, download_folder, status_callback=log_func, **options)
+        with self._cond:
+            self._leased.add(automation)
+        self.stats['leased_cold'] += 1
+        return automation
+
+    def _take_idle(self, key):
+        for index, (entry_key, automation, _) in enumerate(self._idle):
+            if entry_key == key:
+                del self._idle[index]
+                return automation
+        return None
+
+    def _ready(self, automation, download_folder, run_options, log_func):
+        """Health check of an idle browser, then points it at the run. False if it has to be replaced."""
+        try:
+            if not automation.driver or not automation._driver_alive or not automation.is_session_valid():
+                log_func("Prewarmed browser failed its health check. Replacing it.")
+                return False
+            automation.apply_run_options(**run_options)
+            automation.set_download_folder(download_folder, status_callback=log_func)
+            return True
+        except (WebDriverException, OSError) as e:
+            log_func(f"Prewarmed browser could not be prepared ({type(e).__name__}: {str(e)[:150]}). Replacing it.")
+            return False
+
+    def release(self, automation, reusable=True):
+        """Returns a leased browser. It is kept for the next lease if still healthy and the pool has room, otherwise closed."""
+        with self._cond:
+            self._leased.discard(automation)
+            keep = reusable and not self._closed and automation.driver is not None and self._size() < self.max_size
+        if keep:
+            try:
+                keep = automation._driver_alive and automation.is_session_valid()
+                if keep:
+                    automation.set_download_folder(self.staging_folder, status_callback=self._log) # Off the finished run's folder and log (keepalive included)
+                    automation.login_broker = None
+                    automation.session_version = None
+            except (WebDriverException, OSError):
+                keep = False
+        if not keep:
+            automation.close()
+            return
+        launch_options = {'lean_profile': automation.lean_profile, 'download_events': automation.download_events,
+                          'profile_dir': automation.profile_dir, 'profile_size_cap_mb': automation.profile_size_cap_mb,
+                          'session_monitor_options': automation.session_monitor_options}
+        with self._cond:
+            self._idle.append((_launch_key(launch_options), automation, time.time()))
+            self._cond.notify_all()
+
+    # --- Shrinking ---
+    def _reap_loop(self):
+        while not self._closed:
+            time.sleep(REAPER_INTERVAL)
+            expired = []
+            with self._cond:
+                now = time.time()
+                for entry in list(self._idle):
+                    if now - entry[2] >= self.idle_timeout:
+                        self._idle.remove(entry)
+                        expired.append(entry[1])
+            for automation in expired:
+                self._log(f"Closing browser idle for more than {self.idle_timeout}s.")
+                self.stats['closed_idle'] += 1
+                automation.close()
+
+    def describe(self):
+        with self._cond:
+            return (f"{len(self._idle)} idle, {sum(self._warming.values())} starting, {len(self._leased)} leased; "
+                    f"warm leases {self.stats['leased_warm']}, cold {self.stats['leased_cold']}")
+
+    def shutdown(self):
+        """Closes every idle browser (leased ones are closed on release)."""
+        with self._cond:
+            self._closed = True
+            idle, self._idle = self._idle, []
+        for _, automation, _ in idle:
+            automation.close()
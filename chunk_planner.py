@@ -0,0 +1,124 @@
+# filename: chunk_planner.py
+import os
+import threading
+from datetime import datetime
+
+from utils import load_json_file, save_json_file
+
+DEFAULT_PLANNER_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'chunk_costs.json')
+COST_SMOOTHING = 0.3  # Weight of the newest export in the running averages
+TIMEOUT_PENALTY = 1.5 # A timed-out export cost at least this much more per day than its elapsed time shows
+MAX_GROWTH = 2        # A plan never more than doubles the largest chunk exported since the last timeout
+
+
+def count_days(from_date, to_date):
+    """Days in the inclusive range from_date..to_date (YYYY-MM-DD)."""
+    return (datetime.strptime(to_date, '%Y-%m-%d') - datetime.strptime(from_date, '%Y-%m-%d')).days + 1
+
+
+class ChunkPlanner:
+    """
+    Learns what one day of a report (per region) costs to export, in seconds and bytes, from
+    the exports of past runs, and picks chunk sizes ("auto" chunk size) whose export should take
+    about target_seconds. Fast exports lower the cost and let chunks grow (at most to twice the
+    largest chunk exported); a timed-out or stalled export raises it so the next chunks are smaller.
+    """
+
+    def __init__(self, path=DEFAULT_PLANNER_PATH, target_seconds=600, target_mb=0, min_days=1, max_days=31, default_days=5, log_func=print):
+        """
+        Args:
+            path (str): JSON file holding the learned costs per report and region.
+            target_seconds (int, optional): Export duration (click to file complete) a chunk should take.
+            target_mb (int, optional): Also keep a chunk's file below this size (0 = no size target).
+            min_days (int, optional): Smallest chunk planned.
+            max_days (int, optional): Largest chunk planned.
+            default_days (int, optional): Chunk size while nothing is known about a report.
+            log_func (function, optional): Warnings (file errors).
+        """
+        self.path = path
+        self.target_seconds = max(1, int(target_seconds))
+        self.target_mb = max(0, int(target_mb))
+        self.min_days = max(1, int(min_days))
+        self.max_days = max(self.min_days, int(max_days))
+        self.default_days = min(max(int(default_days), self.min_days), self.max_days)
+        self._log = log_func
+        self._lock = threading.Lock()
+        self._costs = self._load()
+
+    @staticmethod
+    def _key(report_url, region_index):
+        return f"{report_url.split('?')[0].lower()}|{'' if region_index is None else region_index}"
+
+    def _load(self):
+        return load_json_file(self.path)
+
+    def _save(self):
+        save_json_file(self.path, self._costs, self._log, "chunk cost file", sort_keys=True)
+
+    # --- Planning ---
+    def chunk_days(self, report_url, region_index=None):
+        """Chunk size in days for the next export of this report/region."""
+        with self._lock:
+            cost = self._costs.get(self._key(report_url, region_index))
+            if not cost or not cost.get('seconds_per_day'):
+                return self.default_days
+            days = self.target_seconds / cost['seconds_per_day']
+            if self.target_mb and cost.get('bytes_per_day'):
+                days = min(days, self.target_mb * 1024 * 1024 / cost['bytes_per_day'])
+            if cost.get('planned_days'):
+                days = min(days, cost['planned_days'] * MAX_GROWTH)
+            return int(min(max(days, self.min_days), self.max_days))
+
+    def describe(self, report_url, region_index=None):
+        """'~45s/day, 1.2 MB/day from 6 export(s)' for the status stream."""
+        with self._lock:
+            cost = self._costs.get(self._key(report_url, region_index))
+        if not cost or not cost.get('seconds_per_day'):
+            return "no export history"
+        return (f"~{cost['seconds_per_day']:.0f}s/day, {cost.get('bytes_per_day', 0) / (1024 * 1024):.1f} MB/day "
+                f"from {cost.get('samples', 0)} export(s)")
+
+    # --- Learning ---
+    def record(self, report_url, region_index, from_date, to_date, seconds, size_bytes=None):
+        """Adds a successful export of from_date..to_date that took seconds (click to complete file)."""
+        days = count_days(from_date, to_date)
+        with self._lock:
+            cost = self._costs.setdefault(self._key(report_url, region_index), {})
+            cost['seconds_per_day'] = self._smooth(cost.get('seconds_per_day'), seconds / days)
+            if size_bytes is not None:
+                cost['bytes_per_day'] = self._smooth(cost.get('bytes_per_day'), size_bytes / days)
+            cost['samples'] = cost.get('samples', 0) + 1
+            cost['planned_days'] = max(days, cost.get('planned_days') or 0) # Growth is capped from sizes actually exported
+            cost['updated_at'] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+            self._save()
+
+    def record_timeout(self, report_url, region_index, from_date, to_date, seconds):
+        """Adds an export that timed out or stalled after seconds: its cost per day was at least that much."""
+        days = count_days(from_date, to_date)
+        with self._lock:
+            cost = self._costs.setdefault(self._key(report_url, region_index), {})
+            cost['seconds_per_day'] = max(cost.get('seconds_per_day') or 0, seconds / days * TIMEOUT_PENALTY)
+            cost['planned_days'] = max(self.min_days, days // 2) # Next plan starts from half the failed size
+            cost['timeouts'] = cost.get('timeouts', 0) + 1
+            cost['updated_at'] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+            self._save()
+
+    @staticmethod
+    def _smooth(average, value):
+        return value if not average else (1 - COST_SMOOTHING) * average + COST_SMOOTHING * value
+
+
+_planner = None
+
+
+def get_chunk_planner():
+    """The shared planner, or None when it was not enabled with init_chunk_planner()."""
+    return _planner
+
+
+def init_chunk_planner(path, target_seconds=600, target_mb=0, min_days=1, max_days=31, default_days=5, log_func=print):
+    """Enables the shared planner (call once at app start)."""
+    global _planner
+    _planner = ChunkPlanner(path, target_seconds=target_seconds, target_mb=target_mb, min_days=min_days,
+                            max_days=max_days, default_days=default_days, log_func=log_func)
+    return _planner
@@ -0,0 +1,108 @@
+# filename: click_strategy_cache.py
+import os
+import threading
+from datetime import datetime, timedelta
+
+from utils import load_json_file, save_json_file
+
+DEFAULT_CACHE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'click_strategies.json')
+CLICK_STRATEGIES = ('native', 'actions', 'js') # Default order: Selenium click, ActionChains, JavaScript click
+SUCCESS_WEIGHT = 0.3 # Weight of the newest click in a strategy's score and average duration
+FAILURE_DECAY = 0.5  # A failed click multiplies the strategy's score by this
+TRUSTED_SCORE = 0.5  # Strategies scoring at least this are tried first, fastest first
+
+
+class ClickStrategyCache:
+    """
+    Persistent record, per button locator, of which click strategy worked and how long it took.
+    Trusted strategies are tried first, fastest first; the others follow in the default order.
+    A strategy that fails loses half its score, so after a page change it drops back behind
+    the default order after one or two failures; entries unused for max_age_days are dropped.
+    """
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, max_age_days=30, log_func=print):
+        """
+        Args:
+            path (str): JSON file holding the click statistics per locator.
+            max_age_days (int, optional): Entries not updated for this long are ignored and dropped (0 = never expire).
+            log_func (function, optional): Warnings (file errors).
+        """
+        self.path = path
+        self.max_age_days = int(max_age_days)
+        self._log = log_func
+        self._lock = threading.Lock()
+        self._entries = self._load()
+
+    @staticmethod
+    def key(locator):
+        """Cache key of a (By, value) locator."""
+        return f"{locator[0]}|{locator[1]}"
+
+    def _load(self):
+        entries = load_json_file(self.path)
+        if self.max_age_days:
+            oldest = (datetime.now() - timedelta(days=self.max_age_days)).strftime('%Y-%m-%d %H:%M:%S')
+            entries = {key: {strategy: stats for strategy, stats in strategies.items() if stats.get('updated_at', '') >= oldest}
+                       for key, strategies in entries.items()}
+            entries = {key: strategies for key, strategies in entries.items() if strategies}
+        return entries
+
+    def _save(self):
+        save_json_file(self.path, self._entries, self._log, "click strategy cache", sort_keys=True)
+
+    def order(self, locator, strategies=CLICK_STRATEGIES):
+        """Strategies in the order to try them for locator: trusted ones fastest first, then the rest in default order."""
+        with self._lock:
+            known = self._entries.get(self.key(locator), {})
+            trusted = sorted((strategy for strategy in strategies if known.get(strategy, {}).get('score', 0) >= TRUSTED_SCORE),
+                             key=lambda strategy: known[strategy].get('seconds', 0))
+        return trusted + [strategy for strategy in strategies if strategy not in trusted]
+
+    def trusted(self, locator):
+        """True when some strategy is trusted for locator (the debug details are then skipped)."""
+        with self._lock:
+            known = self._entries.get(self.key(locator), {})
+            return any(stats.get('score', 0) >= TRUSTED_SCORE for stats in known.values())
+
+    def describe(self, locator, strategy):
+        with self._lock:
+            stats = self._entries.get(self.key(locator), {}).get(strategy)
+        if not stats:
+            return "no history"
+        return f"score {stats['score']:.2f}, ~{stats.get('seconds', 0):.2f}s, {stats.get('ok', 0)} ok/{stats.get('fail', 0)} failed"
+
+    def record_success(self, locator, strategy, seconds):
+        with self._lock:
+            stats = self._entries.setdefault(self.key(locator), {}).setdefault(strategy, {})
+            stats['score'] = min(1.0, (1 - SUCCESS_WEIGHT) * stats['score'] + SUCCESS_WEIGHT) if 'score' in stats else 1.0
+            stats['seconds'] = (1 - SUCCESS_WEIGHT) * stats['seconds'] + SUCCESS_WEIGHT * seconds if 'seconds' in stats else seconds
+            stats['ok'] = stats.get('ok', 0) + 1
+            stats['updated_at'] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+            self._save()
+
+    def record_failure(self, locator, strategy):
+        """A click with strategy raised, or did not start the export it should have."""
+        with self._lock:
+            stats = self._entries.setdefault(self.key(locator), {}).setdefault(strategy, {})
+            stats['score'] = stats.get('score', 0) * FAILURE_DECAY
+            stats['fail'] = stats.get('fail', 0) + 1
+            stats['updated_at'] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+            self._save()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+_cache = None
+
+
+def get_click_cache():
+    """The shared cache, or None when it was not enabled with init_click_cache()."""
+    return _cache
+
+
+def init_click_cache(path, max_age_days=30, log_func=print):
+    """Enables the shared cache (call once at app start)."""
+    global _cache
+    _cache = ClickStrategyCache(path, max_age_days=max_age_days, log_func=log_func)
+    return _cache
@@ -0,0 +1,144 @@
+# filename: concurrency.py
+import time
+import threading
+from collections import deque
+
+OUTCOME_WINDOW = 10          # Recent export outcomes kept for the error rate and the breaker
+DECREASE_HOLD = 15           # Seconds after a decrease during which further overloads do not cut again (same burst)
+SLOW_FIRST_BYTE_FACTOR = 2.5 # First byte this many times slower than the running average counts as overload...
+SLOW_FIRST_BYTE_MIN = 30     # ...if it also took at least this many seconds
+BREAKER_THRESHOLD = 5        # Overloaded outcomes within the window that open the breaker
+MAX_COOLDOWN_FACTOR = 4      # A failed probe doubles the cool-down, up to this multiple of the base
+
+BREAKER_CLOSED = 'closed'
+BREAKER_OPEN = 'open'
+BREAKER_HALF_OPEN = 'half-open'
+
+
+class AdaptiveConcurrency:
+    """
+    AIMD limit on exports in flight against the portal, shared by all workers of a run.
+    Every healthy export adds about one slot per round (limit += 1/limit); an overload signal
+    (502/503 page, timeout or stall, first byte much slower than usual) halves the limit.
+    When most recent exports were overloaded the circuit breaker opens: no export starts until
+    the cool-down has passed, then a single probe export decides whether to close it again.
+    """
+
+    def __init__(self, max_limit, min_limit=1, initial_limit=None, cooldown=120, log_func=print):
+        """
+        Args:
+            max_limit (int): Upper bound (the number of workers).
+            min_limit (int, optional): Lower bound outside of a breaker probe.
+            initial_limit (int, optional): Starting limit (default: half of max_limit).
+            cooldown (int, optional): Seconds the breaker stays open before a probe.
+            log_func (function, optional): Status stream; limit and breaker changes are reported there.
+        """
+        self.max_limit = max(1, int(max_limit))
+        self.min_limit = max(1, min(int(min_limit), self.max_limit))
+        self.limit = float(initial_limit or max(self.min_limit, self.max_limit // 2))
+        self.base_cooldown = cooldown
+        self.cooldown = cooldown
+        self._log = log_func
+        self._cond = threading.Condition()
+        self.in_flight = 0
+        self.outcomes = deque(maxlen=OUTCOME_WINDOW) # True = overloaded
+        self.first_byte_avg = None
+        self.breaker = BREAKER_CLOSED
+        self.open_until = 0
+        self._probe_running = False
+        self._last_decrease = 0
+        self.exports = 0
+        self.overloads = 0
+
+    def _allowed(self):
+        if self.breaker == BREAKER_OPEN:
+            if time.time() < self.open_until:
+                return False
+            self.breaker = BREAKER_HALF_OPEN
+            self._log(f"Circuit breaker half-open: sending one probe export. {self.describe(locked=True)}")
+        if self.breaker == BREAKER_HALF_OPEN:
+            return not self._probe_running and self.in_flight == 0
+        return self.in_flight < int(self.limit)
+
+    def acquire(self, timeout=None):
+        """Waits for an export slot. Returns False if none freed up within timeout seconds."""
+        deadline = time.time() + timeout if timeout is not None else None
+        with self._cond:
+            while not self._allowed():
+                wait = 1.0 if self.breaker == BREAKER_OPEN else None # Wake up when the cool-down ends
+                if deadline is not None:
+                    left = deadline - time.time()
+                    if left <= 0:
+                        return False
+                    wait = min(wait, left) if wait else left
+                self._cond.wait(wait)
+            if self.breaker == BREAKER_HALF_OPEN:
+                self._probe_running = True
+            self.in_flight += 1
+            return True
+
+    def release(self, overload=None, first_byte=None):
+        """
+        Returns a slot with the export's outcome.
+        overload: why the export showed server overload (None = healthy, '' = not an export, e.g. a skipped task).
+        first_byte: seconds from the export click to the first downloaded byte, when known.
+        """
+        with self._cond:
+            self.in_flight = max(0, self.in_flight - 1)
+            probe, self._probe_running = self._probe_running, False
+            if overload is None and first_byte is not None:
+                if self.first_byte_avg and first_byte >= SLOW_FIRST_BYTE_MIN and first_byte > self.first_byte_avg * SLOW_FIRST_BYTE_FACTOR:
+                    overload = f"slow first byte ({first_byte:.0f}s, usually {self.first_byte_avg:.0f}s)"
+                else: # Outliers stay out of the average they are compared with
+                    self.first_byte_avg = first_byte if self.first_byte_avg is None else 0.8 * self.first_byte_avg + 0.2 * first_byte
+            if overload != '':
+                self._record(bool(overload), overload, probe)
+            self._cond.notify_all()
+
+    def _record(self, overloaded, reason, probe):
+        self.exports += 1
+        self.overloads += overloaded
+        self.outcomes.append(overloaded)
+        old_limit = int(self.limit)
+        if not probe and self.breaker != BREAKER_CLOSED:
+            return # Exports started before the breaker opened; the probe decides
+        if probe:
+            if overloaded:
+                self.cooldown = min(self.cooldown * 2, self.base_cooldown * MAX_COOLDOWN_FACTOR)
+                self._open(f"probe export overloaded: {reason}")
+                return
+            self.breaker = BREAKER_CLOSED
+            self.cooldown = self.base_cooldown
+            self.outcomes.clear()
+            self.limit = float(self.min_limit)
+            self._log(f"Circuit breaker closed: probe export succeeded. {self.describe(locked=True)}")
+            return
+        if overloaded:
+            if sum(self.outcomes) >= BREAKER_THRESHOLD and self.breaker == BREAKER_CLOSED:
+                self._open(f"{sum(self.outcomes)} of the last {len(self.outcomes)} exports overloaded, last: {reason}")
+                return
+            if time.time() - self._last_decrease >= DECREASE_HOLD:
+                self._last_decrease = time.time()
+                self.limit = max(float(self.min_limit), self.limit / 2)
+                if int(self.limit) < old_limit:
+                    self._log(f"Concurrency backing off ({reason}): limit {old_limit} -> {int(self.limit)}. {self.describe(locked=True)}")
+        else:
+            self.limit = min(float(self.max_limit), self.limit + 1 / self.limit)
+            if int(self.limit) > old_limit:
+                self._log(f"Concurrency increased: limit {old_limit} -> {int(self.limit)}. {self.describe(locked=True)}")
+
+    def _open(self, reason):
+        self.breaker = BREAKER_OPEN
+        self.open_until = time.time() + self.cooldown
+        self.limit = float(self.min_limit)
+        self._log(f"Circuit breaker OPEN ({reason}): pausing all exports for {self.cooldown}s. {self.describe(locked=True)}")
+
+    def describe(self, locked=False):
+        """One-line state for the status stream."""
+        if not locked:
+            with self._cond:
+                return self.describe(locked=True)
+        error_rate = f"{100 * sum(self.outcomes) / len(self.outcomes):.0f}% of last {len(self.outcomes)}" if self.outcomes else "n/a"
+        first_byte = f", first byte ~{self.first_byte_avg:.0f}s" if self.first_byte_avg else ""
+        breaker = f"breaker {self.breaker}" + (f" ({max(0, self.open_until - time.time()):.0f}s left)" if self.breaker == BREAKER_OPEN else "")
+        return f"[Concurrency: limit {int(self.limit)}/{self.max_limit}, {self.in_flight} in flight, overload rate {error_rate}{first_byte}, {breaker}]"
@@ -62,6 +62,120 @@ if not os.path.exists(DRIVER_PATH):
 if not os.path.exists(DOWNLOAD_BASE_PATH):
      print(f"\nWARNING: Download base path does not exist: {DOWNLOAD_BASE_PATH}. The application will attempt to create it, but please verify the configuration.\n")
 
+# --- Parallel Download Workers ---
+# Default number of browsers per run (1 = original sequential behaviour). A run can
+# override it with the "workers" field of the start-download request / saved config.
+DOWNLOAD_WORKERS = int(os.getenv('DOWNLOAD_WORKERS', '1'))
+MAX_DOWNLOAD_WORKERS = int(os.getenv('MAX_DOWNLOAD_WORKERS', '6'))
+# Tabs per browser used to export several chunks at once inside one logged-in
+# session (no extra Chrome or OTP login). Overridable per run with "tabs".
+DOWNLOAD_TABS = int(os.getenv('DOWNLOAD_TABS', '1'))
+MAX_DOWNLOAD_TABS = int(os.getenv('MAX_DOWNLOAD_TABS', '4'))
+# Pipelined exports: click export for the next chunk as soon as the previous
+# file has started downloading. Overridable per run with "pipeline".
+DOWNLOAD_PIPELINE = os.getenv('DOWNLOAD_PIPELINE', '0').lower() in ('1', 'true', 'yes', 'on')
+# Keep the loaded report page between chunks and only rewrite dates/radio/region
+# (reloaded when the health check fails). Overridable per run with "reuse_page".
+REUSE_REPORT_PAGE = os.getenv('REUSE_REPORT_PAGE', '0').lower() in ('1', 'true', 'yes', 'on')
+# Scripted form fill: set dates/radio/region and click export with one execute_script
+# through the page's Telerik client API (falls back to the step-by-step fill when
+# the API is missing). Overridable per run with "fast_fill".
+FAST_FORM_FILL = os.getenv('FAST_FORM_FILL', '0').lower() in ('1', 'true', 'yes', 'on')
+# HTTP export replay: after login, post the export postback for each chunk directly
+# with the browser's cookies (no browser round-trips; region reports stay in the
+# browser). Rejected chunks fall back to the browser. Overridable per run with "http_export".
+HTTP_EXPORT = os.getenv('HTTP_EXPORT', '0').lower() in ('1', 'true', 'yes', 'on')
+HTTP_EXPORT_WORKERS = int(os.getenv('HTTP_EXPORT_WORKERS', '4'))
+# Track downloads with Chrome DevTools download events (start, bytes, completion by
+# GUID) read from the ChromeDriver performance log; folder polling is the fallback.
+DOWNLOAD_EVENTS = os.getenv('DOWNLOAD_EVENTS', '1').lower() in ('1', 'true', 'yes', 'on')
+# Lean browser profile: headless Chrome, eager page loads, images/fonts/analytics
+# blocked and background features off. Overridable per run with "lean_profile".
+LEAN_BROWSER_PROFILE = os.getenv('LEAN_BROWSER_PROFILE', '0').lower() in ('1', 'true', 'yes', 'on')
+# Persistent Chrome profiles: each browser locks one slot folder under BROWSER_PROFILE_DIR
+# and keeps its disk cache between runs (cookies are cleared at start). A slot's cache is
+# cleared when it grows past BROWSER_PROFILE_SIZE_CAP_MB. Overridable per run with "persistent_profile".
+PERSISTENT_BROWSER_PROFILE = os.getenv('PERSISTENT_BROWSER_PROFILE', '0').lower() in ('1', 'true', 'yes', 'on')
+BROWSER_PROFILE_DIR = os.getenv('BROWSER_PROFILE_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'browser_profiles'))
+BROWSER_PROFILE_SIZE_CAP_MB = int(os.getenv('BROWSER_PROFILE_SIZE_CAP_MB', '512'))
+# Session store: cookies/storage of a logged-in browser are saved encrypted (Fernet) under
+# SESSION_STORE_DIR and reused by later runs for SESSION_TTL_MINUTES, skipping the OTP login.
+# The key comes from SESSION_STORE_KEY or a key file created in SESSION_STORE_DIR.
+SESSION_STORE = os.getenv('SESSION_STORE', '0').lower() in ('1', 'true', 'yes', 'on')
+SESSION_STORE_DIR = os.getenv('SESSION_STORE_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'sessions'))
+SESSION_TTL_MINUTES = int(os.getenv('SESSION_TTL_MINUTES', '60'))
+# Session keepalive: a background thread per browser pings SESSION_KEEPALIVE_URL after
+# SESSION_KEEPALIVE_SECONDS without portal traffic (e.g. long downloads) and the login is
+# renewed between chunks SESSION_REAUTH_MARGIN_SECONDS before its expected expiry
+# (idle timeout, SESSION_MAX_AGE_MINUTES if known, auth cookie expiry). Overridable per run with "session_keepalive".
+SESSION_KEEPALIVE = os.getenv('SESSION_KEEPALIVE', '0').lower() in ('1', 'true', 'yes', 'on')
+SESSION_KEEPALIVE_URL = os.getenv('SESSION_KEEPALIVE_URL', 'https://bi.nhathuoclongchau.com.vn/Home.aspx')
+SESSION_KEEPALIVE_SECONDS = int(os.getenv('SESSION_KEEPALIVE_SECONDS', '240'))
+SESSION_IDLE_TIMEOUT_MINUTES = int(os.getenv('SESSION_IDLE_TIMEOUT_MINUTES', '20'))
+SESSION_MAX_AGE_MINUTES = int(os.getenv('SESSION_MAX_AGE_MINUTES', '0'))
+SESSION_REAUTH_MARGIN_SECONDS = int(os.getenv('SESSION_REAUTH_MARGIN_SECONDS', '120'))
+# Warm browser pool: runs lease started browsers instead of cold-starting Chrome. BROWSER_POOL_PREWARM
+# browsers start with the app (logged in with DEFAULT_EMAIL when BROWSER_POOL_PREAUTH); scheduled jobs
+# prewarm their browsers BROWSER_POOL_LEAD_MINUTES early. Idle browsers close after BROWSER_POOL_IDLE_MINUTES.
+BROWSER_POOL = os.getenv('BROWSER_POOL', '0').lower() in ('1', 'true', 'yes', 'on')
+BROWSER_POOL_SIZE = int(os.getenv('BROWSER_POOL_SIZE', '4'))
+BROWSER_POOL_PREWARM = int(os.getenv('BROWSER_POOL_PREWARM', '0'))
+BROWSER_POOL_PREAUTH = os.getenv('BROWSER_POOL_PREAUTH', '0').lower() in ('1', 'true', 'yes', 'on')
+BROWSER_POOL_LEAD_MINUTES = int(os.getenv('BROWSER_POOL_LEAD_MINUTES', '3'))
+BROWSER_POOL_IDLE_MINUTES = int(os.getenv('BROWSER_POOL_IDLE_MINUTES', '15'))
+# Browser recycling: Chrome is restarted between chunks (session restored from its cookies) after
+# BROWSER_RECYCLE_DOWNLOADS downloads or once ChromeDriver + Chrome use BROWSER_RECYCLE_RSS_MB of memory. 0 = off.
+BROWSER_RECYCLE_DOWNLOADS = int(os.getenv('BROWSER_RECYCLE_DOWNLOADS', '0'))
+BROWSER_RECYCLE_RSS_MB = int(os.getenv('BROWSER_RECYCLE_RSS_MB', '0'))
+# Process registry: PIDs of every chromedriver/chrome started by the app are recorded here so
+# orphans (app restarted, run thread died) are killed at start-up and every PROCESS_REAP_MINUTES.
+PROCESS_REGISTRY_PATH = os.getenv('PROCESS_REGISTRY_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'browser_processes.json'))
+PROCESS_REAP_MINUTES = int(os.getenv('PROCESS_REAP_MINUTES', '10'))
+# Stalled downloads: a download that received no bytes for DOWNLOAD_STALL_SECONDS, or an export whose
+# download did not start DOWNLOAD_START_SECONDS after the click, is cancelled instead of waiting out the
+# one-hour timeout; the chunk is retried at once split in two, up to DOWNLOAD_STALL_RETRIES times. 0 = off.
+DOWNLOAD_STALL_SECONDS = int(os.getenv('DOWNLOAD_STALL_SECONDS', '300'))
+DOWNLOAD_START_SECONDS = int(os.getenv('DOWNLOAD_START_SECONDS', '600'))
+DOWNLOAD_STALL_RETRIES = int(os.getenv('DOWNLOAD_STALL_RETRIES', '1'))
+# Known-empty exports: (report, range, region) answered with "no data" are remembered when the range
+# ended at least EMPTY_RANGE_CLOSED_DAYS ago, and skipped by later runs for EMPTY_RANGE_MAX_AGE_DAYS.
+EMPTY_RANGE_CACHE = os.getenv('EMPTY_RANGE_CACHE', '1').lower() in ('1', 'true', 'yes', 'on')
+EMPTY_RANGE_CACHE_PATH = os.getenv('EMPTY_RANGE_CACHE_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'empty_ranges.json'))
+EMPTY_RANGE_CLOSED_DAYS = int(os.getenv('EMPTY_RANGE_CLOSED_DAYS', '3'))
+EMPTY_RANGE_MAX_AGE_DAYS = int(os.getenv('EMPTY_RANGE_MAX_AGE_DAYS', '90'))
+# Chunk size "auto": the seconds (and bytes) one day of each report/region costs to export are learned
+# from past exports; chunks are sized so an export takes about CHUNK_TARGET_SECONDS (and stays below
+# CHUNK_TARGET_MB, 0 = no size target). Fast exports let chunks grow (at most doubling), a timed-out or
+# stalled export shrinks them; the failed chunk itself is retried in halves (DOWNLOAD_STALL_RETRIES).
+CHUNK_PLANNER = os.getenv('CHUNK_PLANNER', '1').lower() in ('1', 'true', 'yes', 'on')
+CHUNK_PLANNER_PATH = os.getenv('CHUNK_PLANNER_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'chunk_costs.json'))
+CHUNK_TARGET_SECONDS = int(os.getenv('CHUNK_TARGET_SECONDS', '600'))
+CHUNK_TARGET_MB = int(os.getenv('CHUNK_TARGET_MB', '0'))
+CHUNK_MIN_DAYS = int(os.getenv('CHUNK_MIN_DAYS', '1'))
+CHUNK_MAX_DAYS = int(os.getenv('CHUNK_MAX_DAYS', '31'))
+# Click strategies: for each export button the click method that worked (native, ActionChains, JavaScript)
+# and its duration are remembered across runs, and the fastest trusted one is tried first. A method that
+# fails, or whose click starts no download, loses trust; entries unused for CLICK_STRATEGY_MAX_AGE_DAYS are dropped.
+CLICK_STRATEGY_CACHE = os.getenv('CLICK_STRATEGY_CACHE', '1').lower() in ('1', 'true', 'yes', 'on')
+CLICK_STRATEGY_CACHE_PATH = os.getenv('CLICK_STRATEGY_CACHE_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'click_strategies.json'))
+CLICK_STRATEGY_MAX_AGE_DAYS = int(os.getenv('CLICK_STRATEGY_MAX_AGE_DAYS', '30'))
+# Time budgets: a run, each report, each chunk (retries included) and each form step get a deadline;
+# every wait and WebDriver command stops at the nearest one instead of the blanket one-hour timeouts,
+# and a watchdog kills and rebuilds a browser whose command hangs past it. 0 = no budget at that level.
+RUN_BUDGET_MINUTES = int(os.getenv('RUN_BUDGET_MINUTES', '0'))
+REPORT_BUDGET_MINUTES = int(os.getenv('REPORT_BUDGET_MINUTES', '0'))
+CHUNK_BUDGET_SECONDS = int(os.getenv('CHUNK_BUDGET_SECONDS', '4500'))
+STEP_BUDGET_SECONDS = int(os.getenv('STEP_BUDGET_SECONDS', '300'))
+# Retry budget: all retry loops (method retries, click retries, error page refreshes) draw from one
+# allowance per chunk and per run, so nested loops cannot multiply. Only transient failures are retried.
+RETRY_CHUNK_LIMIT = int(os.getenv('RETRY_CHUNK_LIMIT', '4'))
+RETRY_RUN_LIMIT = int(os.getenv('RETRY_RUN_LIMIT', '50'))
+# Adaptive concurrency (worker pool): exports in flight start at half the workers, grow while the portal
+# answers quickly and halve on 502/503, timeouts, stalls or slow first bytes. When most recent exports were
+# overloaded the circuit breaker pauses all exports for CIRCUIT_BREAKER_COOLDOWN_SECONDS, then probes with one.
+ADAPTIVE_CONCURRENCY = os.getenv('ADAPTIVE_CONCURRENCY', '1').lower() in ('1', 'true', 'yes', 'on')
+CIRCUIT_BREAKER_COOLDOWN_SECONDS = int(os.getenv('CIRCUIT_BREAKER_COOLDOWN_SECONDS', '120'))
+
 REPORTS = [
     {
         "name": "FAF030",
@@ -0,0 +1,144 @@
+# filename: deadlines.py
+import time
+import threading
+import weakref
+from contextlib import contextmanager
+
+from selenium.common.exceptions import TimeoutException
+
+WATCHDOG_INTERVAL = 5  # Seconds between watchdog checks
+COMMAND_GRACE = 60     # A command may run this long past its deadline before the watchdog kills the browser
+
+
+class DeadlineExceeded(TimeoutException):
+    """A time budget (run, report, chunk, step) ran out, or the watchdog killed a browser whose command hung."""
+    pass
+
+
+class DeadlineBudget:
+    """
+    Nested time budgets of one browser (run > report > chunk > step). A scope never outlives
+    its parent: its deadline is the earlier of its own budget and the enclosing one. Waits ask
+    timeout(default) for the smaller of their own default and the time left.
+
+    Every WebDriver command is registered with begin_command()/end_command() so the
+    CommandWatchdog can see a command that outlived its deadline.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._frames = [] # [(label, expires_at or None)], outermost first
+        self._command = None # (command name, started_at, kill_at) while a WebDriver command runs
+
+    def reset(self, run_expires_at=None):
+        """Drops all scopes; run_expires_at (epoch seconds) is the run-wide deadline, shared by all browsers of the run."""
+        with self._lock:
+            self._frames = [('run', run_expires_at)] if run_expires_at else []
+
+    def _expires_at(self):
+        deadlines = [expires_at for _, expires_at in self._frames if expires_at]
+        return min(deadlines) if deadlines else None
+
+    @contextmanager
+    def scope(self, label, seconds):
+        """Runs the block with a budget of seconds (0/None = only the enclosing budgets apply)."""
+        expires_at = time.time() + seconds if seconds else None
+        with self._lock:
+            self._frames.append((label, expires_at))
+            depth = len(self._frames)
+        try:
+            yield self
+        finally:
+            with self._lock:
+                del self._frames[depth - 1:]
+
+    def remaining(self):
+        """Seconds left in the innermost budget, or None when no budget applies."""
+        with self._lock:
+            expires_at = self._expires_at()
+        return None if expires_at is None else expires_at - time.time()
+
+    def expired(self):
+        remaining = self.remaining()
+        return remaining is not None and remaining <= 0
+
+    def timeout(self, default):
+        """The smaller of default and the time left (never negative)."""
+        remaining = self.remaining()
+        return default if remaining is None else max(0, min(default, remaining))
+
+    def describe(self):
+        """'chunk: 120s left' for the scope whose deadline is the nearest."""
+        with self._lock:
+            frames = [(label, expires_at) for label, expires_at in self._frames if expires_at]
+        if not frames:
+            return "no time budget"
+        label, expires_at = min(frames, key=lambda frame: frame[1])
+        return f"{label}: {max(0, expires_at - time.time()):.0f}s left"
+
+    def check(self, what):
+        """Raises DeadlineExceeded if the budget is already used up before starting `what`."""
+        if self.expired():
+            raise DeadlineExceeded(f"Time budget exhausted before {what} ({self.describe()}).")
+
+    # --- Command Tracking (watchdog) ---
+    def begin_command(self, command, max_seconds):
+        remaining = self.remaining()
+        allowed = max_seconds if remaining is None else max(0, min(max_seconds, remaining))
+        with self._lock:
+            self._command = (command, time.time(), time.time() + allowed + COMMAND_GRACE)
+
+    def end_command(self):
+        with self._lock:
+            self._command = None
+
+    def overdue(self):
+        """Description of the running command if it outlived its deadline, else None."""
+        with self._lock:
+            command = self._command
+        if command and time.time() > command[2]:
+            return f"WebDriver command '{command[0]}' hung for {time.time() - command[1]:.0f}s"
+        return None
+
+
+class CommandWatchdog:
+    """
+    Daemon thread that kills the processes of a browser whose current WebDriver command outlived
+    its deadline (the blocked call then fails at once instead of freezing the worker). The
+    browser is rebuilt by its own thread at the next chunk boundary.
+    """
+
+    def __init__(self, interval=WATCHDOG_INTERVAL):
+        self.interval = interval
+        self._watched = weakref.WeakSet()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def watch(self, automation):
+        """automation needs .deadlines (DeadlineBudget) and ._watchdog_kill(reason)."""
+        with self._lock:
+            self._watched.add(automation)
+            if not self._thread:
+                self._thread = threading.Thread(target=self._run, name="command-watchdog", daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            with self._lock:
+                watched = list(self._watched)
+            for automation in watched:
+                reason = automation.deadlines.overdue()
+                if reason:
+                    automation.deadlines.end_command() # Kill once
+                    try:
+                        automation._watchdog_kill(reason)
+                    except Exception as e:
+                        print(f"Warning: Watchdog could not kill a hung browser: {type(e).__name__} - {e}")
+
+
+_watchdog = CommandWatchdog()
+
+
+def get_watchdog():
+    return _watchdog
@@ -0,0 +1,153 @@
+# filename: download_events.py
+import os
+import json
+import threading
+import time
+
+from selenium.common.exceptions import WebDriverException
+
+PERFORMANCE_LOG = 'performance'
+
+# ChromeDriver copies DevTools events of the Page domain into the 'performance' log.
+# The Browser.* variants are only delivered to the session that enabled them, so both
+# names are accepted; they carry the same guid / suggestedFilename / bytes fields.
+WILL_BEGIN_EVENTS = ('Page.downloadWillBegin', 'Browser.downloadWillBegin')
+PROGRESS_EVENTS = ('Page.downloadProgress', 'Browser.downloadProgress')
+
+
+def enable_download_events(chrome_options):
+    """Asks ChromeDriver to record DevTools Page events (download events included) in the performance log."""
+    chrome_options.set_capability('goog:loggingPrefs', {PERFORMANCE_LOG: 'ALL'})
+    chrome_options.add_experimental_option('perfLoggingPrefs', {'enableNetwork': False}) # Downloads only, no request noise
+
+
+class CdpDownloadTracker:
+    """
+    Follows Chrome downloads through DevTools download events read from the ChromeDriver
+    performance log. Every download is kept by GUID with its frame (= window handle of the
+    tab that started it), suggested file name, received/total bytes and state
+    ('inProgress', 'completed', 'canceled'), so completion is seen as soon as Chrome reports
+    it and each file is matched to the tab/export that triggered it.
+    """
+
+    def __init__(self, driver):
+        self.driver = driver
+        self.downloads = {} # guid -> download dict (see _on_will_begin)
+        self._order = []    # guids in start order
+        self._lock = threading.Lock()
+
+    def is_available(self):
+        """True if the driver exposes the performance log (requires enable_download_events at start-up)."""
+        try:
+            return PERFORMANCE_LOG in (self.driver.log_types or [])
+        except WebDriverException:
+            return False
+
+    def poll(self):
+        """Drains the performance log and applies download events. Raises WebDriverException if the log is gone."""
+        entries = self.driver.get_log(PERFORMANCE_LOG)
+        with self._lock:
+            for entry in entries:
+                try:
+                    message = json.loads(entry['message'])['message']
+                except (KeyError, TypeError, ValueError):
+                    continue
+                method = message.get('method')
+                if method in WILL_BEGIN_EVENTS:
+                    self._on_will_begin(message.get('params', {}))
+                elif method in PROGRESS_EVENTS:
+                    self._on_progress(message.get('params', {}))
+
+    def _on_will_begin(self, params):
+        guid = params.get('guid')
+        if not guid or guid in self.downloads:
+            return
+        self.downloads[guid] = {
+            'guid': guid,
+            'frame_id': params.get('frameId'),
+            'url': params.get('url'),
+            'suggested_filename': params.get('suggestedFilename') or '',
+            'state': 'inProgress',
+            'received_bytes': 0,
+            'total_bytes': 0,
+            'started_at': time.time(),
+            'finished_at': None,
+            'claimed': False,
+        }
+        self._order.append(guid)
+
+    def _on_progress(self, params):
+        download = self.downloads.get(params.get('guid'))
+        if not download:
+            return
+        download['received_bytes'] = params.get('receivedBytes', download['received_bytes'])
+        download['total_bytes'] = params.get('totalBytes', download['total_bytes'])
+        state = params.get('state')
+        if state in ('completed', 'canceled') and download['state'] == 'inProgress':
+            download['finished_at'] = time.time()
+        if state:
+            download['state'] = state
+
+    @staticmethod
+    def _same_frame(frame_id, window_handle):
+        # Top-level frame ids are the tab's target id, which ChromeDriver uses as window handle
+        return bool(frame_id) and window_handle.replace('CDwindow-', '').upper() == frame_id.upper()
+
+    def claim_next(self, window_handle=None):
+        """Returns the oldest download not yet claimed (from window_handle's tab if given) and marks it claimed."""
+        with self._lock:
+            for guid in self._order:
+                download = self.downloads[guid]
+                if download['claimed']:
+                    continue
+                if window_handle and not self._same_frame(download['frame_id'], window_handle):
+                    continue
+                download['claimed'] = True
+                return download
+        return None
+
+    def drop_unclaimed(self):
+        """Forgets downloads nobody waited for (e.g. from a chunk that already timed out) so they are not matched to the next export."""
+        with self._lock:
+            for guid in [guid for guid in self._order if not self.downloads[guid]['claimed']]:
+                self.downloads.pop(guid, None)
+                self._order.remove(guid)
+
+    def forget(self, download):
+        """Drops a finished download so the tracker does not grow over a long run."""
+        with self._lock:
+            self.downloads.pop(download['guid'], None)
+            if download['guid'] in self._order:
+                self._order.remove(download['guid'])
+
+    @staticmethod
+    def describe_progress(download):
+        """'<received> / <total> bytes (<pct>%)' for status messages."""
+        received, total = download['received_bytes'], download['total_bytes']
+        if total:
+            return f"{received} / {total} bytes ({received * 100 // total}%)"
+        return f"{received} bytes"
+
+    @staticmethod
+    def resolve_file_name(download, folder, baseline):
+        """
+        Final name of a completed download in folder. Chrome saves the suggested name, or
+        'name (n).ext' when it is taken; the newest such file that is not in baseline wins.
+        Returns None if no matching file is found.
+        """
+        suggested = download['suggested_filename']
+        if not suggested:
+            return None
+        base, ext = os.path.splitext(suggested)
+        try:
+            names = set(os.listdir(folder)) - baseline
+        except OSError:
+            return None
+        candidates = [
+            name for name in names
+            if (name == suggested or (name.startswith(f"{base} (") and name.endswith(f"){ext}")))
+            and os.path.isfile(os.path.join(folder, name))
+        ]
+        if not candidates:
+            return None
+        return max(candidates, key=lambda name: os.path.getmtime(os.path.join(folder, name)))
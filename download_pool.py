@@ -0,0 +1,289 @@
+# filename: download_pool.py
+import os
+import time
+import queue
+import threading
+import traceback
+from datetime import datetime
+
+from selenium.common.exceptions import WebDriverException, TimeoutException
+
+from logic_download import WebAutomation, regions_data, split_date_range, halve_date_range, move_completed_files, csv_filename
+from login_broker import LoginBroker
+from page_waits import WaitStats
+from retry_policy import RetryBudget
+from chunk_planner import get_chunk_planner
+
+# --- Report -> per-chunk download method mapping ---
+# Reports not listed here use the generic method. Region reports are routed to
+# download_report_for_region by URL (see config.REGION_REQUIRED_REPORT_URLS).
+REPORT_CHUNK_METHODS = {
+    "FAF001 - Sales Report": "download_report_001",
+    "FAF004N - Internal Rotation Report (Imports)": "download_report_004N",
+    "FAF004X - Internal Rotation Report (Exports)": "download_report_004X",
+}
+GENERIC_CHUNK_METHOD = "download_generic_report"
+REGION_CHUNK_METHOD = "download_report_for_region"
+
+
+def build_download_tasks(report_type_key, report_url, from_date, to_date, chunk_size, region_indices=None, log_func=print):
+    """
+    Expands one report entry into (report, date-chunk, region) tasks.
+    Returns a list of dicts consumed by DownloadWorkerPool.run.
+    With chunk_size 'auto' every region gets its own chunk size from the chunk planner.
+    """
+    if region_indices:
+        method_name = REGION_CHUNK_METHOD
+        regions = [idx for idx in region_indices if idx in regions_data]
+    else:
+        method_name = REPORT_CHUNK_METHODS.get(report_type_key, GENERIC_CHUNK_METHOD)
+        regions = [None]
+
+    tasks = []
+    for region_index in regions:
+        region_chunk_size = chunk_size
+        if chunk_size == 'auto':
+            planner = get_chunk_planner()
+            region_chunk_size = planner.chunk_days(report_url, region_index) if planner else 5
+            log_func(f"Auto chunk size for {report_type_key}"
+                     + (f" [{regions_data[region_index]['name']}]" if region_index is not None else "")
+                     + f": {region_chunk_size} day(s)" + (f" ({planner.describe(report_url, region_index)})." if planner else " (chunk planner disabled)."))
+        for from_chunk, to_chunk in split_date_range(from_date, to_date, region_chunk_size, log_func=log_func):
+            tasks.append({
+                'report_type': report_type_key,
+                'report_url': report_url,
+                'from_date': from_chunk,
+                'to_date': to_chunk,
+                'region_index': region_index,
+                'method': method_name,
+            })
+    tasks.sort(key=lambda task: task['from_date']) # Date-major order as before; stable, so regions keep their order
+    return tasks
+
+
+def describe_task(task):
+    """Short human readable label for status messages."""
+    label = f"{task['report_type']} {task['from_date']}->{task['to_date']}"
+    if task.get('region_index') is not None:
+        label += f" [{regions_data[task['region_index']]['name']}]"
+    return label
+
+
+class DownloadWorkerPool:
+    """
+    Bounded pool of WebAutomation workers sharing one task queue.
+    Each worker owns its own Chrome and download sub-folder; finished files are
+    moved back into the run folder and every task logs to the shared download_log.csv.
+    """
+
+    def __init__(self, driver_path, run_folder, worker_count, login_params, status_callback=None, app=None, automation_options=None, session_store=None, browser_pool=None, run_deadline=None, concurrency=None):
+        """
+        Args:
+            driver_path (str): Path to ChromeDriver.
+            run_folder (str): Folder that collects the final files for this run.
+            worker_count (int): Number of parallel browsers.
+            login_params (dict): login_url, email, password, otp_secret.
+            status_callback (function, optional): Status stream callback.
+            app (Flask, optional): App pushed as context in worker threads (needed by stream_status_update).
+            automation_options (dict, optional): Extra WebAutomation keyword arguments (e.g. lean_profile).
+            session_store (SessionStore, optional): Saved sessions; the first login reuses a valid one instead of an OTP login.
+            browser_pool (BrowserPool, optional): Workers lease prewarmed browsers from it and return them when done.
+            run_deadline (float, optional): Epoch time at which the run's time budget ends (None = no run budget).
+            concurrency (AdaptiveConcurrency, optional): Shared limit on exports in flight (None = every worker exports at once).
+        """
+        self.driver_path = driver_path
+        self.run_folder = run_folder
+        self.worker_count = max(1, int(worker_count))
+        self.login_params = login_params
+        self._status_callback = status_callback
+        self.app = app
+        self.automation_options = dict(automation_options or {})
+        self.browser_pool = browser_pool
+        self.run_deadline = run_deadline
+        self.concurrency = concurrency
+        self.tasks = queue.Queue()
+        self._results_lock = threading.Lock()
+        # One login for the whole pool; the other workers get a copy of its cookies
+        self.login_broker = LoginBroker(
+            login_params['login_url'], login_params['email'], login_params['password'], login_params['otp_secret'],
+            session_store=session_store, log_func=self._log
+        )
+        self.success_count = 0
+        self.fail_count = 0
+        self.wait_stats = WaitStats() # All workers' sleep vs condition wait time
+        # One retry budget for the whole run; per-chunk counts are kept per worker thread
+        self.retry_budget = RetryBudget(run_limit=self.automation_options.get('retry_run_limit', 0),
+                                        chunk_limit=self.automation_options.get('retry_chunk_limit', 0))
+
+    def _log(self, message):
+        if self._status_callback:
+            self._status_callback(message)
+        else:
+            print(message)
+
+    def _record_result(self, ok):
+        with self._results_lock:
+            if ok:
+                self.success_count += 1
+            else:
+                self.fail_count += 1
+
+    def run(self, tasks):
+        """Processes all tasks and returns a summary dict {'success', 'failed', 'total'}."""
+        for task in tasks:
+            self.tasks.put(task)
+        total = len(tasks)
+        worker_count = min(self.worker_count, total) if total else 0
+        self._log(f"Worker pool: {total} task(s) across {worker_count} worker(s).")
+
+        threads = []
+        for worker_num in range(1, worker_count + 1):
+            thread = threading.Thread(target=self._worker_entry, args=(worker_num,), name=f"download-worker-{worker_num}", daemon=True)
+            thread.start()
+            threads.append(thread)
+        for thread in threads:
+            thread.join()
+
+        # Tasks left behind means every worker died before the queue drained
+        leftover = 0
+        budget_exhausted = bool(self.run_deadline) and time.time() >= self.run_deadline
+        while True:
+            try:
+                task = self.tasks.get_nowait()
+            except queue.Empty:
+                break
+            leftover += 1
+            self._record_result(False)
+            WebAutomation.write_log_to_csv([
+                "pool", datetime.now().strftime("%Y-%m-%d %H:%M:%S"), "", task['from_date'],
+                "Failed (Run Budget Exhausted)" if budget_exhausted else "Failed (No Worker Available)",
+                task['to_date'], f"Not processed: {describe_task(task)}"
+            ], csv_filename)
+        if leftover:
+            reason = "the run's time budget ran out" if budget_exhausted else "no worker was available"
+            self._log(f"ERROR: {leftover} task(s) were not processed because {reason}.")
+
+        self._log(f"Worker pool finished. Success: {self.success_count}, Failed: {self.fail_count}, Total: {total}.")
+        self._log(f"Worker pool wait time: {self.wait_stats.describe()}.")
+        self._log(f"Worker pool retry time: {self.retry_budget.describe()}.")
+        if self.concurrency:
+            self._log(f"Worker pool concurrency: {self.concurrency.exports} exports, {self.concurrency.overloads} overloaded. {self.concurrency.describe()}")
+        return {'success': self.success_count, 'failed': self.fail_count, 'total': total}
+
+    def _requeue_stalled(self, task, stall_retries, log_func):
+        """Puts a task whose download stalled or timed out back at once as two half-range tasks (any worker may take them). False when out of retries."""
+        retries_left = task.get('stall_retries_left', stall_retries)
+        if retries_left <= 0:
+            return False
+        parts = halve_date_range(task['from_date'], task['to_date'])
+        for part_from, part_to in parts:
+            self.tasks.put(dict(task, from_date=part_from, to_date=part_to, stall_retries_left=retries_left - 1))
+        log_func(f"--- Task stalled: {describe_task(task)}. Re-queued as {len(parts)} part(s): {parts} ---")
+        return True
+
+    @staticmethod
+    def _overload_signal(automation, ok, error):
+        """Outcome reported to the concurrency controller: why the export showed overload, None if healthy, '' if neutral."""
+        if isinstance(error, TimeoutException):
+            return f"timeout ({type(error).__name__})"
+        if automation.last_overload:
+            return automation.last_overload
+        return None if ok else '' # Failures unrelated to load (click, rename) neither raise nor lower the limit
+
+    def _worker_entry(self, worker_num):
+        if self.app is not None:
+            with self.app.app_context():
+                self._worker_loop(worker_num)
+        else:
+            self._worker_loop(worker_num)
+
+    def _worker_loop(self, worker_num):
+        prefix = f"[W{worker_num}]"
+        log_func = lambda message: self._log(f"{prefix} {message}")
+        worker_folder = os.path.join(self.run_folder, f"_worker{worker_num}")
+        automation = None
+        own_retry_budget = None
+        try:
+            os.makedirs(worker_folder, exist_ok=True)
+            if self.browser_pool:
+                automation = self.browser_pool.lease(worker_folder, options=self.automation_options, status_callback=log_func)
+            else:
+                automation = WebAutomation(self.driver_path, worker_folder, status_callback=log_func, **self.automation_options)
+            automation.wait_stats.reset()
+            automation.deadlines.reset(self.run_deadline)
+            own_retry_budget, automation.retry_budget = automation.retry_budget, self.retry_budget
+            logged_in = self.login_broker.attach(automation, log_func)
+            if not logged_in:
+                log_func("ERROR: Worker login failed. Worker stopping; remaining tasks go to other workers.")
+                return
+
+            while True:
+                try:
+                    task = self.tasks.get_nowait()
+                except queue.Empty:
+                    break
+                label = describe_task(task)
+                if automation.deadlines.expired():
+                    self.tasks.put(task) # Logged as not processed by run()
+                    log_func(f"ERROR: Run time budget exhausted ({automation.deadlines.describe()}). Worker stopping.")
+                    break
+                if not automation.recycle_if_needed(log_func):
+                    self.tasks.put(task) # Back for the other workers
+                    log_func("ERROR: Worker browser could not be restarted. Worker stopping.")
+                    break
+                automation.last_overload = None
+                automation.last_first_byte = None
+                if self.concurrency and not self.concurrency.acquire(timeout=automation.deadlines.remaining()):
+                    self.tasks.put(task) # Logged as not processed by run()
+                    log_func("ERROR: Run time budget ran out while waiting for an export slot. Worker stopping.")
+                    break
+                log_func(f"--- Task started: {label} ---")
+                ok = False
+                task_error = None
+                automation.last_stall = None
+                automation.last_wait_timed_out = False
+                try:
+                    method = getattr(automation, task['method'])
+                    if task['region_index'] is not None:
+                        ok = method(task['report_url'], task['from_date'], task['to_date'], task['region_index'], status_callback=log_func)
+                    else:
+                        ok = method(task['report_url'], task['from_date'], task['to_date'], status_callback=log_func)
+                except WebDriverException as wd_e:
+                    task_error = wd_e
+                    log_func(f"WebDriver ERROR in task {label}: {type(wd_e).__name__} - {str(wd_e)[:150]}...")
+                    if "invalid session id" in str(wd_e).lower():
+                        self._record_result(False)
+                        log_func("FATAL: Worker session invalid. Worker stopping.")
+                        break
+                except Exception as e:
+                    task_error = e
+                    log_func(f"UNEXPECTED ERROR in task {label}: {type(e).__name__} - {e}")
+                    traceback.print_exc()
+                finally:
+                    if self.concurrency:
+                        self.concurrency.release(self._overload_signal(automation, ok, task_error), first_byte=automation.last_first_byte)
+                    moved = move_completed_files(worker_folder, self.run_folder, log_func)
+                    if moved:
+                        log_func(f"Moved to run folder: {moved}")
+
+                if not ok and automation._should_split_chunk() and self._requeue_stalled(task, automation.stall_retries, log_func):
+                    continue
+                self._record_result(bool(ok))
+                log_func(f"--- Task {'completed' if ok else 'FAILED'}: {label} ---")
+
+        except Exception as e:
+            log_func(f"FATAL: Worker crashed: {type(e).__name__} - {e}")
+            traceback.print_exc()
+        finally:
+            if automation:
+                self.wait_stats.merge(automation.wait_stats)
+                if own_retry_budget:
+                    automation.retry_budget = own_retry_budget # A pooled browser outlives this run
+            if automation and self.browser_pool:
+                self.browser_pool.release(automation)
+            elif automation:
+                automation.close()
+            try:
+                os.rmdir(worker_folder) # Only succeeds if empty
+            except OSError:
+                pass
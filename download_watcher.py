@@ -0,0 +1,273 @@
+# filename: download_watcher.py
+import os
+import sys
+import time
+import errno
+import select
+import struct
+import ctypes
+import ctypes.util
+
+PARTIAL_DOWNLOAD_SUFFIXES = ('.tmp', '.crdownload', '.part')
+PROGRESS_LOG_INTERVAL = 10 # Seconds between "in progress" messages
+POLL_INTERVAL = 0.5        # Polling backend: seconds between directory mtime checks
+
+# --- inotify (Linux) ---
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+_EVENT_HEADER = struct.Struct('iIII') # wd, mask, cookie, len
+
+_libc = None
+if sys.platform.startswith('linux'):
+    try:
+        _libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        _libc.inotify_init1.argtypes = [ctypes.c_int]
+        _libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+    except (OSError, AttributeError):
+        _libc = None
+
+
+def is_partial(name):
+    return name.lower().endswith(PARTIAL_DOWNLOAD_SUFFIXES)
+
+
+class DownloadStalled(Exception):
+    """A download did not start, or stopped receiving bytes, within the stall limits of wait()."""
+
+    def __init__(self, reason, partial_names=(), guid=None):
+        super().__init__(reason)
+        self.reason = reason
+        self.partial_names = list(partial_names) # Partial files left in the folder
+        self.guid = guid                         # DevTools download GUID when known (to cancel it in Chrome)
+
+
+class DownloadWatcher:
+    """
+    Waits for a finished download in one folder without re-listing it on every poll.
+    On Linux it uses inotify and wakes on IN_CLOSE_WRITE / IN_MOVED_TO (Chrome renames
+    '<name>.crdownload' to the final name when done). Elsewhere it falls back to polling
+    the folder's mtime and only lists the folder when that changes.
+    Start it BEFORE clicking export so no event is missed; wait()/check() return the
+    name of the first completed, non-empty file not in baseline (same contract as
+    WebAutomation.wait_for_download_to_finish).
+    """
+
+    def __init__(self, folder, baseline=None, scan_existing=False):
+        """
+        Args:
+            folder (str): Download folder to watch.
+            baseline (set, optional): File names present before the export (ignored).
+            scan_existing (bool, optional): Also look at files already in the folder (watcher started after the click).
+        """
+        self.folder = folder
+        self.baseline = set(baseline or ())
+        self._seen = set()      # New names already reported by the backend
+        self._pending = []      # Completed-looking names waiting for a non-empty size
+        self._partials = {}     # partial name -> (size, last growth time, last stall warning time)
+        self.last_growth = None # Last time any partial file grew (stall detection)
+        self.first_byte_at = None # When the first partial or completed file appeared (server response time)
+        self._fd = None
+        self._dir_mtime = None
+        self.backend = 'polling'
+        if _libc is not None:
+            fd = _libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+            if fd >= 0:
+                if _libc.inotify_add_watch(fd, os.fsencode(folder), IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE) >= 0:
+                    self._fd = fd
+                    self.backend = 'inotify'
+                else:
+                    os.close(fd)
+        if scan_existing or self.backend == 'polling':
+            self._scan_folder()
+
+    def close(self):
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    # --- Backends ---
+    def _note(self, name):
+        if name in self.baseline or name in self._seen:
+            return
+        self.first_byte_at = self.first_byte_at or time.time()
+        if is_partial(name) or name.startswith('Unconfirmed '):
+            if name not in self._partials:
+                self._partials[name] = (-1, time.time(), 0)
+                self.last_growth = time.time()
+            return
+        self._seen.add(name)
+        self._pending.append(name)
+
+    def _scan_folder(self):
+        """Lists the folder once (polling backend, or initial scan)."""
+        try:
+            self._dir_mtime = os.stat(self.folder).st_mtime_ns
+            names = os.listdir(self.folder)
+        except OSError:
+            return
+        for name in names:
+            self._note(name)
+
+    def _read_events(self, timeout):
+        """Collects inotify events, blocking up to timeout seconds for the first one."""
+        readable, _, _ = select.select([self._fd], [], [], max(0, timeout))
+        if not readable:
+            return
+        try:
+            data = os.read(self._fd, 64 * 1024)
+        except OSError as e:
+            if e.errno == errno.EAGAIN:
+                return
+            raise
+        offset = 0
+        while offset + _EVENT_HEADER.size <= len(data):
+            _, mask, _, name_len = _EVENT_HEADER.unpack_from(data, offset)
+            raw_name = data[offset + _EVENT_HEADER.size:offset + _EVENT_HEADER.size + name_len]
+            offset += _EVENT_HEADER.size + name_len
+            name = os.fsdecode(raw_name.rstrip(b'\0'))
+            if not name:
+                continue
+            if mask & IN_CREATE and not (is_partial(name) or name.startswith('Unconfirmed ')):
+                continue # Wait for the close/rename that finishes a directly written file
+            self._note(name)
+
+    def _poll_folder(self, timeout):
+        """Polling backend: sleeps, then lists the folder only if its mtime changed."""
+        time.sleep(max(0, min(timeout, POLL_INTERVAL)))
+        try:
+            mtime = os.stat(self.folder).st_mtime_ns
+        except OSError:
+            return
+        if mtime != self._dir_mtime:
+            self._scan_folder()
+
+    def _pop_completed(self):
+        """Returns the first pending name that is a non-empty file."""
+        for name in list(self._pending):
+            path = os.path.join(self.folder, name)
+            try:
+                if not os.path.isfile(path):
+                    self._pending.remove(name) # Moved away/renamed again
+                    continue
+                if os.path.getsize(path) > 0:
+                    self._pending.remove(name)
+                    return name
+            except OSError:
+                self._pending.remove(name)
+        return None
+
+    # --- Public API ---
+    def check(self):
+        """Non-blocking: name of a completed download, or None."""
+        if self._fd is not None:
+            self._read_events(0)
+        else:
+            self._poll_folder(0)
+        return self._pop_completed()
+
+    def _wait_for_events(self, timeout):
+        if self._fd is not None:
+            self._read_events(timeout)
+        else:
+            self._poll_folder(timeout)
+
+    def wait_started(self, timeout, poll=None):
+        """
+        Blocks until a new download appears (partial or completed file) and returns its name, or
+        None after timeout seconds. 'Unconfirmed N.crdownload' only counts once Chrome renamed it
+        to '<name>.crdownload', so the name can be followed to completion. poll as in wait().
+        """
+        start_time = time.time()
+        last_poll = start_time
+        while True:
+            # Prefer the partial file: it is the one Chrome is still writing
+            partials = sorted(name for name in self._partials if not name.startswith('Unconfirmed '))
+            if partials:
+                return partials[0]
+            if self._pending:
+                return sorted(self._pending)[0]
+            now = time.time()
+            remaining = timeout - (now - start_time)
+            if remaining <= 0:
+                return None
+            if poll and now - last_poll >= PROGRESS_LOG_INTERVAL:
+                last_poll = now
+                poll()
+            self._wait_for_events(min(remaining, PROGRESS_LOG_INTERVAL))
+
+    def _sample_partials(self, log_func=None):
+        """Reads partial file sizes (stall detection); with log_func also logs progress and stall warnings."""
+        now = time.time()
+        for name in list(self._partials):
+            try:
+                size = os.path.getsize(os.path.join(self.folder, name))
+            except OSError:
+                del self._partials[name] # Renamed to its final name or removed
+                continue
+            last_size, grew_at, warned_at = self._partials[name]
+            if size != last_size:
+                self._partials[name] = (size, now, warned_at)
+                self.last_growth = now
+                if log_func:
+                    log_func(f"Download in progress ({name}): {size} bytes...")
+            elif log_func and now - grew_at > 60 and now - warned_at > 60:
+                log_func(f"Warning: Download progress for '{name}' seems stalled at {size} bytes.")
+                self._partials[name] = (size, grew_at, now)
+
+    def stall_reason(self, started_at, stall_timeout=0, start_timeout=0):
+        """
+        Why the watched download counts as stalled, or None: no partial file appeared within
+        start_timeout seconds of started_at, or the partial files stopped growing for
+        stall_timeout seconds (0 = no limit). Same limits as wait(), for callers that poll check().
+        """
+        self._sample_partials()
+        now = time.time()
+        if start_timeout and self.last_growth is None and now - started_at >= start_timeout:
+            return f"no download started within {start_timeout}s of the export click"
+        if stall_timeout and self._partials and self.last_growth and now - self.last_growth >= stall_timeout:
+            return f"no new bytes for {stall_timeout}s"
+        return None
+
+    def wait(self, timeout, log_func=print, stall_timeout=0, start_timeout=0, poll=None):
+        """
+        Blocks until a download completes (returns its name) or timeout seconds pass (returns None).
+        Raises DownloadStalled when no partial file appeared within start_timeout seconds, or the
+        partial files stopped growing for stall_timeout seconds (0 = no limit).
+        poll (callable, optional) is called every PROGRESS_LOG_INTERVAL seconds; it may raise to end the wait.
+        """
+        start_time = time.time()
+        last_progress_log = start_time
+        while True:
+            completed = self._pop_completed()
+            if completed:
+                log_func(f"Detected completed file: {completed}")
+                return completed
+            now = time.time()
+            remaining = timeout - (now - start_time)
+            if remaining <= 0:
+                break
+            if now - last_progress_log >= PROGRESS_LOG_INTERVAL:
+                last_progress_log = now
+                self._sample_partials(log_func)
+                if poll:
+                    poll()
+            stalled = self.stall_reason(start_time, stall_timeout, start_timeout)
+            if stalled:
+                raise DownloadStalled(stalled, partial_names=sorted(self._partials))
+            self._wait_for_events(min(remaining, PROGRESS_LOG_INTERVAL))
+
+        log_func(f"WARNING: Download wait timed out after {timeout} seconds.")
+        if self._partials:
+            log_func(f"Timeout occurred with file(s) still potentially downloading: {sorted(self._partials)}")
+        else:
+            log_func("Timeout occurred and no new completed or partial files were detected.")
+        return None
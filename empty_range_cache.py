@@ -0,0 +1,85 @@
+# filename: empty_range_cache.py
+import os
+import threading
+from datetime import datetime, timedelta
+
+from utils import load_json_file, save_json_file
+
+DEFAULT_CACHE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'empty_ranges.json')
+
+
+class EmptyRangeCache:
+    """
+    Persistent set of (report, variant, date range, region) exports the portal answered with
+    "no data". Only closed periods are recorded (ranges ending at least closed_days ago), since
+    recent days may still receive data; later runs skip those exports without opening the page.
+    Entries expire after max_age_days so a backfilled period is eventually exported again.
+    """
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, closed_days=3, max_age_days=90, log_func=print):
+        """
+        Args:
+            path (str): JSON file holding the empty ranges.
+            closed_days (int, optional): A range is closed when its end date is at least this many days ago.
+            max_age_days (int, optional): Entries older than this are ignored and dropped (0 = never expire).
+            log_func (function, optional): Warnings (file errors).
+        """
+        self.path = path
+        self.closed_days = int(closed_days)
+        self.max_age_days = int(max_age_days)
+        self._log = log_func
+        self._lock = threading.Lock()
+        self._entries = self._load()
+
+    @staticmethod
+    def _key(report_url, variant, from_date, to_date, region_index):
+        return f"{report_url.split('?')[0].lower()}|{variant or ''}|{from_date}|{to_date}|{'' if region_index is None else region_index}"
+
+    def _load(self):
+        entries = load_json_file(self.path)
+        if self.max_age_days:
+            oldest = (datetime.now() - timedelta(days=self.max_age_days)).strftime('%Y-%m-%d %H:%M:%S')
+            entries = {key: recorded_at for key, recorded_at in entries.items() if recorded_at >= oldest}
+        return entries
+
+    def _save(self):
+        save_json_file(self.path, self._entries, self._log, "empty range cache", sort_keys=True)
+
+    def is_closed(self, to_date):
+        """True if the range ending on to_date (YYYY-MM-DD) is old enough to be cached."""
+        try:
+            end = datetime.strptime(to_date, '%Y-%m-%d').date()
+        except (ValueError, TypeError):
+            return False
+        return end <= datetime.now().date() - timedelta(days=self.closed_days)
+
+    def is_empty(self, report_url, variant, from_date, to_date, region_index=None):
+        with self._lock:
+            return self._key(report_url, variant, from_date, to_date, region_index) in self._entries
+
+    def add(self, report_url, variant, from_date, to_date, region_index=None):
+        """Records an empty export. Returns False (not recorded) when the range is not closed yet."""
+        if not self.is_closed(to_date):
+            return False
+        with self._lock:
+            self._entries[self._key(report_url, variant, from_date, to_date, region_index)] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+            self._save()
+        return True
+
+    def __len__(self):
+        return len(self._entries)
+
+
+_cache = None
+
+
+def get_empty_cache():
+    """The shared cache, or None when it was not enabled with init_empty_cache()."""
+    return _cache
+
+
+def init_empty_cache(path, closed_days=3, max_age_days=90, log_func=print):
+    """Enables the shared cache (call once at app start)."""
+    global _cache
+    _cache = EmptyRangeCache(path, closed_days=closed_days, max_age_days=max_age_days, log_func=log_func)
+    return _cache
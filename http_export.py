@@ -0,0 +1,264 @@
+# filename: http_export.py
+import os
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from html.parser import HTMLParser
+from urllib.parse import urljoin, unquote
+
+import requests # type: ignore
+from requests.adapters import HTTPAdapter # type: ignore
+
+from logic_download import (
+    report_variants, format_date_ddmmyyyy,
+    FROM_DATE_PICKER_ID, TO_DATE_PICKER_ID, CSV_EXPORT_BUTTON_LOCATOR,
+)
+
+# --- Timeouts ---
+HTTP_CONNECT_TIMEOUT = 30   # Seconds to open a connection
+HTTP_READ_TIMEOUT = 3600    # Seconds between bytes while the server builds/streams an export
+STREAM_CHUNK_SIZE = 256 * 1024
+
+
+class HttpExportRejected(Exception):
+    """The server did not answer the replayed postback with a file (expired session, validation error, ...)."""
+    pass
+
+
+class HttpSessionExpired(HttpExportRejected):
+    """The report page answered 401/403 or redirected away from the report (to the login page)."""
+    pass
+
+
+class _FormFieldParser(HTMLParser):
+    """Collects what the browser would post for the page's ASP.NET form."""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.action = None
+        self.fields = {}      # name -> value of successful controls
+        self.names_by_id = {} # input id -> name
+        self.radios = {}      # radio id -> (name, value)
+        self._select_name = None
+        self._select_value = None
+        self._textarea_name = None
+
+    def handle_starttag(self, tag, attrs):
+        attrs = dict(attrs)
+        if tag == 'form' and self.action is None:
+            self.action = attrs.get('action') or ''
+        elif tag == 'input':
+            name = attrs.get('name')
+            if not name:
+                return
+            input_type = (attrs.get('type') or 'text').lower()
+            if attrs.get('id'):
+                self.names_by_id[attrs['id']] = name
+                if input_type == 'radio':
+                    self.radios[attrs['id']] = (name, attrs.get('value') or 'on')
+            if input_type in ('submit', 'button', 'image', 'reset', 'file'):
+                return # Only the control that triggered the postback is sent
+            if input_type in ('checkbox', 'radio') and 'checked' not in attrs:
+                return
+            self.fields[name] = attrs.get('value') or ''
+        elif tag == 'select':
+            self._select_name = attrs.get('name')
+            self._select_value = None
+        elif tag == 'option' and self._select_name:
+            if self._select_value is None or 'selected' in attrs:
+                self._select_value = attrs.get('value') or ''
+        elif tag == 'textarea' and attrs.get('name'):
+            self._textarea_name = attrs['name']
+            self.fields[self._textarea_name] = ''
+
+    def handle_data(self, data):
+        if self._textarea_name:
+            self.fields[self._textarea_name] += data
+
+    def handle_endtag(self, tag):
+        if tag == 'select' and self._select_name:
+            self.fields[self._select_name] = self._select_value or ''
+            self._select_name = None
+        elif tag == 'textarea':
+            self._textarea_name = None
+
+
+def _filename_from_disposition(disposition):
+    """Filename from a Content-Disposition header (RFC 5987 filename* preferred)."""
+    filename = None
+    for part in disposition.split(';'):
+        key, _, value = part.strip().partition('=')
+        key = key.strip().lower()
+        value = value.strip().strip('"')
+        if key == 'filename*' and "''" in value:
+            return os.path.basename(unquote(value.split("''", 1)[1]))
+        if key == 'filename' and value:
+            filename = os.path.basename(unquote(value))
+    return filename
+
+
+class HttpExportEngine:
+    """
+    Replays the report export postback over plain HTTP using the cookies of a logged-in
+    browser. The report page is fetched once per report to read __VIEWSTATE/__EVENTVALIDATION
+    and the other form fields; each chunk then posts that form with its own dates and the
+    export button as __EVENTTARGET, streaming the attachment straight into the download folder.
+    Region reports (tree selection) are not replayed and stay on the browser path.
+    """
+
+    def __init__(self, cookies, download_folder, user_agent=None, max_workers=4, log_func=print):
+        """
+        Args:
+            cookies (list): Cookie dicts as returned by driver.get_cookies().
+            download_folder (str): Where exported files are written.
+            user_agent (str, optional): Sent with every request (use the browser's so the session is accepted).
+            max_workers (int, optional): Concurrent export postbacks.
+            log_func (function, optional): Status callback.
+        """
+        self.download_folder = download_folder
+        self.max_workers = max(1, int(max_workers))
+        self.log_func = log_func
+        self._name_lock = threading.Lock() # Reserves unique file names across threads
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=self.max_workers, pool_maxsize=self.max_workers)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        if user_agent:
+            self.session.headers['User-Agent'] = user_agent
+        for cookie in cookies:
+            self.session.cookies.set(cookie['name'], cookie['value'], domain=cookie.get('domain'), path=cookie.get('path', '/'))
+
+    @classmethod
+    def from_driver(cls, driver, download_folder, max_workers=4, log_func=print):
+        """Builds an engine sharing the session cookies and User-Agent of a logged-in WebDriver."""
+        user_agent = driver.execute_script("return navigator.userAgent;")
+        return cls(driver.get_cookies(), download_folder, user_agent=user_agent, max_workers=max_workers, log_func=log_func)
+
+    def close(self):
+        self.session.close()
+
+    # --- Form Handling ---
+    def load_form(self, report_url):
+        """
+        GETs the report page and returns (post_url, parser).
+        Raises HttpSessionExpired if the session is not accepted (401/403 or redirected to login),
+        HttpExportRejected if the page is not a usable report form.
+        """
+        response = self.session.get(report_url, timeout=(HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT))
+        if response.status_code in (401, 403):
+            raise HttpSessionExpired(f"Report page returned HTTP {response.status_code}.")
+        if response.history and response.url.split('?')[0].lower() != report_url.split('?')[0].lower():
+            raise HttpSessionExpired(f"Report page redirected to {response.url}.")
+        if response.status_code != 200:
+            raise HttpExportRejected(f"Report page returned HTTP {response.status_code}.")
+        parser = _FormFieldParser()
+        parser.feed(response.text)
+        if '__VIEWSTATE' not in parser.fields:
+            raise HttpExportRejected("Report page has no __VIEWSTATE (session expired or not an ASP.NET form).")
+        for picker_id in (FROM_DATE_PICKER_ID, TO_DATE_PICKER_ID):
+            if picker_id not in parser.names_by_id or f"{picker_id}_dateInput" not in parser.names_by_id:
+                raise HttpExportRejected(f"Date picker '{picker_id}' not found on report page.")
+        return urljoin(response.url, parser.action or ''), parser
+
+    @staticmethod
+    def _set_date(fields, parser, picker_id, date_str):
+        """Writes a yyyy-mm-dd date into the RadDatePicker fields the way its client script does."""
+        display_value = format_date_ddmmyyyy(date_str)
+        fields[parser.names_by_id[picker_id]] = date_str
+        fields[parser.names_by_id[f"{picker_id}_dateInput"]] = display_value
+        client_state_name = parser.names_by_id.get(f"{picker_id}_dateInput_ClientState")
+        if client_state_name:
+            try:
+                state = json.loads(fields.get(client_state_name) or '{}')
+            except ValueError:
+                state = {}
+            state.update({
+                'validationText': f"{date_str}-00-00-00",
+                'valueAsString': f"{date_str}-00-00-00",
+                'lastSetTextBoxValue': display_value,
+            })
+            fields[client_state_name] = json.dumps(state, separators=(',', ':'))
+
+    def build_postback(self, parser, from_date, to_date, variant, export_button_id):
+        """Returns the form dict for one export postback."""
+        fields = dict(parser.fields)
+        self._set_date(fields, parser, FROM_DATE_PICKER_ID, from_date)
+        self._set_date(fields, parser, TO_DATE_PICKER_ID, to_date)
+        radio_id = report_variants[variant]["radio_id"]
+        if radio_id:
+            if radio_id not in parser.radios:
+                raise HttpExportRejected(f"Report type radio '{radio_id}' not found on report page.")
+            radio_name, radio_value = parser.radios[radio_id]
+            fields[radio_name] = radio_value
+        button_name = parser.names_by_id.get(f"{export_button_id}_input") or parser.names_by_id.get(export_button_id)
+        if not button_name:
+            raise HttpExportRejected(f"Export button '{export_button_id}' not found on report page.")
+        fields['__EVENTTARGET'] = button_name[:-len('_input')] if button_name.endswith('_input') else button_name
+        fields['__EVENTARGUMENT'] = ''
+        return fields
+
+    # --- Export ---
+    def _reserve_path(self, filename):
+        """Picks a free name in the download folder like Chrome does ('name (1).csv')."""
+        base, ext = os.path.splitext(filename)
+        with self._name_lock:
+            candidate, counter = filename, 1
+            while os.path.exists(os.path.join(self.download_folder, candidate)) or os.path.exists(os.path.join(self.download_folder, candidate + '.part')):
+                candidate = f"{base} ({counter}){ext}"
+                counter += 1
+            open(os.path.join(self.download_folder, candidate + '.part'), 'wb').close() # Claim the name
+        return candidate
+
+    def export_chunk(self, post_url, referer, fields, from_date, to_date):
+        """Posts one export and streams the attachment to disk. Returns the final file name."""
+        response = self.session.post(post_url, data=fields, headers={'Referer': referer}, stream=True,
+                                     timeout=(HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT))
+        try:
+            disposition = response.headers.get('Content-Disposition', '')
+            if response.status_code != 200 or 'attachment' not in disposition.lower():
+                raise HttpExportRejected(f"Export {from_date}-{to_date} answered HTTP {response.status_code} "
+                                         f"({response.headers.get('Content-Type', 'unknown type')}) without a file.")
+            filename = _filename_from_disposition(disposition) or f"export_{from_date}_{to_date}.csv"
+            filename = self._reserve_path(filename)
+            partial_path = os.path.join(self.download_folder, filename + '.part')
+            try:
+                with open(partial_path, 'wb') as out_file:
+                    for block in response.iter_content(chunk_size=STREAM_CHUNK_SIZE):
+                        if block:
+                            out_file.write(block)
+                os.replace(partial_path, os.path.join(self.download_folder, filename))
+            except BaseException:
+                if os.path.exists(partial_path):
+                    os.remove(partial_path)
+                raise
+            return filename
+        finally:
+            response.close()
+
+    def export_chunks(self, report_url, date_ranges, variant, export_button_id=None):
+        """
+        Exports every (from, to) chunk concurrently.
+        Returns a list aligned with date_ranges: the downloaded file name, or None if that chunk was rejected.
+        Raises HttpExportRejected if the report form itself cannot be used (nothing was exported).
+        """
+        export_button_id = export_button_id or CSV_EXPORT_BUTTON_LOCATOR[1].rsplit('_input', 1)[0]
+        post_url, parser = self.load_form(report_url)
+        postbacks = [self.build_postback(parser, from_chunk, to_chunk, variant, export_button_id) for from_chunk, to_chunk in date_ranges]
+        self.log_func(f"HTTP export: {len(date_ranges)} chunk(s) with up to {self.max_workers} concurrent request(s).")
+
+        def run(index):
+            # Runs in a pool thread: returns (filename, message) and leaves logging to the calling thread,
+            # since log_func may need the caller's context (Flask app context of stream_status_update).
+            from_chunk, to_chunk = date_ranges[index]
+            try:
+                filename = self.export_chunk(post_url, report_url, postbacks[index], from_chunk, to_chunk)
+                return filename, f"HTTP export {from_chunk}-{to_chunk}: saved '{filename}'."
+            except (HttpExportRejected, requests.RequestException, OSError) as e:
+                return None, f"HTTP export {from_chunk}-{to_chunk} rejected: {type(e).__name__} - {str(e)[:150]}"
+
+        results = []
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(date_ranges)) or 1) as executor:
+            for filename, message in executor.map(run, range(len(date_ranges))):
+                self.log_func(message)
+                results.append(filename)
+        return results
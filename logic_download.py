@@ -4,10 +4,29 @@ import time
 import csv
 import traceback
 import functools
+import shutil
+import threading
 import zipfile # Needed for extract_zip_files
 from datetime import datetime, timedelta
 
 import pyotp # type: ignore
+try:
+    import psutil # type: ignore
+except ImportError: # Memory-based browser recycling is skipped without psutil
+    psutil = None
+
+from download_events import CdpDownloadTracker, enable_download_events
+from download_watcher import DownloadWatcher, DownloadStalled, PARTIAL_DOWNLOAD_SUFFIXES, is_partial
+from profile_slots import acquire_profile_slot, DEFAULT_SIZE_CAP_MB
+from session_monitor import SessionMonitor, HEALTH_OK
+from process_registry import get_registry
+from page_waits import PageWaits, WaitStats
+from page_health import PageHealthProbe, PAGE_LOGIN, PAGE_UNKNOWN, PAGE_SERVER_ERROR
+from empty_range_cache import get_empty_cache
+from chunk_planner import get_chunk_planner
+from click_strategy_cache import get_click_cache, CLICK_STRATEGIES
+from deadlines import DeadlineBudget, DeadlineExceeded, get_watchdog
+from retry_policy import RetryPolicy, RetryBudget, classify_failure, RETRY_TRANSIENT, RETRY_SESSION, RETRY_PERMANENT
 # import requests # Removed if not used directly for downloads
 # from requests.adapters import HTTPAdapter # Removed
 # from urllib3.util.retry import Retry # Removed
@@ -32,14 +51,28 @@ from selenium.common.exceptions import (
 
 # --- Constants ---
 # Increased timeouts (in seconds)
+# The four timeouts below are upper bounds: every wait and command also stops at the deadline
+# of the run/report/chunk/step budget it runs in (see deadlines.py)
 SELENIUM_COMMAND_TIMEOUT = 3600 # Increased from default (usually 60s) for Selenium commands
 WEBDRIVER_WAIT_TIMEOUT = 3600   # Increased timeout for explicit waits (WebDriverWait)
 PAGE_LOAD_TIMEOUT = 3600        # Increased timeout for page loads
 DOWNLOAD_WAIT_TIMEOUT = 3600   # Max time to wait for a single file download (15 min)
+STEP_BUDGET = 300              # Default: time budget of one form step (open page, fill dates, select region, click export; 0 = none)
+CHUNK_BUDGET = DOWNLOAD_WAIT_TIMEOUT + 900 # Default: time budget of one chunk, its retries included (0 = none)
+DOWNLOAD_STALL_TIMEOUT = 300   # Default: cancel a download that received no bytes for this long (0 = never)
+DOWNLOAD_START_TIMEOUT = 600   # Default: give up when no download started this long after the export click (0 = never)
+CLICK_STRATEGY_NAMES = {'native': "Selenium native .click()", 'actions': "ActionChains click", 'js': "JavaScript click"}
 RETRY_DELAY = 10               # Default delay between retries for operations
 CLICK_RETRY_DELAY = 15         # Longer delay specifically for click retries
 MAX_RETRIES = 3                # Default number of retries for operations prone to failure
-SHORT_WAIT = 2                 # Short pause time in seconds
+RETRY_CHUNK_LIMIT = 4          # Default: retries (all retry loops together) one chunk may spend (0 = unlimited)
+RETRY_RUN_LIMIT = 50           # Default: retries one run may spend (0 = unlimited)
+PAGE_REFRESH_POLICY = RetryPolicy(attempts=4, delay=3, backoff=2, max_delay=30) # Refreshes of a 502/503 error page
+SHORT_WAIT = 2                 # Short pause time in seconds (max wait for the page to settle after a form click)
+EVENT_POLL_INTERVAL = 0.25     # Poll interval for DevTools download events
+EMPTY_CHECK_INTERVAL = 10      # Tab exports: seconds between "no data" checks of a tab whose download has not started
+POSTBACK_SETTLE = 0.3          # Seconds the page must stay idle after a form click before it counts as settled
+SESSION_PROBE_TIMEOUT = 20     # Max wait for the report form when checking a restored session
 
 # --- Region Data (Keep as defined) ---
 regions_data = {
@@ -52,15 +85,136 @@ regions_data = {
     6: {"name": "MB1", "xpath": "/html/body/form/div[1]/div/div/ul/li/span[3]/div/ul/li/ul/li[7]/div/span[3]"}
 }
 
+# --- Report Page Locators (shared by the BI report pages) ---
+# !!! VERIFY THESE LOCATORS AGAINST THE ACTUAL REPORT PAGES !!!
+FROM_DATE_LOCATOR = (By.ID, 'ctl00_MainContent_cbo_fromDate_dateInput')
+TO_DATE_LOCATOR = (By.ID, 'ctl00_MainContent_cbo_toDate_dateInput')
+CSV_EXPORT_BUTTON_LOCATOR = (By.ID, 'ctl00_MainContent_btnExportCSVDemo_input')
+REGION_EXPORT_BUTTON_LOCATOR = (By.ID, 'ctl00_MainContent_btnExportExcel_input')
+REGION_TREE_ARROW_LOCATOR = (By.ID, 'ctl00_MainContent_TreeShopThuoc1_cboDepartmentsThuoc_Arrow')
+REGION_DROPDOWN_CLOSE_LOCATOR = (By.XPATH, "//div[contains(@class,'RadWindow')]//span[contains(text(), 'Báo Cáo Nhập Xuất Tồn FAF')]") # Example, needs verification
+FROM_DATE_PICKER_ID = 'ctl00_MainContent_cbo_fromDate'
+TO_DATE_PICKER_ID = 'ctl00_MainContent_cbo_toDate'
+REGION_COMBO_ID = 'ctl00_MainContent_TreeShopThuoc1_cboDepartmentsThuoc'
+# Shown instead of the report when the portal session has expired
+LOGIN_BUTTON_LOCATOR = (By.ID, 'kt_login_signin_submit')
+# "No data" answers to an export (alert text or page message), compared lower-cased
+# !!! VERIFY THESE AGAINST THE ACTUAL "NO DATA" RESPONSES OF THE REPORT PAGES !!!
+EMPTY_RESULT_MARKERS = ('không có dữ liệu', 'khong co du lieu', 'không tìm thấy dữ liệu', 'no data', 'no records')
+EMPTY_MESSAGE_SCRIPT = """
+var markers = arguments[0];
+var nodes = document.querySelectorAll('[id*="lblMessage"], [id*="lblMsg"], [id*="lblThongBao"], .RadNotification, .rnContentWrapper, .alert, .validation-summary-errors');
+for (var i = 0; i < nodes.length; i++) {
+    if (nodes[i].offsetParent === null) { continue; }
+    var text = (nodes[i].innerText || '').trim();
+    var lower = text.toLowerCase();
+    for (var j = 0; j < markers.length; j++) { if (lower.indexOf(markers[j]) !== -1) { return text.slice(0, 200); } }
+}
+return null;
+"""
+
+# --- Lean Browser Profile ---
+# Requests dropped by Network.setBlockedURLs in lean mode. Stylesheets and scripts are
+# kept: the Telerik controls need them to render and to expose their client API.
+LEAN_BLOCKED_URL_PATTERNS = [
+    '*.png', '*.jpg', '*.jpeg', '*.gif', '*.bmp', '*.svg', '*.ico', '*.webp',
+    '*.woff', '*.woff2', '*.ttf', '*.otf', '*.eot',
+    '*google-analytics.com*', '*googletagmanager.com*', '*doubleclick.net*',
+    '*facebook.net*', '*hotjar.com*', '*clarity.ms*',
+]
+LEAN_CHROME_ARGUMENTS = [
+    '--headless=new',
+    '--blink-settings=imagesEnabled=false',
+    '--disable-background-networking',
+    '--disable-background-timer-throttling', # Export tabs in the background keep full speed
+    '--disable-backgrounding-occluded-windows',
+    '--disable-renderer-backgrounding',
+    '--disable-component-update',
+    '--disable-default-apps',
+    '--disable-sync',
+    '--disable-features=Translate,OptimizationHints,MediaRouter,AutofillServerCommunication',
+    '--metrics-recording-only',
+    '--no-first-run',
+    '--mute-audio',
+]
+
+# --- Scripted Form Fill ---
+# Fills the whole report form and clicks export in ONE execute_script call using the
+# Telerik client API ($find). Everything is validated before anything is changed, so a
+# {ok: false} result leaves the form untouched for the step-by-step fallback.
+# Region nodes follow regions_data: index n is child n of the first root node (li[n+1] in the XPaths).
+FAST_FILL_SCRIPT = """
+var args = arguments[0];
+function toDate(value) { var p = value.split('-'); return new Date(+p[0], +p[1] - 1, +p[2]); }
+if (typeof $find !== 'function') { return {ok: false, reason: 'Telerik client API not available'}; }
+var fromPicker = $find(args.fromPicker), toPicker = $find(args.toPicker);
+if (!fromPicker || !toPicker) { return {ok: false, reason: 'date pickers not found'}; }
+var radio = null;
+if (args.radio) {
+    radio = document.getElementById(args.radio);
+    if (!radio) { return {ok: false, reason: 'radio ' + args.radio + ' not found'}; }
+}
+var regionNodes = null;
+if (args.region !== null) {
+    var dropDown = document.getElementById(args.combo + '_DropDown') || document.getElementById(args.combo);
+    var treeElement = dropDown ? dropDown.querySelector('.RadTreeView') : null;
+    var tree = treeElement ? $find(treeElement.id) : null;
+    if (!tree || tree.get_nodes().get_count() === 0) { return {ok: false, reason: 'region tree not found'}; }
+    regionNodes = tree.get_nodes().getNode(0).get_nodes();
+    if (args.region >= regionNodes.get_count()) { return {ok: false, reason: 'region node ' + args.region + ' not found'}; }
+}
+var button = $find(args.button);
+var buttonInput = document.getElementById(args.button + '_input');
+if (!(button && typeof button.click === 'function') && !buttonInput) { return {ok: false, reason: 'export button not found'}; }
+
+toPicker.set_selectedDate(toDate(args.to));
+fromPicker.set_selectedDate(toDate(args.from));
+if (radio) { radio.checked = true; }
+if (regionNodes) {
+    for (var i = 0; i < regionNodes.get_count(); i++) { regionNodes.getNode(i).set_checked(i === args.region); }
+}
+if (button && typeof button.click === 'function') { button.click(); } else { buttonInput.click(); }
+return {ok: true};
+"""
+
+# --- Report Variants (report type radio + file suffix) ---
+# Keys are referenced by the per-chunk download methods below.
+report_variants = {
+    "generic": {"radio_id": None, "suffix": "", "description": "Generic report"},
+    "001": {"radio_id": "ctl00_MainContent_rblType_1", "suffix": "", "description": "FAF001 Report Type Radio"},
+    "004N": {"radio_id": "ctl00_MainContent_rblType_1", "suffix": "N", "description": "FAF004N Report Type Radio (Imports)"}, # Assume Imports type is index 1
+    "004X": {"radio_id": "ctl00_MainContent_rblType_0", "suffix": "X", "description": "FAF004X Report Type Radio (Exports)"}, # Assume Exports type is index 0
+}
+# Chunk download method name -> variant key (used when chunks are driven outside the method, e.g. in tabs)
+chunk_method_variants = {
+    "download_generic_report": "generic",
+    "download_report_001": "001",
+    "download_report_004N": "004N",
+    "download_report_004X": "004X",
+}
+
 # --- Global Path Definitions ---
 current_folder = os.path.dirname(os.path.abspath(__file__))
 csv_filename = os.path.join(current_folder, 'download_log.csv') # Default log name
+_csv_lock = threading.Lock() # Serializes log writes when several workers share one CSV
 
 # --- Custom Exception Class ---
 # Moved definition UP so it's known before being used in decorators
 class DownloadFailedException(Exception):
-    """Custom exception for download failures after retries or specific errors."""
-    pass
+    """Custom exception for download failures after retries or specific errors. `retry_class` tells retry loops whether another attempt can help."""
+    def __init__(self, message="", retry_class=RETRY_TRANSIENT):
+        super().__init__(message)
+        self.retry_class = retry_class
+
+class EmptyExportResult(Exception):
+    """The portal answered an export with "no data" (alert or page message); the chunk is logged as Empty, not failed."""
+    retry_class = RETRY_PERMANENT
+
+class PageHealthError(DownloadFailedException):
+    """The portal answered with an error page (502/503, ASP.NET error) that did not clear after refreshing. `health` is the PageHealth."""
+    def __init__(self, health):
+        super().__init__(f"Portal error page: {health.describe()}", retry_class=RETRY_TRANSIENT if health.transient else RETRY_PERMANENT)
+        self.health = health
 
 # --- Helper Functions ---
 def format_date_ddmmyyyy(date_str):
@@ -79,14 +233,93 @@ def format_date_ddmmyyyy(date_str):
         print(f"Warning: Could not format date '{date_str}' to DD/MM/YYYY: {e}. Returning original.")
         return str(date_str) # Return original string representation on error
 
+def split_date_range(start_date_str, end_date_str, chunk_size, log_func=print):
+    """Splits a date range into smaller chunks (usable without a browser, e.g. when planning worker tasks)."""
+    try:
+        start = datetime.strptime(start_date_str, '%Y-%m-%d')
+        end = datetime.strptime(end_date_str, '%Y-%m-%d')
+    except (ValueError, TypeError) as e:
+         log_func(f"ERROR parsing date range: '{start_date_str}' to '{end_date_str}'. Invalid format or empty? Error: {e}")
+         return []
+
+    if start > end:
+        log_func(f"Warning: Start date {start_date_str} is after end date {end_date_str}. No chunks generated.")
+        return []
+
+    date_ranges = []
+    current_start = start
+
+    while current_start <= end:
+        chunk_end_date = end # Default to end if chunk_size is invalid
+        if chunk_size == 'month':
+            # End of the current month
+            month_end = (current_start.replace(day=1) + timedelta(days=32)).replace(day=1) - timedelta(days=1)
+            chunk_end_date = min(month_end, end)
+        elif isinstance(chunk_size, int) and chunk_size > 0:
+            # Calculate end based on number of days
+            chunk_end_date = min(current_start + timedelta(days=chunk_size - 1), end)
+        else:
+             log_func(f"Warning: Invalid chunk size '{chunk_size}'. Processing range {current_start.strftime('%Y-%m-%d')} to {end.strftime('%Y-%m-%d')} as single chunk.")
+             chunk_end_date = end # Process remaining range as one chunk
+
+        date_ranges.append((current_start.strftime('%Y-%m-%d'), chunk_end_date.strftime('%Y-%m-%d')))
+        # Move to the next day after the current chunk ends
+        current_start = chunk_end_date + timedelta(days=1)
+
+        # Safety break
+        if len(date_ranges) > 1000: # Limit chunks to prevent infinite loops
+            log_func("ERROR: Exceeded maximum number of chunks (1000). Stopping split.")
+            break
+
+    return date_ranges
+
+
+def halve_date_range(from_date, to_date):
+    """Splits a chunk into two halves (for retrying a stalled export with less data). Returns [(from, to)] unchanged for a single day."""
+    start = datetime.strptime(from_date, '%Y-%m-%d')
+    end = datetime.strptime(to_date, '%Y-%m-%d')
+    if end <= start:
+        return [(from_date, to_date)]
+    middle = start + timedelta(days=(end - start).days // 2)
+    return [(from_date, middle.strftime('%Y-%m-%d')), ((middle + timedelta(days=1)).strftime('%Y-%m-%d'), to_date)]
+
+def move_completed_files(source_folder, target_folder, log_func=print):
+    """Moves finished (non-partial) files from source_folder into target_folder, avoiding name clashes."""
+    moved = []
+    try:
+        names = os.listdir(source_folder)
+    except OSError as e:
+        log_func(f"Warning: Could not list folder {source_folder}: {e}")
+        return moved
+
+    for name in names:
+        src = os.path.join(source_folder, name)
+        if not os.path.isfile(src) or name.lower().endswith(PARTIAL_DOWNLOAD_SUFFIXES):
+            continue
+        base, ext = os.path.splitext(name)
+        dst = os.path.join(target_folder, name)
+        counter = 1
+        while os.path.exists(dst):
+            dst = os.path.join(target_folder, f"{base}_{counter}{ext}")
+            counter += 1
+        try:
+            shutil.move(src, dst)
+            moved.append(os.path.basename(dst))
+        except (OSError, shutil.Error) as e:
+            log_func(f"Warning: Could not move '{name}' to {target_folder}: {e}")
+    return moved
+
 def retry_on_exception(exceptions=(WebDriverException,), retries=MAX_RETRIES, delay=RETRY_DELAY, backoff=1.5):
     """
-    Decorator to retry a function on specific Selenium exceptions with exponential backoff.
-    Catches WebDriverException by default.
-    Now `DownloadFailedException` (if included in `exceptions`) is defined before this point.
+    Decorator to retry a function on `exceptions` with jittered exponential backoff.
+    Failures are classified first (retry_policy.classify_failure): only transient ones are
+    retried, session and permanent ones are raised at once. Each retry is taken from the
+    instance's RetryBudget, so nested retry loops share one per-chunk/per-run allowance,
+    and is not made when the current time budget cannot cover the backoff.
     """
     if not isinstance(exceptions, tuple):
         exceptions = (exceptions,)
+    policy = RetryPolicy(retries, delay, backoff)
 
     def decorator(func):
         @functools.wraps(func)
@@ -94,38 +327,45 @@ def retry_on_exception(exceptions=(WebDriverException,), retries=MAX_RETRIES, de
             status_callback = kwargs.get('status_callback')
             instance = args[0] if args and isinstance(args[0], WebAutomation) else None
             attempt = 0
-            current_delay = delay
-            last_exception = None
 
-            while attempt < retries:
+            while True:
                 attempt += 1
+                attempt_started = time.time()
                 try:
                     return func(*args, **kwargs)
-                except exceptions as e: # This now correctly handles DownloadFailedException if passed
-                    last_exception = e
-                    is_recoverable_timeout = isinstance(e, WebDriverException) and \
-                                             ('timed out' in str(e).lower() or 'connection refused' in str(e).lower())
-
+                except exceptions as e:
+                    failure_class = classify_failure(e)
                     if status_callback:
-                        status_callback(f"WARNING: Attempt {attempt}/{retries} failed for {func.__name__} with {type(e).__name__}. Error: {str(e)[:150]}...")
+                        status_callback(f"WARNING: Attempt {attempt}/{retries} failed for {func.__name__} with {type(e).__name__} ({failure_class}). Error: {str(e)[:150]}...")
+
+                    current_delay = policy.backoff_delay(attempt)
+                    refusal = None
+                    if failure_class != RETRY_TRANSIENT:
+                        refusal = f"{failure_class} failure"
+                    elif attempt >= policy.attempts:
+                        refusal = f"max retries ({retries}) reached"
+                    elif instance:
+                        remaining = instance.deadlines.remaining()
+                        if remaining is not None and remaining <= current_delay:
+                            refusal = f"time budget too short for another attempt ({instance.deadlines.describe()})"
+                        else:
+                            refusal = instance.retry_budget.take(func.__name__)
 
-                    if attempt >= retries:
+                    if refusal:
                         if status_callback:
-                            status_callback(f"ERROR: Max retries ({retries}) reached for {func.__name__}. Last error: {type(e).__name__}")
+                            status_callback(f"ERROR: Not retrying {func.__name__}: {refusal}. Last error: {type(e).__name__}")
                         # Capture screenshot on final failure
                         if instance and hasattr(instance, 'capture_screenshot'):
                             instance.capture_screenshot(f"{func.__name__}_final_retry_fail")
-                        raise last_exception from e
+                        raise
+
+                    if status_callback:
+                         status_callback(f"Retrying in {current_delay:.2f}s...")
+                    if instance:
+                        instance.wait_stats.sleep(current_delay, f"{func.__name__} retry backoff")
+                        instance.retry_budget.record_time(func.__name__, time.time() - attempt_started)
                     else:
-                        if status_callback:
-                             status_callback(f"Retrying in {current_delay:.2f}s...")
                         time.sleep(current_delay)
-                        current_delay *= backoff
-
-                        # Optional: Reconnect logic (use cautiously)
-                        # if is_recoverable_timeout and instance and hasattr(instance, 'reconnect_if_needed'):
-                        #     if status_callback: status_callback("Attempting WebDriver reconnect...")
-                        #     instance.reconnect_if_needed(status_callback=status_callback)
 
                 except Exception as e: # Catch any other unexpected error
                     if status_callback:
@@ -135,30 +375,142 @@ def retry_on_exception(exceptions=(WebDriverException,), retries=MAX_RETRIES, de
                     traceback.print_exc()
                     raise # Re-raise immediately
 
-            # Should not be reached if retries > 0 and loop completes normally
-            if last_exception:
-                raise last_exception
-            raise RuntimeError(f"{func.__name__} failed after {retries} attempts without specific exception capture.")
+        return wrapper
+    return decorator
 
+def chunk_scope(func):
+    """
+    Decorator running one chunk (a download_report_* call, its retries included) inside its own
+    time budget (self.chunk_budget) and per-chunk retry budget.
+    """
+    @functools.wraps(func)
+    def wrapper(self, *args, **kwargs):
+        self.deadlines.check("chunk")
+        with self.deadlines.scope("chunk", self.chunk_budget), self.retry_budget.chunk():
+            return func(self, *args, **kwargs)
+    return wrapper
+
+def within_budget(label, budget_attr):
+    """
+    Decorator running a WebAutomation method inside a deadline scope of self.<budget_attr>
+    seconds, capped by the enclosing run/report/chunk budget. Raises DeadlineExceeded at once
+    if the enclosing budget is already used up.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(self, *args, **kwargs):
+            self.deadlines.check(label)
+            with self.deadlines.scope(label, getattr(self, budget_attr)):
+                return func(self, *args, **kwargs)
         return wrapper
     return decorator
 
 
+class ExportTab:
+    """One browser tab used for concurrent exports, with its own download folder and attribution state."""
+
+    def __init__(self, handle, download_folder):
+        self.handle = handle
+        self.download_folder = download_folder
+        self.before_download = set() # Per-tab replacement for WebAutomation.before_download
+        self.job = None              # Export currently running in this tab
+        self.download = None         # DevTools download claimed for the current job (CdpDownloadTracker)
+        self.watcher = None          # DownloadWatcher started before the export click
+        self.started_at = None
+        self.alert_text = None       # Last alert handled in this tab for the current job ("no data" check)
+        self.empty_checked_at = 0
+        self.last_bytes = -1         # DevTools bytes received at the last poll, and when they last grew (stall detection)
+        self.grew_at = None
+        self.wait_timeout = None     # Download wait limit of the current job (capped by the time budget)
+        self.last_click = None       # Robust click (locator, strategy) that started the current job (click strategy cache)
+
+    def snapshot_folder(self):
+        """Records the files present before this tab triggers its export and starts watching for the new one."""
+        try:
+            self.before_download = set(os.listdir(self.download_folder))
+        except OSError:
+            self.before_download = set()
+        self.close_watcher()
+        self.watcher = DownloadWatcher(self.download_folder, self.before_download)
+
+    def close_watcher(self):
+        if self.watcher:
+            self.watcher.close()
+            self.watcher = None
+
+
 class WebAutomation:
     """Handles browser automation using Selenium for downloading reports."""
 
-    def __init__(self, driver_path, download_folder, status_callback=None):
+    def __init__(self, driver_path, download_folder, status_callback=None, tab_count=1, pipeline=False, reuse_page=False, fast_fill=False, http_export=False, http_export_workers=4, download_events=False, lean_profile=False,
+                 profile_dir=None, profile_size_cap_mb=DEFAULT_SIZE_CAP_MB, session_monitor_options=None, recycle_after_downloads=0, recycle_rss_mb=0,
+                 stall_timeout=DOWNLOAD_STALL_TIMEOUT, start_timeout=DOWNLOAD_START_TIMEOUT, stall_retries=1, step_budget=STEP_BUDGET, chunk_budget=CHUNK_BUDGET,
+                 retry_run_limit=RETRY_RUN_LIMIT, retry_chunk_limit=RETRY_CHUNK_LIMIT):
         """
         Initializes the WebDriver.
         Args:
             driver_path (str): Path to ChromeDriver.
             download_folder (str): Specific folder for this run's downloads.
             status_callback (function, optional): Callback for status updates during init.
+            tab_count (int, optional): Tabs used for concurrent exports in chunk loops (1 = one chunk at a time).
+            pipeline (bool, optional): Trigger the next chunk's export as soon as the previous download has started.
+            reuse_page (bool, optional): Keep a loaded report page between chunks and only rewrite the form.
+            fast_fill (bool, optional): Fill the form and click export with one execute_script (step-by-step fill as fallback).
+            http_export (bool, optional): Replay export postbacks over HTTP after login (browser path as fallback).
+            http_export_workers (int, optional): Concurrent HTTP export requests.
+            download_events (bool, optional): Detect download start/progress/completion from DevTools events (folder polling as fallback).
+            lean_profile (bool, optional): Headless Chrome with eager page loads, blocked images/fonts/analytics and no background features.
+            profile_dir (str, optional): Base folder of persistent profile slots (None = fresh temporary profile).
+            profile_size_cap_mb (int, optional): A slot's cache is cleared on close when the slot grows past this.
+            session_monitor_options (dict, optional): SessionMonitor keyword arguments (keepalive_url, keepalive_interval, ...).
+                None = no keepalive; the WebDriver is probed before every chunk instead.
+            recycle_after_downloads (int, optional): Restart Chrome at the next chunk boundary after this many browser downloads (0 = never).
+            recycle_rss_mb (int, optional): Restart Chrome when ChromeDriver + Chrome resident memory reaches this many MB (0 = never; needs psutil).
+            stall_timeout (int, optional): Cancel a download that received no new bytes for this many seconds (0 = never).
+            start_timeout (int, optional): Give up on an export whose download did not start this many seconds after the click (0 = never).
+            stall_retries (int, optional): How many times a stalled chunk is retried at once, split into two halves each time (0 = not retried).
+            step_budget (int, optional): Seconds one form step may take (page load, date fill, region select, export click; 0 = no step budget).
+            chunk_budget (int, optional): Seconds one chunk may take, retries included (0 = no chunk budget).
+            retry_run_limit (int, optional): Retries this browser may spend per run, all retry loops together (0 = unlimited).
+            retry_chunk_limit (int, optional): Retries one chunk may spend (0 = unlimited).
         """
         self.driver_path = driver_path
         self.download_folder = download_folder
+        self.retry_budget = RetryBudget() # Shared by every retry loop; limits set by apply_run_options, reset per run
+        self.apply_run_options(tab_count=tab_count, pipeline=pipeline, reuse_page=reuse_page, fast_fill=fast_fill,
+                               http_export=http_export, http_export_workers=http_export_workers,
+                               recycle_after_downloads=recycle_after_downloads, recycle_rss_mb=recycle_rss_mb,
+                               stall_timeout=stall_timeout, start_timeout=start_timeout, stall_retries=stall_retries,
+                               step_budget=step_budget, chunk_budget=chunk_budget,
+                               retry_run_limit=retry_run_limit, retry_chunk_limit=retry_chunk_limit)
+        self.deadlines = DeadlineBudget() # Run > report > chunk > step time budgets; waits and commands stop at their deadline
+        self._watchdog_reason = None # Set when the command watchdog killed this browser; it is rebuilt at the next chunk
+        self.last_stall = None # DownloadStalled of the last wait_for_download_to_finish (None if it did not stall)
+        self.last_alert_text = None # Text of the last alert handled since the current export was prepared
+        self.last_overload = None # Last sign of server overload (502/503 page, download timeout or stall); reset by the caller
+        self.last_first_byte = None # Seconds from the export click to the first downloaded byte in the last download wait
+        self.last_wait_timed_out = False # The last download wait ran out of time (the chunk may be split and retried)
+        self._last_click = None # (locator, click strategy) of the last robust export click, judged by the next download wait
+        self.downloads_since_launch = 0 # Browser downloads since Chrome (re)started
+        self._page_state = {} # window handle -> {'url', 'variant', 'region_index'} of the loaded report form
+        self.download_events = bool(download_events)
+        self.download_tracker = None # CdpDownloadTracker when DevTools download events are available
+        self._download_watcher = None # DownloadWatcher started by update_files_before_download
+        self.lean_profile = bool(lean_profile)
+        self.profile_dir = profile_dir
+        self.profile_size_cap_mb = profile_size_cap_mb
+        self.session_monitor_options = session_monitor_options
+        self.session_monitor = None # SessionMonitor (keepalive + cached login health) once logged in
+        self._driver_alive = True # Cleared when a WebDriver command reports a dead session
+        self.profile_slot = None # ProfileSlot (user-data-dir) held while this browser runs
+        self.command_count = 0 # WebDriver commands (HTTP round-trips to ChromeDriver) sent so far
+        self.login_url = self.email = self.password = self.otp_secret = None # Set by login(), used to log in again
+        self.login_broker = None # LoginBroker sharing one login across browsers (set by LoginBroker)
+        self.session_version = None # Broker session version loaded in this browser
+        self.wait_stats = WaitStats() # Fixed sleeps vs condition waits (reset per run)
+        self.page_waits = None # PageWaits on the current driver
+        self.health_probe = None # PageHealthProbe on the current driver
         self.driver = None
-        self.wait = None
         self.before_download = set()
         self.extracted_zips = set()  # Track extracted zip files to avoid re-extraction
         self._status_callback = status_callback # Store callback for internal use
@@ -174,6 +526,89 @@ class WebAutomation:
         except Exception as e:
              self._log(f"Warning: Could not set RemoteConnection timeout: {e}")
 
+        if profile_dir:
+            try:
+                self.profile_slot = acquire_profile_slot(profile_dir, log_func=self._log)
+            except OSError as e:
+                self._log(f"Warning: Could not use persistent profile folder '{profile_dir}': {e}. Using a temporary profile.")
+        try:
+            self._start_driver()
+        except (WebDriverException, FileNotFoundError, RuntimeError) as e:
+            self._log(f"FATAL: WebDriver initialization failed: {e}")
+            traceback.print_exc()
+            if hasattr(self, 'service') and self.service and self.service.process:
+                self.service.stop()
+            self._release_profile_slot()
+            raise # Re-raise to stop the application
+
+    def _start_driver(self):
+        """Starts ChromeDriver and Chrome with this instance's options (used at init and when recycling the browser)."""
+        chrome_options = self._build_chrome_options()
+        if not os.path.exists(self.driver_path):
+            self._log(f"Warning: ChromeDriver path '{self.driver_path}' not found.")
+            # Option: Fallback to webdriver-manager (pip install webdriver-manager)
+            # try:
+            #     from webdriver_manager.chrome import ChromeDriverManager
+            #     self._log("Attempting to use webdriver-manager...")
+            #     self.service = Service(ChromeDriverManager().install())
+            # except Exception as wdm_e:
+            #     self._log(f"Error using webdriver-manager: {wdm_e}")
+            #     raise RuntimeError(f"ChromeDriver not found at '{self.driver_path}' and webdriver-manager failed.") from wdm_e
+            # else: # If manager succeeds
+            #     self._log("webdriver-manager successfully installed/found ChromeDriver.")
+            # --- End Option ---
+            # Raise error if not using webdriver-manager or if it fails
+            raise FileNotFoundError(f"ChromeDriver executable not found at the specified path: {self.driver_path}")
+        else:
+            self.service = Service(self.driver_path)
+
+        self._log("Starting ChromeDriver service...")
+        self.driver = webdriver.Chrome(
+            service=self.service,
+            options=chrome_options
+        )
+        self._log("WebDriver initialized.")
+        self._install_command_counter()
+        if self.profile_slot:
+            # Keep the cache but start logged out, exactly like a fresh profile
+            self.driver.execute_cdp_cmd('Network.clearBrowserCookies', {})
+        if self.lean_profile:
+            self._apply_lean_blocking()
+            self.driver.set_window_size(1920, 1080) # Headless default is 800x600
+            # Headless Chrome only honours the download prefs once this is set explicitly
+            self.driver.execute_cdp_cmd('Page.setDownloadBehavior', {'behavior': 'allow', 'downloadPath': self.download_folder})
+            self._log("Lean profile: headless, eager page loads, images/fonts/analytics blocked.")
+        if self.download_events:
+            tracker = CdpDownloadTracker(self.driver)
+            if tracker.is_available():
+                self.download_tracker = tracker
+                self._log("DevTools download events enabled for download tracking.")
+            else:
+                self._log("Warning: Performance log not available; downloads are tracked by folder polling.")
+        try:
+            self.driver.command_executor.set_timeout(SELENIUM_COMMAND_TIMEOUT)
+            self._log(f"Set driver command executor timeout to {SELENIUM_COMMAND_TIMEOUT}s.")
+        except Exception as e:
+            self._log(f"Warning: Could not set driver command executor timeout: {e}")
+
+        self.driver.set_page_load_timeout(PAGE_LOAD_TIMEOUT)
+        self.driver.implicitly_wait(0) # No implicit wait: a find_elements that finds nothing returns at once, explicit waits do the waiting
+        self.page_waits = PageWaits(self.driver, self.wait_stats)
+        self.health_probe = PageHealthProbe(self.driver, LOGIN_BUTTON_LOCATOR[1], FROM_DATE_LOCATOR[1])
+
+        self.update_files_before_download()
+        get_registry().register(self) # Lets the reaper kill these processes if close() never runs
+        get_watchdog().watch(self)
+
+    @property
+    def wait(self):
+        """WebDriverWait whose timeout is WEBDRIVER_WAIT_TIMEOUT capped by the current time budget (None without a driver)."""
+        if not self.driver:
+            return None
+        return WebDriverWait(self.driver, self.deadlines.timeout(WEBDRIVER_WAIT_TIMEOUT))
+
+    def _build_chrome_options(self):
+        """Chrome options for this instance (standard windowed profile, or lean headless profile)."""
         chrome_options = webdriver.ChromeOptions()
         prefs = {
             'download.default_directory': self.download_folder,
@@ -196,50 +631,108 @@ class WebAutomation:
         chrome_options.add_argument('--enable-automation')
         chrome_options.add_argument('--dns-prefetch-disable')
         # chrome_options.add_argument('--headless=new') # Uncomment for headless operation
-
+        if self.download_events:
+            enable_download_events(chrome_options)
+        if self.profile_slot:
+            # Warm disk cache (Telerik WebResource/ScriptResource bundles, static assets) survives between runs
+            chrome_options.add_argument(f'--user-data-dir={self.profile_slot.path}')
+            chrome_options.add_argument(f'--disk-cache-size={self.profile_size_cap_mb * 1024 * 1024}')
+        if self.lean_profile:
+            chrome_options.page_load_strategy = 'eager' # Return from driver.get at DOMContentLoaded
+            for argument in LEAN_CHROME_ARGUMENTS:
+                chrome_options.add_argument(argument)
+        return chrome_options
+
+    def _apply_lean_blocking(self):
+        """Blocks images/fonts/analytics for the current tab (Network.setBlockedURLs is per tab)."""
+        if not self.lean_profile:
+            return
         try:
-            if not os.path.exists(self.driver_path):
-                self._log(f"Warning: ChromeDriver path '{self.driver_path}' not found.")
-                # Option: Fallback to webdriver-manager (pip install webdriver-manager)
-                # try:
-                #     from webdriver_manager.chrome import ChromeDriverManager
-                #     self._log("Attempting to use webdriver-manager...")
-                #     self.service = Service(ChromeDriverManager().install())
-                # except Exception as wdm_e:
-                #     self._log(f"Error using webdriver-manager: {wdm_e}")
-                #     raise RuntimeError(f"ChromeDriver not found at '{self.driver_path}' and webdriver-manager failed.") from wdm_e
-                # else: # If manager succeeds
-                #     self._log("webdriver-manager successfully installed/found ChromeDriver.")
-                # --- End Option ---
-                # Raise error if not using webdriver-manager or if it fails
-                raise FileNotFoundError(f"ChromeDriver executable not found at the specified path: {self.driver_path}")
-            else:
-                self.service = Service(self.driver_path)
-
-            self._log("Starting ChromeDriver service...")
-            self.driver = webdriver.Chrome(
-                service=self.service,
-                options=chrome_options
-            )
-            self._log("WebDriver initialized.")
+            self.driver.execute_cdp_cmd('Network.enable', {})
+            self.driver.execute_cdp_cmd('Network.setBlockedURLs', {'urls': LEAN_BLOCKED_URL_PATTERNS})
+        except WebDriverException as e:
+            self._log(f"Warning: Could not block non-essential URLs: {str(e)[:100]}")
+
+    def apply_run_options(self, tab_count=1, pipeline=False, reuse_page=False, fast_fill=False, http_export=False, http_export_workers=4,
+                          recycle_after_downloads=0, recycle_rss_mb=0, stall_timeout=DOWNLOAD_STALL_TIMEOUT, start_timeout=DOWNLOAD_START_TIMEOUT,
+                          stall_retries=1, step_budget=STEP_BUDGET, chunk_budget=CHUNK_BUDGET,
+                          retry_run_limit=RETRY_RUN_LIMIT, retry_chunk_limit=RETRY_CHUNK_LIMIT):
+        """Sets the per-run export options (see __init__). Pooled browsers get them again on every lease."""
+        self.tab_count = max(1, int(tab_count or 1))
+        self.pipeline = bool(pipeline)
+        self.reuse_page = bool(reuse_page)
+        self.fast_fill = bool(fast_fill)
+        self.http_export = bool(http_export)
+        self.http_export_workers = max(1, int(http_export_workers or 1))
+        self.recycle_after_downloads = max(0, int(recycle_after_downloads or 0))
+        self.recycle_rss_mb = max(0, int(recycle_rss_mb or 0))
+        self.stall_timeout = max(0, int(stall_timeout or 0))
+        self.start_timeout = max(0, int(start_timeout or 0))
+        self.stall_retries = max(0, int(stall_retries or 0))
+        self.step_budget = max(0, int(step_budget or 0))
+        self.chunk_budget = max(0, int(chunk_budget or 0))
+        self.retry_budget.configure(run_limit=retry_run_limit, chunk_limit=retry_chunk_limit)
+
+    def set_download_folder(self, download_folder, status_callback=None):
+        """
+        Moves a running browser to a new download folder and status callback, e.g. when a
+        pooled browser is leased to a new run. Download tracking state of the old run is dropped.
+        The session keepalive logs to the new callback too.
+        """
+        if status_callback:
+            self._status_callback = status_callback
+            if self.session_monitor:
+                self.session_monitor.set_log_func(status_callback)
+        os.makedirs(download_folder, exist_ok=True)
+        self.driver.execute_cdp_cmd('Page.setDownloadBehavior', {'behavior': 'allow', 'downloadPath': download_folder})
+        self.download_folder = download_folder
+        self.session_id = os.path.basename(download_folder) + "-" + datetime.now().strftime("%H%M%S")
+        self.extracted_zips = set()
+        self.update_files_before_download() # New watcher; drops download events of the previous run
+        self._log(f"Browser moved to download folder {download_folder} (Session ID: {self.session_id}).")
+
+    def _install_command_counter(self):
+        """
+        Wraps driver.execute so every WebDriver command (element lookups and actions included) is
+        counted and registered with the command watchdog under the current time budget.
+        """
+        original_execute = self.driver.execute
+        def counting_execute(driver_command, params=None):
+            if self._watchdog_reason:
+                raise DeadlineExceeded(f"Browser was killed by the watchdog ({self._watchdog_reason}).")
+            self.command_count += 1
+            self.deadlines.begin_command(driver_command, SELENIUM_COMMAND_TIMEOUT)
             try:
-                self.driver.command_executor.set_timeout(SELENIUM_COMMAND_TIMEOUT)
-                self._log(f"Set driver command executor timeout to {SELENIUM_COMMAND_TIMEOUT}s.")
+                return original_execute(driver_command, params)
+            except WebDriverException as e:
+                message = str(e).lower()
+                if "invalid session id" in message or "session deleted" in message or "unable to connect to renderer" in message:
+                    self._driver_alive = False
+                raise
             except Exception as e:
-                self._log(f"Warning: Could not set driver command executor timeout: {e}")
-
-            self.driver.set_page_load_timeout(PAGE_LOAD_TIMEOUT)
-            self.driver.implicitly_wait(5) # Reduce implicit wait, rely on explicit waits
-            self.wait = WebDriverWait(self.driver, WEBDRIVER_WAIT_TIMEOUT)
-
-            self.update_files_before_download()
+                if self._watchdog_reason: # Connection to the killed ChromeDriver dropped
+                    raise DeadlineExceeded(f"Browser was killed by the watchdog ({self._watchdog_reason}).") from e
+                raise
+            finally:
+                self.deadlines.end_command()
+        self.driver.execute = counting_execute
 
-        except (WebDriverException, FileNotFoundError, RuntimeError) as e:
-            self._log(f"FATAL: WebDriver initialization failed: {e}")
-            traceback.print_exc()
-            if hasattr(self, 'service') and self.service and self.service.process:
-                self.service.stop()
-            raise # Re-raise to stop the application
+    def _watchdog_kill(self, reason):
+        """
+        Called by the command watchdog thread when a command outlived its deadline: kills
+        ChromeDriver and Chrome so the blocked call fails. The worker thread rebuilds the
+        browser at the next chunk boundary (recycle_if_needed).
+        """
+        self._watchdog_reason = reason
+        self._driver_alive = False
+        try:
+            get_registry().unregister(self) # Kills ChromeDriver and every Chrome process under it (needs psutil)
+        finally:
+            try:
+                self.service.process.kill()
+            except (AttributeError, OSError):
+                pass
+        self._log(f"WATCHDOG: {reason} ({self.deadlines.describe()}). Browser killed.") # Log last: the kill must not depend on the status callback
 
     def _log(self, message):
         """Internal logging helper using the status callback if available."""
@@ -262,126 +755,242 @@ class WebAutomation:
         else:
             self._log(f"Warning: Download directory {self.download_folder} does not exist yet.")
             self.before_download = set()
+        self.last_alert_text = None # Alerts from here on belong to the next export
+        self._last_click = None # Only a click made after this belongs to the next export (not e.g. the login click)
+        if self._download_watcher:
+            self._download_watcher.close()
+        self._download_watcher = DownloadWatcher(self.download_folder, self.before_download) if os.path.isdir(self.download_folder) else None
+        if self._poll_download_events(self._log):
+            self.download_tracker.drop_unclaimed()
+
+    def _poll_download_events(self, log_func):
+        """Reads pending DevTools download events. Returns False (switching to folder polling) if they are unavailable."""
+        if not self.download_tracker:
+            return False
+        try:
+            self.download_tracker.poll()
+            return True
+        except WebDriverException as e:
+            if "invalid session id" in str(e).lower():
+                raise
+            log_func(f"Warning: DevTools download events unavailable ({str(e)[:100]}). Falling back to folder polling.")
+            self.download_tracker = None
+            return False
 
-    def wait_for_download_to_finish(self, timeout=DOWNLOAD_WAIT_TIMEOUT, status_callback=None):
-        """Waits for a new file download to complete."""
-        log_func = status_callback or self._log
-        log_func(f"Waiting for download to complete (timeout: {timeout}s)...")
-
+    def _wait_for_download_event(self, timeout, log_func, watcher, window_handle=None, poll=None):
+        """
+        Waits for the next download reported by DevTools events (from window_handle's tab if given).
+        Returns (handled, file_name); handled is False when events became unavailable and the
+        caller should fall back to polling the folder. poll is called every 10s until the download starts.
+        """
         start_time = time.time()
-        last_partial_file_info = {} # {filename: (size, timestamp)}
-
+        last_progress_log = start_time
+        last_folder_check = start_time
+        download = None
+        last_bytes, grew_at = -1, start_time
         while time.time() - start_time < timeout:
-            current_files = set()
-            try:
-                if os.path.exists(self.download_folder):
-                    current_files = set(os.listdir(self.download_folder))
-                else:
-                    log_func("Warning: Download folder disappeared during wait.")
-                    time.sleep(SHORT_WAIT)
-                    continue
-            except OSError as e:
-                log_func(f"Error accessing download folder during wait: {e}")
-                time.sleep(SHORT_WAIT)
-                continue
-
-            new_files = current_files - self.before_download
-            completed_files = [f for f in new_files if not f.lower().endswith(('.tmp', '.crdownload', '.part'))]
-            partial_files = {f for f in new_files if f.lower().endswith(('.tmp', '.crdownload', '.part'))}
-
-            # 1. Check completed files
-            if completed_files:
-                try:
-                    completed_paths = [os.path.join(self.download_folder, f) for f in completed_files]
-                    valid_files = [p for p in completed_paths if os.path.isfile(p)]
-                    if valid_files:
-                        newest_file_path = max(valid_files, key=os.path.getmtime)
-                        new_file_name = os.path.basename(newest_file_path)
-                        # Check file size is > 0 (simple check for validity)
-                        if os.path.getsize(newest_file_path) > 0:
-                            log_func(f"Detected completed file: {new_file_name}")
-                            return new_file_name # Success
-                        else:
-                            log_func(f"Warning: Detected zero-byte completed file: {new_file_name}. Continuing wait.")
-                    # Handle case where completed_files list only contained directories or non-files
-                except (ValueError, OSError) as e:
-                     log_func(f"Error identifying latest completed file: {e}")
-
-            # 2. Monitor partial files for progress
-            active_partials_found = False
-            if partial_files:
-                now = time.time()
-                for partial_file in partial_files:
-                    partial_file_path = os.path.join(self.download_folder, partial_file)
-                    try:
-                        current_size = os.path.getsize(partial_file_path)
-                        last_size, last_time = last_partial_file_info.get(partial_file, (-1, 0))
-
-                        if current_size > last_size:
-                            # Log progress less frequently
-                            if now - last_time > 10: # Log approx every 10 seconds
-                                log_func(f"Download in progress ({partial_file}): {current_size} bytes...")
-                            last_partial_file_info[partial_file] = (current_size, now)
-                            active_partials_found = True
-                            # Extend timeout slightly only if progress is recent
-                            # start_time = time.time() # Risky, can lead to infinite loops
-
-                        elif current_size == last_size:
-                             # Size hasn't changed, could be stalled or done but not renamed.
-                             # Consider it active for now.
-                             active_partials_found = True
-                             # If stalled for too long, maybe log a warning?
-                             if now - last_time > 60: # E.g., stalled for 1 minute
-                                 if (now - last_time) % 60 < SHORT_WAIT: # Log warning once per minute
-                                     log_func(f"Warning: Download progress for '{partial_file}' seems stalled at {current_size} bytes.")
-
-                        # else: size decreased? Ignore or log warning
-
-                    except OSError: # File might have been renamed/deleted
-                        if partial_file in last_partial_file_info:
-                             del last_partial_file_info[partial_file]
-                        continue
-
-            # Cleanup info for partials that disappeared
-            stale_partials = set(last_partial_file_info.keys()) - partial_files
-            for stale in stale_partials:
-                 del last_partial_file_info[stale]
-
-            # If no completed files and no active partials, keep waiting but log if needed
-            if not completed_files and not active_partials_found and partial_files:
-                 # All partials seem stalled, just wait.
-                 pass
-
-            time.sleep(SHORT_WAIT)
+            if not self._poll_download_events(log_func):
+                return False, None
+            if download is None:
+                download = self.download_tracker.claim_next(window_handle)
+                if download:
+                    watcher.first_byte_at = watcher.first_byte_at or time.time()
+                    total = download['total_bytes'] or 'unknown'
+                    log_func(f"Download started: '{download['suggested_filename']}' (GUID {download['guid']}, {total} bytes).")
+                elif self.start_timeout and time.time() - start_time >= self.start_timeout:
+                    raise DownloadStalled(f"no download started within {self.start_timeout}s of the export click")
+                elif time.time() - last_folder_check >= 10:
+                    # Safety net for Chrome builds that do not emit download events
+                    last_folder_check = time.time()
+                    file_name = watcher.check()
+                    if file_name:
+                        log_func(f"Detected completed file without a download event: {file_name}")
+                        return True, file_name
+                    if poll:
+                        poll()
+            if download:
+                if download['state'] == 'completed':
+                    self.download_tracker.forget(download)
+                    file_name = CdpDownloadTracker.resolve_file_name(download, watcher.folder, watcher.baseline) or watcher.check()
+                    duration = download['finished_at'] - download['started_at']
+                    log_func(f"Download completed: '{file_name}' ({download['received_bytes']} bytes in {duration:.1f}s).")
+                    return True, file_name
+                if download['state'] == 'canceled':
+                    self.download_tracker.forget(download)
+                    log_func(f"ERROR: Download '{download['suggested_filename']}' was canceled by the browser.")
+                    return True, None
+                if download['received_bytes'] != last_bytes:
+                    last_bytes, grew_at = download['received_bytes'], time.time()
+                elif self.stall_timeout and time.time() - grew_at >= self.stall_timeout:
+                    self.download_tracker.forget(download)
+                    raise DownloadStalled(f"no new bytes for {self.stall_timeout}s ({CdpDownloadTracker.describe_progress(download)})",
+                                          guid=download['guid'])
+                if time.time() - last_progress_log >= 10:
+                    last_progress_log = time.time()
+                    log_func(f"Download in progress ({download['suggested_filename']}): {CdpDownloadTracker.describe_progress(download)}")
+            self.wait_stats.sleep(EVENT_POLL_INTERVAL, "download event poll")
 
-        # --- Loop Timed Out ---
         log_func(f"WARNING: Download wait timed out after {timeout} seconds.")
-        # Final check
-        final_files = set(os.listdir(self.download_folder)) if os.path.exists(self.download_folder) else set()
-        final_new_files = final_files - self.before_download
-        final_completed = [f for f in final_new_files if not f.lower().endswith(('.tmp', '.crdownload', '.part'))]
-        final_partial = [f for f in final_new_files if f.lower().endswith(('.tmp', '.crdownload', '.part'))]
-
-        if final_completed:
-            log_func(f"Timeout occurred, but found completed file(s) post-timeout: {final_completed}")
+        if download:
+            self.download_tracker.forget(download)
+            log_func(f"Download '{download['suggested_filename']}' still {download['state']}: {CdpDownloadTracker.describe_progress(download)}")
+            return True, None
+        return True, watcher.check()
+
+    def _find_completed_download(self, folder, baseline, log_func):
+        """Returns the newest completed, non-empty file in folder that is not in baseline (or None)."""
+        try:
+            new_files = set(os.listdir(folder)) - baseline
+        except OSError as e:
+            log_func(f"Error accessing download folder: {e}")
+            return None
+        completed_files = [f for f in new_files if not f.lower().endswith(PARTIAL_DOWNLOAD_SUFFIXES)]
+        if not completed_files:
+            return None
+        try:
+            completed_paths = [os.path.join(folder, f) for f in completed_files]
+            valid_files = [p for p in completed_paths if os.path.isfile(p)]
+            if valid_files:
+                newest_file_path = max(valid_files, key=os.path.getmtime)
+                if os.path.getsize(newest_file_path) > 0:
+                    return os.path.basename(newest_file_path)
+        except (ValueError, OSError) as e:
+            log_func(f"Error identifying latest completed file: {e}")
+        return None
+
+    def wait_for_download_to_finish(self, timeout=DOWNLOAD_WAIT_TIMEOUT, status_callback=None, download_folder=None, baseline=None, window_handle=None, empty_check=False):
+        """
+        Waits for a new file download to complete (at most until the current time budget runs out).
+        download_folder/baseline default to this instance's folder and before_download set;
+        tab-based exports pass their own. With DevTools download events the download of
+        window_handle's tab (any tab if None) is followed by GUID instead of polling the folder.
+        empty_check: also watch the page for a "no data" answer while waiting (raises EmptyExportResult).
+        """
+        log_func = status_callback or self._log
+        timeout = self.deadlines.timeout(timeout)
+        log_func(f"Waiting for download to complete (timeout: {timeout:.0f}s)...")
+        download_folder = download_folder or self.download_folder
+        baseline = self.before_download if baseline is None else baseline
+
+        # Reuse the watcher started before the export click when it covers this folder/baseline
+        watcher = self._download_watcher
+        self._download_watcher = None
+        if watcher is None or watcher.folder != download_folder or baseline is not self.before_download:
+            if watcher:
+                watcher.close()
+            watcher = DownloadWatcher(download_folder, baseline, scan_existing=True)
+        started = time.time()
+        slept_before = self.wait_stats.sleep_seconds # Event poll sleeps are counted as sleeps, not as condition wait
+        self.last_stall = None
+        self.last_first_byte = None
+        self.last_wait_timed_out = False
+        poll = (lambda: self._raise_if_empty(log_func)) if empty_check else None
+        file_name = None
+        try:
+            handled = False
+            if self.download_tracker:
+                handled, file_name = self._wait_for_download_event(timeout, log_func, watcher, window_handle, poll=poll)
+            if not handled:
+                log_func(f"Watching download folder ({watcher.backend})...")
+                file_name = watcher.wait(timeout, log_func, stall_timeout=self.stall_timeout, poll=poll,
+                                         start_timeout=max(0, self.start_timeout - (time.time() - started)) if self.start_timeout else 0)
+            if not file_name and time.time() - started >= timeout - 1:
+                self.last_wait_timed_out = True
+                self.last_overload = "download wait timed out"
+                if not watcher.first_byte_at:
+                    self._demote_click(self._last_click, log_func)
+            return file_name
+        except DownloadStalled as stall:
+            log_func(f"ERROR: Download stalled: {stall.reason}. Cancelling it.")
+            self._cancel_stalled_download(stall, download_folder, baseline, log_func)
+            if not watcher.first_byte_at:
+                self._demote_click(self._last_click, log_func)
+            self.last_stall = stall
+            self.last_overload = f"download stalled ({stall.reason})"
+            return None
+        finally:
+            watcher.close()
+            self._last_click = None # Judged by this wait only
+            if watcher.first_byte_at:
+                self.last_first_byte = max(0.0, watcher.first_byte_at - started)
+            self.wait_stats.record_condition("download complete", max(0.0, time.time() - started - (self.wait_stats.sleep_seconds - slept_before)))
+
+    def _demote_click(self, click, log_func):
+        """An export click (locator, strategy) 'succeeded' but no download started: count it as a failure of its click strategy."""
+        click_cache = get_click_cache()
+        if click_cache and click:
+            locator, strategy = click
+            click_cache.record_failure(locator, strategy)
+            log_func(f"[Robust Click] No download started after {CLICK_STRATEGY_NAMES[strategy]}; demoted it for {locator[1]} "
+                     f"({click_cache.describe(locator, strategy)}).")
+
+    # --- Empty Results ---
+    def _raise_if_empty(self, log_func):
+        """
+        Raises EmptyExportResult when the current export was answered with "no data": an alert
+        already handled (last_alert_text), an alert open now (accepted here) or a visible page message.
+        """
+        texts = [self.last_alert_text] if self.last_alert_text else []
+        try:
+            alert = self.driver.switch_to.alert
+            alert_text = alert.text
+            alert.accept()
+            self.last_alert_text = alert_text
+            log_func(f"Alert during download wait: '{alert_text}' (accepted).")
+            texts.append(alert_text)
+        except NoAlertPresentException:
+            pass
+        for text in texts:
+            if any(marker in text.lower() for marker in EMPTY_RESULT_MARKERS):
+                raise EmptyExportResult(f"Alert: {text}")
+        try:
+            message = self.driver.execute_script(EMPTY_MESSAGE_SCRIPT, list(EMPTY_RESULT_MARKERS))
+        except UnexpectedAlertPresentException:
+            return # Read on the next check
+        except WebDriverException as e:
+            if "invalid session id" in str(e).lower():
+                raise
+            return # Page busy (e.g. mid-postback); the download wait goes on
+        if message:
+            raise EmptyExportResult(f"Page message: {message}")
+
+    def _record_empty(self, report_url, variant, from_date, to_date, region_index, log_func):
+        cache = get_empty_cache()
+        if cache and cache.add(report_url, variant, from_date, to_date, region_index):
+            log_func(f"Recorded {from_date} to {to_date} as a known empty range (skipped in later runs).")
+
+    def _skip_known_empty(self, report_url, variant, from_date, to_date, region_index, log_func):
+        """True (and a 'Skipped (Known Empty)' log row) if this export is in the empty range cache."""
+        cache = get_empty_cache()
+        if not cache or not cache.is_empty(report_url, variant, from_date, to_date, region_index):
+            return False
+        region = f", Region: {regions_data[region_index]['name']}" if region_index is not None else ""
+        log_func(f"Skipping {from_date} to {to_date}{region}: known to have no data.")
+        self._log_download_result("", from_date, to_date, "Skipped (Known Empty)", "Empty in an earlier run (empty range cache).")
+        return True
+
+    def _cancel_stalled_download(self, stall, download_folder, baseline, log_func):
+        """
+        Cancels a stalled download in Chrome (by DevTools GUID when known) and removes its partial files,
+        so a late completion is not mistaken for the retried chunk's file.
+        """
+        if stall.guid:
             try:
-                final_paths = [os.path.join(self.download_folder, f) for f in final_completed]
-                valid_files = [p for p in final_paths if os.path.isfile(p) and os.path.getsize(p) > 0]
-                if valid_files:
-                    newest_file_path = max(valid_files, key=os.path.getmtime)
-                    return os.path.basename(newest_file_path) # Consider success if found post-timeout
-                else:
-                    log_func("No valid (non-empty) completed files found post-timeout.")
-                    return None
-            except Exception as e:
-                log_func(f"Error getting newest file post-timeout: {e}")
-                return None
-        elif final_partial:
-              log_func(f"Timeout occurred with file(s) still potentially downloading: {final_partial}")
-              return None
-        else:
-              log_func("Timeout occurred and no new completed or partial files were detected.")
-              return None
+                self.driver.execute_cdp_cmd('Browser.cancelDownload', {'guid': stall.guid})
+                log_func(f"Cancelled download {stall.guid} in the browser.")
+            except WebDriverException as e:
+                log_func(f"Warning: Could not cancel download {stall.guid}: {str(e)[:100]}")
+        try:
+            leftovers = [name for name in set(os.listdir(download_folder)) - baseline
+                         if is_partial(name) or name.startswith('Unconfirmed ')]
+        except OSError:
+            leftovers = []
+        for name in leftovers:
+            try:
+                os.remove(os.path.join(download_folder, name))
+                log_func(f"Removed partial download '{name}'.")
+            except OSError as e:
+                log_func(f"Warning: Could not remove partial download '{name}': {e}")
 
     def safe_click(self, locator, description="element", retries=MAX_RETRIES, delay=CLICK_RETRY_DELAY, status_callback=None):
         """Attempts to click an element safely using explicit waits and retries."""
@@ -391,15 +1000,16 @@ class WebAutomation:
             return False
 
         last_exception = None
+        retry_label = f"click '{description}'"
         for attempt in range(retries):
+            attempt_started = time.time()
             try:
                 # Wait for element to be clickable (includes presence, visibility, enabled)
                 element = self.wait.until(EC.element_to_be_clickable(locator))
 
                 # Scroll into view
                 try:
-                    self.driver.execute_script("arguments[0].scrollIntoView({block: 'center', inline: 'nearest'});", element)
-                    time.sleep(0.5) # Pause after scroll
+                    self.page_waits.scroll_into_view(element) # Returns once the element stops moving
                 except Exception as scroll_err:
                      log_func(f"Warning: Could not scroll '{description}' into view: {scroll_err}")
 
@@ -443,6 +1053,9 @@ class WebAutomation:
                 is_timeout = 'timed out' in str(e).lower()
                 timeout_msg = " (Timeout Error)" if is_timeout else ""
                 log_func(f"WARNING: WebDriverException{timeout_msg} during click attempt {attempt+1} for '{description}': {str(e)[:150]}...")
+                if classify_failure(e) != RETRY_TRANSIENT:
+                    log_func(f"ERROR: Not retrying click on '{description}' ({classify_failure(e)} failure).")
+                    break
 
             except Exception as e:
                 last_exception = e
@@ -454,8 +1067,16 @@ class WebAutomation:
 
             # Wait before retrying if loop continues
             if attempt < retries - 1:
-                log_func(f"Waiting {delay}s before retrying click on '{description}'...")
-                time.sleep(delay)
+                refusal = self.retry_budget.take(retry_label)
+                if refusal:
+                    log_func(f"ERROR: Not retrying click on '{description}': {refusal}. Last error: {type(last_exception).__name__}")
+                    self.capture_screenshot(f"{description.replace(' ','_')}_click_failed_final")
+                    break
+                # Clicks usually fail while a postback/loading panel covers the form: retry once it is gone
+                log_func(f"Waiting up to {delay}s for the page to settle before retrying click on '{description}'...")
+                if not self.page_waits.page_idle(timeout=delay, label="click retry"):
+                    log_func(f"Page still busy ({self.page_waits.last_busy_reason}). Retrying anyway.")
+                self.retry_budget.record_time(retry_label, time.time() - attempt_started)
             else: # Last attempt failed
                  log_func(f"ERROR: Failed to click '{description}' after {retries} attempts. Last error: {type(last_exception).__name__}")
                  self.capture_screenshot(f"{description.replace(' ','_')}_click_failed_final")
@@ -466,15 +1087,17 @@ class WebAutomation:
     @staticmethod
     def write_log_to_csv(log_data, filename=csv_filename):
         """Writes a log entry to the specified CSV file."""
-        file_exists = os.path.isfile(filename)
         try:
-            # Use 'a' mode to append, newline='' to prevent extra blank rows
-            with open(filename, 'a', newline='', encoding='utf-8') as csvfile:
-                writer = csv.writer(csvfile)
-                if not file_exists or os.path.getsize(filename) == 0:
-                    writer.writerow(['SessionID','Timestamp','File Name','Start Date','Status','End Date','Error Message'])
-                # Reorder fields: Timestamp, File Name, Start Date, Status, End Date, Error Message
-                writer.writerow([log_data[0], log_data[1], log_data[2], log_data[3], log_data[4], log_data[5], log_data[6]])
+            # Lock so parallel workers never interleave rows or write the header twice
+            with _csv_lock:
+                file_exists = os.path.isfile(filename)
+                # Use 'a' mode to append, newline='' to prevent extra blank rows
+                with open(filename, 'a', newline='', encoding='utf-8') as csvfile:
+                    writer = csv.writer(csvfile)
+                    if not file_exists or os.path.getsize(filename) == 0:
+                        writer.writerow(['SessionID','Timestamp','File Name','Start Date','Status','End Date','Error Message'])
+                    # Reorder fields: Timestamp, File Name, Start Date, Status, End Date, Error Message
+                    writer.writerow([log_data[0], log_data[1], log_data[2], log_data[3], log_data[4], log_data[5], log_data[6]])
         except IOError as e:
             print(f"CRITICAL ERROR: Could not write to log file {filename}: {e}")
             print(f"LOG_DATA (CSV failed): {log_data}")
@@ -508,10 +1131,12 @@ class WebAutomation:
         """Checks for and handles browser alerts."""
         log_func = status_callback or self._log
         try:
-            # Use a short wait specifically for the alert
-            short_wait = WebDriverWait(self.driver, 5) # Wait up to 5 seconds for an alert
-            alert = short_wait.until(EC.alert_is_present())
+            # Up to 5 seconds for an alert, but no longer than it takes the page to settle without one
+            alert = self.page_waits.alert_or_idle(5)
+            if not alert:
+                return False
             alert_text = alert.text
+            self.last_alert_text = alert_text
             log_func(f"Alert detected: '{alert_text}'")
             if accept:
                 alert.accept()
@@ -534,39 +1159,27 @@ class WebAutomation:
 
     # --- Login Method ---
     @retry_on_exception(exceptions=(WebDriverException,), retries=2, delay=10)
+    @within_budget("login", "step_budget")
     def login(self, login_url, email, password, otp_secret, status_callback=None):
         """Logs into the website using credentials and OTP."""
         log_func = status_callback or self._log
         if not self.driver or not self.wait:
             raise WebDriverException("WebDriver not initialized for login.")
         log_func(f"Attempting login for user {email}...")
+        # Kept for the re-login in _perform_download_steps
+        self.login_url, self.email, self.password, self.otp_secret = login_url, email, password, otp_secret
 
         try:
+            self._page_state.clear()
             self.driver.get(login_url) # Navigate to trigger login if needed
 
-            # --- Check for 502 Bad Gateway and retry if needed ---
-            max_502_retries = 3
-            for attempt_502 in range(max_502_retries):
-                page_source = self.driver.page_source
-                if '<h1>502 Bad Gateway</h1>' in page_source:
-                    log_func(f"Detected 502 Bad Gateway (attempt {attempt_502+1}/{max_502_retries}). Refreshing and retrying...")
-                    time.sleep(3)
-                    self.driver.refresh()
-                    time.sleep(2)
-                    continue
-                else:
-                    break
-            else:
-                log_func("ERROR: 502 Bad Gateway persists after retries. Aborting this report.")
-                self.capture_screenshot("502_bad_gateway")
-                raise DownloadFailedException("502 Bad Gateway after retries.")
-            # --- End 502 check ---
+            self._check_page_health(log_func)
 
             # !!! VERIFY THESE LOCATORS AGAINST THE ACTUAL LOGIN PAGE !!!
             email_locator = (By.ID, 'mat-input-3')
             password_locator = (By.ID, 'mat-input-4')
             otp_locator = (By.ID, 'mat-input-5')
-            login_button_locator = (By.ID, 'kt_login_signin_submit')
+            login_button_locator = LOGIN_BUTTON_LOCATOR
 
             log_func("Waiting for login elements...")
             email_field = self.wait.until(EC.element_to_be_clickable(email_locator))
@@ -596,6 +1209,7 @@ class WebAutomation:
             print(f"[DEBUG] Attempting robust click on locator: {login_button_locator}") # Console debug
             # Using the robust click method
             click_ok = self.robust_click_download_button(login_button_locator, description="CSV Download Button", status_callback=log_func)
+            self._last_click = None # Not an export click: no download wait may demote it
 
             if not click_ok:
                 log_func(f"ERROR: Failed to click Download Button (Locator: {login_button_locator}) after all attempts.")
@@ -618,6 +1232,7 @@ class WebAutomation:
                 # Or: self.wait.until(EC.presence_of_element_located(expected_element_locator))
                 current_url = self.driver.current_url
                 log_func(f"Login successful! Current URL: {current_url}")
+                self._session_authenticated(log_func)
                 return True
             except TimeoutException:
                 current_url = self.driver.current_url
@@ -641,6 +1256,144 @@ class WebAutomation:
             traceback.print_exc()
             raise WebDriverException(log_func) from e # Wrap for consistency
 
+    # --- Session Persistence ---
+    # CDP Network.setCookies accepts only these CookieParam fields from Network.getAllCookies
+    _COOKIE_PARAM_KEYS = ('name', 'value', 'domain', 'path', 'secure', 'httpOnly', 'sameSite', 'expires', 'priority', 'sourceScheme', 'sourcePort')
+
+    def export_session(self):
+        """Captures the logged-in browser state: all cookies plus local/session storage of the current origin."""
+        cookies = self.driver.execute_cdp_cmd('Network.getAllCookies', {}).get('cookies', [])
+        storage = self.driver.execute_script(
+            "return {origin: window.location.origin,"
+            " local: Object.assign({}, window.localStorage), session: Object.assign({}, window.sessionStorage)};"
+        ) or {}
+        return {
+            'cookies': cookies,
+            'origin': storage.get('origin'),
+            'local_storage': storage.get('local') or {},
+            'session_storage': storage.get('session') or {},
+        }
+
+    def import_session(self, state):
+        """Loads cookies from a captured session into this browser (storage is restored once on its origin)."""
+        cookies = []
+        for cookie in state.get('cookies', []):
+            param = {key: cookie[key] for key in self._COOKIE_PARAM_KEYS if key in cookie}
+            if cookie.get('session') or param.get('expires', 0) <= 0:
+                param.pop('expires', None) # Session cookie
+            cookies.append(param)
+        self.driver.execute_cdp_cmd('Network.setCookies', {'cookies': cookies})
+        self._page_state.clear()
+        self._session_authenticated(self._log)
+
+    def _session_authenticated(self, log_func):
+        """Starts (or resets) the keepalive monitor after a login or session import."""
+        if not self.session_monitor_options:
+            return
+        try:
+            cookies = self.driver.execute_cdp_cmd('Network.getAllCookies', {}).get('cookies', [])
+            if not self.session_monitor:
+                user_agent = self.driver.execute_script("return navigator.userAgent;")
+                self.session_monitor = SessionMonitor(user_agent=user_agent, log_func=log_func, **self.session_monitor_options)
+            self.session_monitor.set_authenticated(cookies)
+            self.session_monitor.start()
+        except WebDriverException as e:
+            log_func(f"Warning: Could not start session keepalive: {type(e).__name__} - {str(e)[:150]}")
+
+    def _session_ready(self, log_func):
+        """
+        Session check before a chunk/region (also the point where an oversized browser is recycled). With a session monitor this uses its cached health
+        (no WebDriver round-trip) and re-authenticates while the login is about to expire;
+        without one it falls back to the is_session_valid probe.
+        """
+        if not self.recycle_if_needed(log_func):
+            return False
+        if not self.session_monitor:
+            return self.is_session_valid()
+        if not self.driver or not self._driver_alive:
+            return False
+        renewed = self.session_monitor.take_renewed_cookies()
+        if renewed:
+            self.driver.execute_cdp_cmd('Network.setCookies', {'cookies': renewed})
+        health = self.session_monitor.health()
+        if health == HEALTH_OK:
+            return True
+        log_func(f"Portal session {self.session_monitor.describe()}. Re-authenticating before the next chunk...")
+        if not self._renew_session(log_func):
+            log_func("ERROR: Proactive re-login failed.")
+            return False
+        return True
+
+    def _restore_storage(self, state):
+        """Writes saved local/session storage when the browser is on the saved origin."""
+        if not (state.get('local_storage') or state.get('session_storage')):
+            return
+        self.driver.execute_script(
+            "var s = arguments[0];"
+            "if (window.location.origin !== s.origin) { return; }"
+            "Object.keys(s.local_storage || {}).forEach(function (k) { localStorage.setItem(k, s.local_storage[k]); });"
+            "Object.keys(s.session_storage || {}).forEach(function (k) { sessionStorage.setItem(k, s.session_storage[k]); });",
+            state
+        )
+
+    def probe_session(self, report_url, log_func):
+        """Validity probe: True if report_url opens the report form (not the login page) with the current cookies."""
+        self._page_state.clear()
+        self.driver.get(report_url)
+        if self._check_page_health(log_func).kind == PAGE_LOGIN:
+            log_func("Session probe: redirected to the login page.")
+            return False
+        try:
+            WebDriverWait(self.driver, SESSION_PROBE_TIMEOUT).until(EC.presence_of_element_located(FROM_DATE_LOCATOR))
+        except TimeoutException:
+            log_func(f"Session probe: report form not shown (current URL: {self.driver.current_url}).")
+            return False
+        self._page_state[self.driver.current_window_handle] = {'url': report_url, 'variant': None, 'region_index': None}
+        return True
+
+    def restore_session(self, state, report_url, status_callback=None):
+        """Injects a captured session and checks it by opening report_url. Returns True if the browser is logged in."""
+        log_func = status_callback or self._log
+        try:
+            self.import_session(state)
+            if not self.probe_session(report_url, log_func):
+                return False
+            self._restore_storage(state)
+            return True
+        except WebDriverException as e:
+            if "invalid session id" in str(e).lower():
+                raise
+            log_func(f"Warning: Could not restore saved session: {type(e).__name__} - {str(e)[:150]}")
+            return False
+
+    def login_with_session(self, login_url, email, password, otp_secret, session_store=None, status_callback=None):
+        """
+        Logs in by reusing a still-valid session from session_store (no OTP) when possible,
+        otherwise runs the full login and stores the new session.
+        login_url is the report URL used for login; it doubles as the validity probe page.
+        """
+        log_func = status_callback or self._log
+        if session_store:
+            state, age = session_store.load(email)
+            if state:
+                log_func(f"Found saved session for {email} ({age / 60:.0f} min old). Checking it...")
+                if self.restore_session(state, login_url, status_callback=log_func):
+                    self.login_url, self.email, self.password, self.otp_secret = login_url, email, password, otp_secret
+                    log_func("Saved session is valid. Skipping OTP login.")
+                    return True
+                log_func("Saved session was rejected. Logging in again.")
+                session_store.discard(email)
+
+        if not self.login(login_url, email, password, otp_secret, status_callback=log_func):
+            return False
+        if session_store:
+            try:
+                session_store.save(email, self.export_session())
+                log_func("Session saved for later runs.")
+            except (WebDriverException, OSError) as e:
+                log_func(f"Warning: Could not save session: {type(e).__name__} - {str(e)[:150]}")
+        return True
+
 
     # --- File Handling ---
     def extract_zip_files(self, status_callback=None):
@@ -718,9 +1471,10 @@ class WebAutomation:
             traceback.print_exc()
             return None # Indicate failure
 
-    def rename_downloaded_file(self, original_filename, from_date, to_date, suffix="", status_callback=None):
-        """Renames a specific downloaded file."""
+    def rename_downloaded_file(self, original_filename, from_date, to_date, suffix="", status_callback=None, download_folder=None):
+        """Renames a specific downloaded file (in download_folder, default: this instance's folder)."""
         log_func = status_callback or self._log
+        folder = download_folder or self.download_folder
         if not original_filename:
              log_func("Rename failed: No original filename provided.")
              return None
@@ -729,13 +1483,13 @@ class WebAutomation:
             log_func(f"Skipping rename for standardized file: {original_filename}")
             return original_filename
 
-        original_full_path = os.path.join(self.download_folder, original_filename)
+        original_full_path = os.path.join(folder, original_filename)
 
         if not os.path.isfile(original_full_path):
-             log_func(f"Rename failed: File '{original_filename}' not found in {self.download_folder}.")
+             log_func(f"Rename failed: File '{original_filename}' not found in {folder}.")
              # Maybe the file is still downloading or has a different name?
              # Check current files again?
-             # current_files = os.listdir(self.download_folder)
+             # current_files = os.listdir(folder)
              # log_func(f"Current files in download folder: {current_files}")
              return None
 
@@ -746,7 +1500,7 @@ class WebAutomation:
 
             # Construct new name, replace spaces
             new_name_base = f"{file_name_part}_{from_date_formatted}_{to_date_formatted}{suffix}{file_extension}".replace(' ','_')
-            new_full_path = os.path.join(self.download_folder, new_name_base)
+            new_full_path = os.path.join(folder, new_name_base)
 
             # Handle naming conflicts
             counter = 1
@@ -755,15 +1509,16 @@ class WebAutomation:
                  log_func(f"Warning: File '{final_new_name}' already exists. Appending counter.")
                  name_part, ext_part = os.path.splitext(new_name_base)
                  final_new_name = f"{name_part}_{counter}{ext_part}"
-                 new_full_path = os.path.join(self.download_folder, final_new_name)
+                 new_full_path = os.path.join(folder, final_new_name)
                  counter += 1
 
             log_func(f"Attempting to rename '{original_filename}' to '{final_new_name}'")
             os.rename(original_full_path, new_full_path)
             log_func(f"Successfully renamed file to: {final_new_name}")
             # Update the baseline state *after* successful rename
-            self.before_download.discard(original_filename)
-            self.before_download.add(final_new_name)
+            if folder == self.download_folder:
+                self.before_download.discard(original_filename)
+                self.before_download.add(final_new_name)
             return final_new_name # Return the actual new name
 
         except Exception as e:
@@ -773,10 +1528,196 @@ class WebAutomation:
             return None # Indicate failure
 
 
+    def _check_page_health(self, log_func, policy=PAGE_REFRESH_POLICY):
+        """
+        Probes the page just loaded (PageHealthProbe, no page_source transfer) and refreshes it
+        with jittered backoff while the server answers 502/503/504 (an ASP.NET error page gets one
+        refresh). Refreshes are taken from the retry budget.
+        Returns the PageHealth (PAGE_OK, PAGE_LOGIN or PAGE_UNKNOWN); raises PageHealthError if an error page persists.
+        """
+        max_refreshes = policy.attempts - 1
+        for attempt in range(max_refreshes + 1):
+            health = self.health_probe.check()
+            if health.transient:
+                self.last_overload = f"portal {health.describe()}"
+            retry = health.transient or (health.kind == PAGE_SERVER_ERROR and attempt == 0)
+            if not retry or attempt == max_refreshes:
+                break
+            refusal = self.retry_budget.take(f"{health.kind} refresh")
+            if refusal:
+                log_func(f"Portal returned {health.describe()}. Not refreshing: {refusal}.")
+                break
+            backoff = policy.backoff_delay(attempt + 1)
+            log_func(f"Portal returned {health.describe()} (attempt {attempt+1}/{max_refreshes}). Refreshing in {backoff:.1f}s...")
+            refresh_started = time.time()
+            self.wait_stats.sleep(backoff, f"{health.kind} backoff") # Give the server time to recover
+            self.driver.refresh()
+            self.page_waits.page_idle(label=f"{health.kind} refresh")
+            self.retry_budget.record_time(f"{health.kind} refresh", time.time() - refresh_started)
+        if health.transient or health.kind == PAGE_SERVER_ERROR:
+            log_func(f"ERROR: Portal error page persists after retries: {health.describe()}. Aborting this report.")
+            self.capture_screenshot(f"page_{health.kind}")
+            raise PageHealthError(health)
+        if health.kind == PAGE_UNKNOWN:
+            log_func(f"Warning: Page health probe failed ({health.detail}). Continuing.")
+        return health
+
+    def _report_page_healthy(self, report_url):
+        """Cheap check that the current tab still shows a usable copy of report_url's form."""
+        try:
+            current_url = self.driver.current_url
+            if current_url.split('?')[0].lower() != report_url.split('?')[0].lower():
+                return False
+            return bool(self.driver.find_elements(*FROM_DATE_LOCATOR))
+        except WebDriverException:
+            return False
+
+    @within_budget("open report page", "step_budget")
+    def _open_report_page(self, report_url, log_func):
+        """
+        Makes sure the report form for report_url is loaded in the current tab.
+        In page-reuse mode a page that is already loaded and healthy is kept, so the
+        next chunk only rewrites the form instead of paying a full ViewState page load.
+        """
+        if self.login_broker:
+            self.login_broker.sync(self, log_func) # Session renewed by another browser: take its cookies first
+        handle = self.driver.current_window_handle
+        state = self._page_state.get(handle)
+        if self.reuse_page and state and state.get('url') == report_url:
+            if self._report_page_healthy(report_url):
+                log_func(f"Reusing loaded report page: {report_url}")
+                return
+            log_func("Loaded report page failed health check. Reloading...")
+
+        for attempt in range(2):
+            log_func(f"Navigating to report URL: {report_url}")
+            self._page_state.pop(handle, None)
+            self.driver.get(report_url)
+            if self._check_page_health(log_func).kind != PAGE_LOGIN:
+                log_func("Waiting for date input fields...")
+                self.wait.until(EC.any_of(EC.presence_of_element_located(FROM_DATE_LOCATOR),
+                                          EC.presence_of_element_located(LOGIN_BUTTON_LOCATOR)))
+                if self.driver.find_elements(*FROM_DATE_LOCATOR):
+                    self.page_waits.page_idle(label="report page load") # Telerik client objects are created after the inputs appear
+                    break
+            log_func("Report page redirected to the login page (session expired).")
+            if attempt or not self._renew_session(log_func):
+                self.capture_screenshot("session_expired")
+                raise DownloadFailedException("Session expired and re-login failed.", retry_class=RETRY_SESSION)
+        self._page_state[handle] = {'url': report_url, 'variant': None, 'region_index': None}
+        if self.session_monitor:
+            self.session_monitor.mark_active()
+
+    def _renew_session(self, log_func):
+        """Logs in again after the portal dropped the session (through the login broker when shared)."""
+        self._page_state.clear()
+        if self.login_broker:
+            return self.login_broker.reauthenticate(self, self.session_version, log_func)
+        if not self.login_url:
+            log_func("ERROR: No login details recorded. Cannot log in again.")
+            return False
+        return self.login(self.login_url, self.email, self.password, self.otp_secret, status_callback=log_func)
+
+    def _current_page_state(self):
+        """Form selections known for the page in the current tab (empty dict if unknown)."""
+        try:
+            return self._page_state.get(self.driver.current_window_handle) or {}
+        except WebDriverException:
+            return {}
+
+    @within_budget("fill dates", "step_budget")
+    def _fill_date_range(self, from_date, to_date, log_func):
+        """Types the From/To dates into the report form."""
+        log_func(f"Setting 'To Date': {to_date}")
+        edate_input = self.wait.until(EC.element_to_be_clickable(TO_DATE_LOCATOR))
+        edate_input.clear()
+        edate_input.send_keys(format_date_ddmmyyyy(to_date))
+        log_func(f"Setting 'From Date': {from_date}")
+        sdate_input = self.wait.until(EC.element_to_be_clickable(FROM_DATE_LOCATOR))
+        sdate_input.clear()
+        sdate_input.send_keys(format_date_ddmmyyyy(from_date))
+
+    @within_budget("scripted fill", "step_budget")
+    def _fast_fill_and_export(self, from_date, to_date, variant, region_index, export_locator, log_func):
+        """
+        Scripted form fill: sets dates, report type radio and region and clicks export with a
+        single execute_script (FAST_FILL_SCRIPT). Returns False without touching the form when
+        fast fill is off or the page does not expose the Telerik API; the caller then uses the
+        step-by-step fill.
+        """
+        self._last_click = None # The scripted click is not a robust click; nothing to demote for it
+        if not self.fast_fill:
+            return False
+        script_args = {
+            'from': from_date, 'to': to_date,
+            'fromPicker': FROM_DATE_PICKER_ID, 'toPicker': TO_DATE_PICKER_ID,
+            'radio': report_variants[variant]["radio_id"] if variant else None,
+            'region': region_index, 'combo': REGION_COMBO_ID,
+            'button': export_locator[1].rsplit('_input', 1)[0],
+        }
+        try:
+            result = self.driver.execute_script(FAST_FILL_SCRIPT, script_args)
+        except WebDriverException as e:
+            if "invalid session id" in str(e).lower():
+                raise
+            log_func(f"Scripted form fill failed ({type(e).__name__}: {str(e)[:100]}). Using step-by-step fill.")
+            return False
+        if not result or not result.get('ok'):
+            reason = result.get('reason') if result else 'no result'
+            log_func(f"Scripted form fill not available ({reason}). Using step-by-step fill.")
+            return False
+        log_func(f"Scripted form fill: dates {from_date} -> {to_date} set and export clicked.")
+        page_state = self._current_page_state()
+        if page_state:
+            if variant:
+                page_state['variant'] = variant
+            page_state['region_index'] = region_index
+        return True
+
+    def _process_downloaded_file(self, downloaded_original_name, from_date, to_date, file_suffix, log_func, download_folder=None, browser_download=True):
+        """
+        Renames a finished download and extracts/renames its contents if it is a zip.
+        browser_download=False for files fetched over HTTP (not counted for browser recycling).
+        Returns (log_file_name, renamed_ok).
+        """
+        if browser_download:
+            self.downloads_since_launch += 1
+        folder = download_folder or self.download_folder
+        renamed_file = self.rename_downloaded_file(downloaded_original_name, from_date, to_date, file_suffix, log_func, download_folder=folder)
+        log_file_name = renamed_file if renamed_file else downloaded_original_name
+        if downloaded_original_name.lower().endswith('.zip'):
+            zip_path = os.path.join(folder, log_file_name)
+            if os.path.exists(zip_path):
+                try:
+                    log_func(f"Extracting '{log_file_name}'...")
+                    with zipfile.ZipFile(zip_path, 'r') as zip_ref:
+                        zip_ref.extractall(folder)
+                        extracted_names = zip_ref.namelist()
+                        log_func(f"Extracted files from {log_file_name}: {extracted_names}")
+                        for extracted_name in extracted_names:
+                            extracted_path = os.path.join(folder, extracted_name)
+                            self.rename_extract_file(extracted_path, from_date, to_date, file_suffix, log_func)
+                    self.extracted_zips.add(log_file_name)
+                except zipfile.BadZipFile:
+                    log_func(f"ERROR: Bad zip file '{log_file_name}'. Skipping.")
+                except Exception as e:
+                    log_func(f"ERROR extracting '{log_file_name}': {e}")
+                    traceback.print_exc()
+        return log_file_name, bool(renamed_file)
+
+    def _log_download_result(self, log_file_name, from_date, to_date, log_status, log_error):
+        """Appends one row to the download log CSV."""
+        log_data = [
+            self.session_id,
+            datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            log_file_name, from_date, log_status, to_date, log_error
+        ]
+        self.write_log_to_csv(log_data)
+
     # --- Core Download Logic ---
 
-    def _perform_download_steps(self, report_url, from_date, to_date, report_specific_setup=None, file_suffix="", status_callback=None):
-        """Internal helper for common download steps."""
+    def _perform_download_steps(self, report_url, from_date, to_date, report_specific_setup=None, file_suffix="", status_callback=None, variant=None):
+        """Internal helper for common download steps. `variant` (report_variants key) enables the scripted form fill."""
         log_func = status_callback or self._log
         if not self.driver or not self.wait:
             raise WebDriverException("WebDriver not initialized for download.")
@@ -815,79 +1756,48 @@ class WebAutomation:
             return False
         # --- End logic ---
 
+        if self._skip_known_empty(report_url, variant, from_date, to_date, None, log_func):
+            return True
+
         # --- Add session check and re-login logic ---
-        if not self.is_session_valid():
+        if not self._session_ready(log_func):
             log_func("Session expired or invalid before starting download. Attempting to re-login...")
             try:
-                relogin_ok = self.login(self.login_url, self.email, self.password, self.otp_secret, status_callback=log_func)
+                relogin_ok = self._renew_session(log_func)
                 if not relogin_ok:
                     log_func("ERROR: Re-login failed. Skipping this report.")
                     self.capture_screenshot("relogin_failed")
-                    raise DownloadFailedException("Session expired and re-login failed.")
+                    raise DownloadFailedException("Session expired and re-login failed.", retry_class=RETRY_SESSION)
                 log_func("Re-login successful. Continuing download.")
                 # Sau khi login lại, luôn truy cập lại đúng report_url để đảm bảo ở đúng trang báo cáo
-                self.driver.get(report_url)
-                log_func(f"Re-login done. Navigated again to report URL: {report_url}")
+                self._page_state = {}
             except Exception as e:
                 log_func(f"ERROR: Exception during re-login: {e}")
                 self.capture_screenshot("relogin_exception")
-                raise DownloadFailedException("Session expired and re-login exception.")
-        else:
-            # Nếu không cần re-login, vẫn phải truy cập report_url như cũ
-            self.driver.get(report_url)
-            log_func(f"Navigating to report URL: {report_url}")
+                raise DownloadFailedException("Session expired and re-login exception.", retry_class=RETRY_SESSION)
         # --- End session check ---
 
+        commands_at_start = self.command_count
+        fill_mode = "step-by-step fill"
         try:
-            # Nếu vừa re-login thì đã get(report_url) ở trên, nếu không thì vẫn cần truy cập report_url
-            if not (hasattr(self, "_just_relogin") and self._just_relogin):
-                log_func(f"Navigating to report URL: {report_url}")
-                self.driver.get(report_url)
-            # Đảm bảo cờ này luôn reset
-            self._just_relogin = False
-
-            # --- Check for 502 Bad Gateway and retry if needed ---
-            max_502_retries = 3
-            for attempt_502 in range(max_502_retries):
-                page_source = self.driver.page_source
-                if '<h1>502 Bad Gateway</h1>' in page_source:
-                    log_func(f"Detected 502 Bad Gateway (attempt {attempt_502+1}/{max_502_retries}). Refreshing and retrying...")
-                    time.sleep(3)
-                    self.driver.refresh()
-                    time.sleep(2)
-                    continue
-                else:
-                    break
-            else:
-                log_func("ERROR: 502 Bad Gateway persists after retries. Aborting this report.")
-                self.capture_screenshot("502_bad_gateway")
-                raise DownloadFailedException("502 Bad Gateway after retries.")
-            # --- End 502 check ---
+            # Navigates once; in page-reuse mode an already loaded, healthy report page is kept
+            self._open_report_page(report_url, log_func)
+            export_started = time.time()
 
-            # --- Existing code ---
-            sdate_locator = (By.ID, 'ctl00_MainContent_cbo_fromDate_dateInput')
-            edate_locator = (By.ID, 'ctl00_MainContent_cbo_toDate_dateInput')
-            download_button_locator = (By.ID, 'ctl00_MainContent_btnExportCSVDemo_input')
-            log_func("Waiting for date input fields...")
-            self.wait.until(EC.presence_of_element_located(sdate_locator))
-            # --- Existing code ---
-            if report_specific_setup:
-                report_specific_setup()
-            # --- Existing code ---
-            log_func(f"Setting 'To Date': {to_date}")
-            edate_input = self.wait.until(EC.element_to_be_clickable(edate_locator))
-            edate_input.clear()
-            edate_input.send_keys(format_date_ddmmyyyy(to_date))
-            log_func(f"Setting 'From Date': {from_date}")
-            sdate_input = self.wait.until(EC.element_to_be_clickable(sdate_locator))
-            sdate_input.clear()
-            sdate_input.send_keys(format_date_ddmmyyyy(from_date))
-            # --- Existing code ---
-            self.handle_alert(accept=True, status_callback=log_func)
+            download_button_locator = CSV_EXPORT_BUTTON_LOCATOR
             self.update_files_before_download()
-            log_func("Locating and clicking download button...")
-            print(f"[DEBUG] Attempting robust click on locator: {download_button_locator}")
-            click_ok = self.robust_click_download_button(download_button_locator, description="CSV Download Button", status_callback=log_func)
+            if variant and self._fast_fill_and_export(from_date, to_date, variant, None, download_button_locator, log_func):
+                fill_mode = "scripted fill"
+                click_ok = True
+            else:
+                if report_specific_setup:
+                    report_specific_setup()
+                self._fill_date_range(from_date, to_date, log_func)
+                self.handle_alert(accept=True, status_callback=log_func)
+                self.update_files_before_download()
+                log_func("Locating and clicking download button...")
+                print(f"[DEBUG] Attempting robust click on locator: {download_button_locator}")
+                click_ok = self.robust_click_download_button(download_button_locator, description="CSV Download Button", status_callback=log_func)
             if not click_ok:
                 log_error = f"Failed to click Download Button (Locator: {download_button_locator}) after all attempts."
                 log_status = "Failed (Click Download)"
@@ -896,32 +1806,24 @@ class WebAutomation:
                 raise DownloadFailedException(log_error)
             log_func("Download click initiated (or attempted). Checking for alerts...")
             self.handle_alert(accept=True, status_callback=log_func)
-            downloaded_original_name = self.wait_for_download_to_finish(status_callback=log_func)
+            self._raise_if_empty(log_func)
+            downloaded_original_name = self.wait_for_download_to_finish(status_callback=log_func, empty_check=True)
             if downloaded_original_name:
                 log_func(f"Download detected: {downloaded_original_name}")
+                self._record_chunk_cost(report_url, None, from_date, to_date, export_started, downloaded_original_name)
                 # Chỉ giải nén file zip vừa tải về, không quét toàn bộ thư mục
-                renamed_file = self.rename_downloaded_file(downloaded_original_name, from_date, to_date, file_suffix, log_func)
-                log_file_name = renamed_file if renamed_file else downloaded_original_name
-                if downloaded_original_name.lower().endswith('.zip'):
-                    zip_path = os.path.join(self.download_folder, log_file_name)
-                    if os.path.exists(zip_path):
-                        try:
-                            log_func(f"Extracting '{log_file_name}'...")
-                            with zipfile.ZipFile(zip_path, 'r') as zip_ref:
-                                zip_ref.extractall(self.download_folder)
-                                extracted_names = zip_ref.namelist()
-                                log_func(f"Extracted files from {log_file_name}: {extracted_names}")
-                                for extracted_name in extracted_names:
-                                    extracted_path = os.path.join(self.download_folder, extracted_name)
-                                    self.rename_extract_file(extracted_path, from_date, to_date, file_suffix, log_func)
-                        except zipfile.BadZipFile:
-                            log_func(f"ERROR: Bad zip file '{log_file_name}'. Skipping.")
-                        except Exception as e:
-                            log_func(f"ERROR extracting '{log_file_name}': {e}")
-                            traceback.print_exc()
-                log_status = "Success" if renamed_file else "Success (Rename Failed)"
+                log_file_name, renamed_ok = self._process_downloaded_file(downloaded_original_name, from_date, to_date, file_suffix, log_func)
+                log_status = "Success" if renamed_ok else "Success (Rename Failed)"
                 log_func(f"Download and processing complete. Final state: {log_file_name}")
+            elif self.last_stall:
+                log_error = f"Download stalled: {self.last_stall.reason}."
+                log_status = "Failed (Download Stalled)"
+                log_func(f"ERROR: {log_error}")
+                self._record_chunk_cost(report_url, None, from_date, to_date, export_started)
+                raise DownloadFailedException(log_error)
             else:
+                if self.last_wait_timed_out:
+                    self._record_chunk_cost(report_url, None, from_date, to_date, export_started)
                 log_error = "Download wait timed out or failed to detect completed file."
                 log_status = "Failed (Download Wait)"
                 self.capture_screenshot("download_wait_timeout")
@@ -929,6 +1831,11 @@ class WebAutomation:
                 raise DownloadFailedException(log_error)
             # --- Existing code ---
         # --- Existing code ---
+        except EmptyExportResult as empty:
+            log_status = "Empty"
+            log_error = str(empty)
+            log_func(f"No data for {from_date} to {to_date} ({empty}). Moving on.")
+            self._record_empty(report_url, variant, from_date, to_date, None, log_func)
         except DownloadFailedException as df_err: # Catch failures from click or wait
              log_status = log_status if log_status != "Failed (Initial)" else "Failed (Download Step)"
              log_error = str(df_err)
@@ -967,15 +1874,25 @@ class WebAutomation:
             ]
             self.write_log_to_csv(log_data)
             log_func(f"Logged download status '{log_status}' for {from_date}-{to_date}.")
+            log_func(f"WebDriver commands for {from_date}-{to_date}: {self.command_count - commands_at_start} ({fill_mode}).")
+            if not log_status.startswith("Success") and log_status != "Empty":
+                self._page_state.clear() # Reload the report page for the next chunk
 
-        # Return True on success, False on failure for the calling function
-        return log_status.startswith("Success")
+        # Return True on success (or an empty result), False on failure for the calling function
+        return log_status.startswith("Success") or log_status == "Empty"
 
 
+    @within_budget("export click", "step_budget")
     def robust_click_download_button(self, download_button_locator, description="Download Button", status_callback=None):
-        """Tries multiple methods to click the download button reliably."""
+        """
+        Tries multiple methods to click the download button reliably. With the click strategy cache
+        enabled, the method that worked fastest on this locator before is tried first.
+        """
         log_func = status_callback or self._log
         log_func(f"[Robust Click] Attempting to click '{description}' (Locator: {download_button_locator})")
+        click_cache = get_click_cache()
+        strategies = click_cache.order(download_button_locator) if click_cache else CLICK_STRATEGIES
+        self._last_click = None
 
         try:
             # 1. Wait for element to be clickable
@@ -983,59 +1900,51 @@ class WebAutomation:
             btn = self.wait.until(EC.element_to_be_clickable(download_button_locator))
             log_func(f"[Robust Click] Element '{description}' found and deemed clickable.")
 
-            # 2. Log element details for debugging
-            try:
-                btn_html = btn.get_attribute('outerHTML')
-                btn_text = btn.text
-                btn_tag = btn.tag_name
-                btn_class = btn.get_attribute('class')
-                btn_disabled = btn.get_attribute('disabled')
-                btn_style = btn.get_attribute('style')
-                log_func(f"[Robust Click Debug] Tag: {btn_tag}, Text: '{btn_text}', Class: '{btn_class}', Disabled: {btn_disabled}") #, Style: '{btn_style}', HTML: {btn_html[:100]}...")
-                print(f"[DEBUG] Download button outerHTML: {btn_html}") # Keep console debug too
-            except StaleElementReferenceException:
-                log_func("[Robust Click Debug] Element went stale while getting attributes. Will retry finding.")
-                # Let the outer retry handle finding it again if needed, or fail here
-                raise # Re-raise stale element exception
+            # 2. Log element details for debugging (skipped once a click method is known to work here)
+            if not (click_cache and click_cache.trusted(download_button_locator)):
+                try:
+                    btn_html = btn.get_attribute('outerHTML')
+                    btn_text = btn.text
+                    btn_tag = btn.tag_name
+                    btn_class = btn.get_attribute('class')
+                    btn_disabled = btn.get_attribute('disabled')
+                    log_func(f"[Robust Click Debug] Tag: {btn_tag}, Text: '{btn_text}', Class: '{btn_class}', Disabled: {btn_disabled}")
+                    print(f"[DEBUG] Download button outerHTML: {btn_html}") # Keep console debug too
+                except StaleElementReferenceException:
+                    log_func("[Robust Click Debug] Element went stale while getting attributes. Will retry finding.")
+                    # Let the outer retry handle finding it again if needed, or fail here
+                    raise # Re-raise stale element exception
 
             # 3. Scroll into view
             log_func(f"[Robust Click] Scrolling '{description}' into view...")
-            self.driver.execute_script("arguments[0].scrollIntoView({block: 'center', inline: 'nearest'});", btn)
-            time.sleep(0.5) # Small pause after scroll
-
-            # 4. Try Selenium's native click
-            try:
-                log_func(f"[Robust Click] Trying Selenium native .click() on '{description}'...")
-                btn.click()
-                log_func(f"[Robust Click] Selenium native .click() successful for '{description}'.")
-                return True
-            except (ElementClickInterceptedException, ElementNotInteractableException) as native_click_err:
-                log_func(f"[Robust Click] Selenium native .click() failed: {type(native_click_err).__name__}. Trying alternatives.")
-            except StaleElementReferenceException:
-                 log_func("[Robust Click] Element went stale before native click. Will let retry handle it.")
-                 raise # Re-raise to trigger retry
-
-            # 5. Try ActionChains click
-            try:
-                log_func(f"[Robust Click] Trying ActionChains click on '{description}'...")
-                actions = ActionChains(self.driver)
-                actions.move_to_element(btn).click().perform()
-                log_func(f"[Robust Click] ActionChains click successful for '{description}'.")
-                return True
-            except Exception as action_click_err:
-                log_func(f"[Robust Click] ActionChains click failed: {type(action_click_err).__name__}. Trying JavaScript.")
+            self.page_waits.scroll_into_view(btn)
 
-            # 6. Try JavaScript click
-            try:
-                log_func(f"[Robust Click] Trying JavaScript click on '{description}'...")
-                self.driver.execute_script("arguments[0].click();", btn)
-                log_func(f"[Robust Click] JavaScript click successful for '{description}'.")
+            # 4. Try the click methods: cached order, else Selenium native, ActionChains, JavaScript
+            for strategy in strategies:
+                log_func(f"[Robust Click] Trying {CLICK_STRATEGY_NAMES[strategy]} on '{description}'"
+                         + (f" ({click_cache.describe(download_button_locator, strategy)})..." if click_cache else "..."))
+                click_started = time.time()
+                try:
+                    if strategy == 'native':
+                        btn.click()
+                    elif strategy == 'actions':
+                        ActionChains(self.driver).move_to_element(btn).click().perform()
+                    else:
+                        self.driver.execute_script("arguments[0].click();", btn)
+                except StaleElementReferenceException:
+                    log_func(f"[Robust Click] Element went stale before {CLICK_STRATEGY_NAMES[strategy]}. Will let retry handle it.")
+                    raise # Re-raise to trigger retry
+                except Exception as click_err:
+                    log_func(f"[Robust Click] {CLICK_STRATEGY_NAMES[strategy]} failed: {type(click_err).__name__}.")
+                    if click_cache:
+                        click_cache.record_failure(download_button_locator, strategy)
+                    continue
+                log_func(f"[Robust Click] {CLICK_STRATEGY_NAMES[strategy]} successful for '{description}'.")
+                if click_cache:
+                    click_cache.record_success(download_button_locator, strategy, time.time() - click_started)
+                self._last_click = (download_button_locator, strategy) # Demoted if no download starts after it
                 return True
-            except Exception as js_click_err:
-                log_func(f"[Robust Click] JavaScript click failed: {type(js_click_err).__name__}.")
-                # All methods failed for this attempt
-                log_func(f"[Robust Click] All click methods failed for '{description}'.")
-                last_exception = js_click_err # Store last error
+            log_func(f"[Robust Click] All click methods failed for '{description}'.")
 
         except (TimeoutException, NoSuchElementException) as e:
             log_func(f"[Robust Click] ERROR: Could not find or wait for '{description}' (Locator: {download_button_locator}). {type(e).__name__}")
@@ -1057,55 +1966,58 @@ class WebAutomation:
 
     # --- Specific Report Download Methods ---
 
+    def _variant_setup(self, variant, log_func):
+        """Returns the report_specific_setup callable for a report variant (None if it needs no setup)."""
+        variant_info = report_variants[variant]
+        if not variant_info["radio_id"]:
+            return None
+        def setup():
+            page_state = self._current_page_state()
+            if self.reuse_page and page_state.get('variant') == variant:
+                log_func(f"{variant_info['description']} already selected on reused page.")
+                return
+            # !!! VERIFY THIS RADIO BUTTON LOCATOR !!!
+            radio_locator = (By.ID, variant_info["radio_id"])
+            if not self.safe_click(radio_locator, variant_info["description"], retries=2, status_callback=log_func):
+                raise DownloadFailedException(f"Failed to click {variant_info['description']}.")
+            log_func(f"Clicked {variant_info['description']}.")
+            self.page_waits.page_idle(timeout=SHORT_WAIT, label="report type postback", settle=POSTBACK_SETTLE) # The radio may post back
+            if page_state:
+                page_state['variant'] = variant
+        return setup
+
+    @chunk_scope
     @retry_on_exception()
     def download_report_001(self, report_url, from_date, to_date, status_callback=None):
         """Downloads report FAF001."""
         log_func = status_callback or self._log
         log_func("Executing specific setup for FAF001...")
-        def setup_001():
-             # !!! VERIFY THIS RADIO BUTTON LOCATOR !!!
-             radio_locator = (By.ID, 'ctl00_MainContent_rblType_1')
-             if not self.safe_click(radio_locator, "FAF001 Report Type Radio", retries=2, status_callback=log_func):
-                 raise DownloadFailedException("Failed to click FAF001 report type radio button.")
-             log_func("Clicked FAF001 specific radio button.")
-             time.sleep(SHORT_WAIT) # Pause after click if needed
-        return self._perform_download_steps(report_url, from_date, to_date, report_specific_setup=setup_001, file_suffix="", status_callback=log_func)
+        return self._perform_download_steps(report_url, from_date, to_date, report_specific_setup=self._variant_setup("001", log_func), file_suffix=report_variants["001"]["suffix"], status_callback=log_func, variant="001")
 
+    @chunk_scope
     @retry_on_exception()
     def download_report_004N(self, report_url, from_date, to_date, status_callback=None):
         """Downloads report FAF004N (Imports)."""
         log_func = status_callback or self._log
         log_func("Executing specific setup for FAF004N (Imports)...")
-        def setup_004N():
-             # !!! VERIFY THIS RADIO BUTTON LOCATOR !!!
-             radio_locator = (By.ID, 'ctl00_MainContent_rblType_1') # Assume Imports type is index 1
-             if not self.safe_click(radio_locator, "FAF004N Report Type Radio (Imports)", retries=2, status_callback=log_func):
-                 raise DownloadFailedException("Failed to click FAF004N report type radio button (Imports).")
-             log_func("Clicked FAF004N (Imports) specific radio button.")
-             time.sleep(SHORT_WAIT)
-        return self._perform_download_steps(report_url, from_date, to_date, report_specific_setup=setup_004N, file_suffix="N", status_callback=log_func)
+        return self._perform_download_steps(report_url, from_date, to_date, report_specific_setup=self._variant_setup("004N", log_func), file_suffix=report_variants["004N"]["suffix"], status_callback=log_func, variant="004N")
 
+    @chunk_scope
     @retry_on_exception()
     def download_report_004X(self, report_url, from_date, to_date, status_callback=None):
         """Downloads report FAF004X (Exports)."""
         log_func = status_callback or self._log
         log_func("Executing specific setup for FAF004X (Exports)...")
-        def setup_004X():
-            # !!! VERIFY THIS RADIO BUTTON LOCATOR !!!
-             radio_locator = (By.ID, 'ctl00_MainContent_rblType_0') # Assume Exports type is index 0
-             if not self.safe_click(radio_locator, "FAF004X Report Type Radio (Exports)", retries=2, status_callback=log_func):
-                 raise DownloadFailedException("Failed to click FAF004X report type radio button (Exports).")
-             log_func("Clicked FAF004X (Exports) specific radio button.")
-             time.sleep(SHORT_WAIT)
-        return self._perform_download_steps(report_url, from_date, to_date, report_specific_setup=setup_004X, file_suffix="X", status_callback=log_func)
+        return self._perform_download_steps(report_url, from_date, to_date, report_specific_setup=self._variant_setup("004X", log_func), file_suffix=report_variants["004X"]["suffix"], status_callback=log_func, variant="004X")
 
+    @chunk_scope
     @retry_on_exception()
     def download_generic_report(self, report_url, from_date, to_date, status_callback=None):
          """Downloads a generic report with no special setup."""
          log_func = status_callback or self._log
          log_func("Executing generic download logic...")
          # Pass None for setup, empty suffix
-         return self._perform_download_steps(report_url, from_date, to_date, report_specific_setup=None, file_suffix="", status_callback=log_func)
+         return self._perform_download_steps(report_url, from_date, to_date, report_specific_setup=None, file_suffix="", status_callback=log_func, variant="generic")
 
     # --- Region Selection Logic ---
     def select_region(self, region_index, status_callback=None):
@@ -1123,7 +2035,7 @@ class WebAutomation:
                     log_func(f"ERROR: Failed to click region '{region_name}'.")
                     self.capture_screenshot(f"region_{region_name}_select_fail")
                     return False
-                time.sleep(SHORT_WAIT) # Pause after selecting region
+                self.page_waits.page_idle(timeout=SHORT_WAIT, label="region select", settle=POSTBACK_SETTLE)
                 log_func(f"Successfully clicked region '{region_name}'.")
                 return True
             else:
@@ -1135,9 +2047,46 @@ class WebAutomation:
             traceback.print_exc()
             return False
 
+    @within_budget("select region", "step_budget")
+    def _select_region_in_tree(self, region_index, log_func):
+        """
+        Opens the region tree, ticks one region and closes the dropdown.
+        On a reused page the previously ticked region is unticked first (or nothing is done if it is the same one).
+        """
+        region_name = regions_data[region_index]["name"]
+        page_state = self._current_page_state()
+        previous_region = page_state.get('region_index') if self.reuse_page else None
+        if previous_region == region_index:
+            log_func(f"Region '{region_name}' already selected on reused page.")
+            return
+
+        log_func("Opening region selection tree...")
+        if not self.safe_click(REGION_TREE_ARROW_LOCATOR, "Region Tree Arrow", status_callback=log_func):
+             raise DownloadFailedException("Failed to click open region selection tree arrow.")
+
+        if previous_region is not None:
+            log_func(f"Unticking previously selected region '{regions_data[previous_region]['name']}'...")
+            page_state['region_index'] = None
+            if not self.select_region(previous_region, status_callback=log_func):
+                raise DownloadFailedException(f"Failed to untick region '{regions_data[previous_region]['name']}'.")
+
+        # Select the specific region using its XPath
+        if not self.select_region(region_index, status_callback=log_func):
+             # select_region already logged the error and took screenshot
+             raise DownloadFailedException(f"Failed to select region '{region_name}'.")
+
+        # Click outside to close the tree (optional, but can help)
+        log_func("Attempting to close region dropdown...")
+        # Use safe_click, but failure might not be critical
+        self.safe_click(REGION_DROPDOWN_CLOSE_LOCATOR, "Report Title (to close dropdown)", retries=1, status_callback=log_func)
+        self.page_waits.page_idle(timeout=SHORT_WAIT, label="region dropdown close", settle=POSTBACK_SETTLE)
+        if page_state:
+            page_state['region_index'] = region_index
+
     # --- Region Report Download Method (FAF030 example) ---
     # Use retry decorator for the whole operation
     # Now uses DownloadFailedException correctly as it's defined above
+    @chunk_scope
     @retry_on_exception(exceptions=(WebDriverException, DownloadFailedException), retries=2, delay=15)
     def download_report_for_region(self, report_url, from_date, to_date, region_index, status_callback=None):
         """Downloads a report requiring region selection (e.g., FAF030)."""
@@ -1149,105 +2098,65 @@ class WebAutomation:
              return False # Fail this specific region download attempt
 
         region_name = regions_data[region_index]["name"]
+        if self._skip_known_empty(report_url, None, from_date, to_date, region_index, log_func):
+            return True
         log_func(f"--- Starting download for Region: {region_name} ({from_date} to {to_date}) ---")
 
         log_file_name = ""
         log_status = "Failed (Region Initial)"
         log_error = ""
         downloaded_original_name = None
+        commands_at_start = self.command_count
+        fill_mode = "step-by-step fill"
 
         try:
-            log_func(f"Navigating to report URL: {report_url}")
-            self.driver.get(report_url)
+            self._open_report_page(report_url, log_func)
+            export_started = time.time()
 
-            # --- Check for 502 Bad Gateway and retry if needed ---
-            max_502_retries = 3
-            for attempt_502 in range(max_502_retries):
-                page_source = self.driver.page_source
-                if '<h1>502 Bad Gateway</h1>' in page_source:
-                    log_func(f"Detected 502 Bad Gateway (attempt {attempt_502+1}/{max_502_retries}). Refreshing and retrying...")
-                    time.sleep(3)
-                    self.driver.refresh()
-                    time.sleep(2)
-                    continue
-                else:
-                    break
-            else:
-                log_func("ERROR: 502 Bad Gateway persists after retries. Aborting this report.")
-                self.capture_screenshot("502_bad_gateway")
-                raise DownloadFailedException("502 Bad Gateway after retries.")
-            # --- End 502 check ---
-
-            # !!! VERIFY ALL LOCATORS FOR REGION REPORT PAGE !!!
-            sdate_locator = (By.ID, 'ctl00_MainContent_cbo_fromDate_dateInput')
-            edate_locator = (By.ID, 'ctl00_MainContent_cbo_toDate_dateInput')
-            tree_arrow_locator = (By.ID, 'ctl00_MainContent_TreeShopThuoc1_cboDepartmentsThuoc_Arrow')
-            # Tree expand might not be needed if regions visible after arrow click
-            # tree_plus_locator = (By.CLASS_NAME, 'rtPlus') # Often unreliable
-            # Click outside element (verify XPath)
-            close_dropdown_locator = (By.XPATH, "//div[contains(@class,'RadWindow')]//span[contains(text(), 'Báo Cáo Nhập Xuất Tồn FAF')]") # Example, needs verification
-            # !!! THIS IS THE DOWNLOAD BUTTON LOCATOR FOR REGION REPORTS - VERIFY !!!
-            download_button_locator_region = (By.ID, 'ctl00_MainContent_btnExportExcel_input')
-
-            log_func("Waiting for date inputs...")
-            self.wait.until(EC.presence_of_element_located(sdate_locator))
-
-            # --- Enter Dates ---
-            log_func(f"Setting 'To Date': {to_date}")
-            edate_input = self.wait.until(EC.element_to_be_clickable(edate_locator))
-            edate_input.clear()
-            edate_input.send_keys(format_date_ddmmyyyy(to_date))
-
-            log_func(f"Setting 'From Date': {from_date}")
-            sdate_input = self.wait.until(EC.element_to_be_clickable(sdate_locator))
-            sdate_input.clear()
-            sdate_input.send_keys(format_date_ddmmyyyy(from_date))
-
-            # --- Open Region Tree and Select ---
-            log_func("Opening region selection tree...")
-            if not self.safe_click(tree_arrow_locator, "Region Tree Arrow", status_callback=log_func):
-                 raise DownloadFailedException("Failed to click open region selection tree arrow.")
-
-            # Select the specific region using its XPath
-            if not self.select_region(region_index, status_callback=log_func):
-                 # select_region already logged the error and took screenshot
-                 raise DownloadFailedException(f"Failed to select region '{region_name}'.")
-
-            # Click outside to close the tree (optional, but can help)
-            log_func("Attempting to close region dropdown...")
-            # Use safe_click, but failure might not be critical
-            self.safe_click(close_dropdown_locator, "Report Title (to close dropdown)", retries=1, status_callback=log_func)
-            time.sleep(SHORT_WAIT) # Wait after closing dropdown
-
-            # --- Click Region Download Button ---
-            log_func(f"Locating and clicking region download button (Locator: {download_button_locator_region})...")
-            self.handle_alert(accept=True, status_callback=log_func)
+            download_button_locator_region = REGION_EXPORT_BUTTON_LOCATOR
             self.update_files_before_download()
+            if self._fast_fill_and_export(from_date, to_date, None, region_index, download_button_locator_region, log_func):
+                fill_mode = "scripted fill"
+                click_ok = True
+            else:
+                # --- Enter Dates ---
+                self._fill_date_range(from_date, to_date, log_func)
+
+                # --- Open Region Tree and Select ---
+                self._select_region_in_tree(region_index, log_func)
 
-            # Use robust click for the region download button as well
-            if self.robust_click_download_button(download_button_locator_region, description=f"Region {region_name} Download Button", status_callback=log_func):
+                # --- Click Region Download Button ---
+                log_func(f"Locating and clicking region download button (Locator: {download_button_locator_region})...")
+                self.handle_alert(accept=True, status_callback=log_func)
+                self.update_files_before_download()
+
+                # Use robust click for the region download button as well
+                click_ok = self.robust_click_download_button(download_button_locator_region, description=f"Region {region_name} Download Button", status_callback=log_func)
+            if click_ok:
                 log_func(f"Region {region_name} download click initiated. Checking alerts...")
                 self.handle_alert(accept=True, status_callback=log_func)
+                self._raise_if_empty(log_func)
 
                 # --- Wait for Download ---
-                downloaded_original_name = self.wait_for_download_to_finish(status_callback=log_func)
+                downloaded_original_name = self.wait_for_download_to_finish(status_callback=log_func, empty_check=True)
 
                 if downloaded_original_name:
                     log_func(f"Download detected for region {region_name}: {downloaded_original_name}")
+                    self._record_chunk_cost(report_url, region_index, from_date, to_date, export_started, downloaded_original_name)
                     # --- Process File ---
                     # Rename using region name as suffix
-                    renamed_file = self.rename_downloaded_file(downloaded_original_name, from_date, to_date, f"_{region_name}", log_func)
-                    log_file_name = renamed_file if renamed_file else downloaded_original_name
-
-                    if downloaded_original_name.lower().endswith('.zip'):
-                        extracted_files = self.extract_zip_files(status_callback=log_func)
-                        # Rename all extracted files after extraction
-                        for extracted_path in extracted_files:
-                            self.rename_extract_file(extracted_path, from_date, to_date, f"_{region_name}", log_func)
-
-                    log_status = "Success" if renamed_file else "Success (Rename Failed)"
+                    log_file_name, renamed_ok = self._process_downloaded_file(downloaded_original_name, from_date, to_date, f"_{region_name}", log_func)
+                    log_status = "Success" if renamed_ok else "Success (Rename Failed)"
                     log_func(f"Region {region_name} download and processing complete. File: {log_file_name}")
+                elif self.last_stall:
+                    log_error = f"Download stalled for region {region_name}: {self.last_stall.reason}."
+                    log_status = "Failed (Download Stalled)"
+                    log_func(f"ERROR: {log_error}")
+                    self._record_chunk_cost(report_url, region_index, from_date, to_date, export_started)
+                    raise DownloadFailedException(log_error)
                 else: # wait_for_download_to_finish failed
+                    if self.last_wait_timed_out:
+                        self._record_chunk_cost(report_url, region_index, from_date, to_date, export_started)
                     log_error = f"Download wait timed out or failed for region {region_name}."
                     log_status = "Failed (Download Wait)"
                     log_func(f"ERROR: {log_error}")
@@ -1261,6 +2170,11 @@ class WebAutomation:
                 raise DownloadFailedException(log_error)
 
         # --- Error Handling ---
+        except EmptyExportResult as empty:
+             log_status = "Empty"
+             log_error = str(empty)
+             log_func(f"No data for region {region_name}, {from_date} to {to_date} ({empty}). Moving on.")
+             self._record_empty(report_url, None, from_date, to_date, region_index, log_func)
         except DownloadFailedException as df_err:
              log_status = log_status if log_status != "Failed (Region Initial)" else "Failed (Region Setup/Select/Click)"
              log_error = str(df_err)
@@ -1297,59 +2211,610 @@ class WebAutomation:
             ]
             self.write_log_to_csv(log_data)
             log_func(f"Logged region download status '{log_status}' for {from_date}-{to_date}, Region: {region_name}.")
+            log_func(f"WebDriver commands for {from_date}-{to_date}, Region {region_name}: {self.command_count - commands_at_start} ({fill_mode}).")
+            if not log_status.startswith("Success") and log_status != "Empty":
+                self._page_state.clear() # Reload the report page for the next chunk
             log_func(f"--- Finished processing Region: {region_name} ---")
 
 
-        # Return True/False based on success status
-        return log_status.startswith("Success")
-
+        # Return True/False based on success status (an empty result counts as done)
+        return log_status.startswith("Success") or log_status == "Empty"
 
-    # --- Chunking Methods ---
 
-    def split_date_range(self, start_date_str, end_date_str, chunk_size):
-        """Splits a date range into smaller chunks."""
-        log_func = self._log # Use internal logger
+    # --- Export Jobs (shared by tab and pipelined chunk loops) ---
+    @staticmethod
+    def build_export_jobs(report_url, date_ranges, variant=None, region_indices=None):
+        """
+        Builds export job dicts for the tab/pipeline loops.
+        Keys: report_url, from_date, to_date, variant, region_index, suffix, export_locator.
+        """
+        if region_indices:
+            return [{
+                'report_url': report_url, 'from_date': from_chunk, 'to_date': to_chunk,
+                'variant': None, 'region_index': region_idx,
+                'suffix': f"_{regions_data[region_idx]['name']}", 'export_locator': REGION_EXPORT_BUTTON_LOCATOR,
+            } for from_chunk, to_chunk in date_ranges for region_idx in region_indices]
+        return [{
+            'report_url': report_url, 'from_date': from_chunk, 'to_date': to_chunk,
+            'variant': variant, 'region_index': None,
+            'suffix': report_variants[variant]["suffix"], 'export_locator': CSV_EXPORT_BUTTON_LOCATOR,
+        } for from_chunk, to_chunk in date_ranges]
+
+    # --- Multi-Tab Concurrent Exports ---
+    def open_export_tabs(self, count, status_callback=None):
+        """
+        Opens up to `count` tabs in the current (logged-in) session. Each tab downloads
+        into its own sub-folder so finished files can be attributed to the export that
+        produced them. Returns a list of ExportTab (empty if per-tab folders are unsupported).
+        """
+        log_func = status_callback or self._log
+        tabs = []
         try:
-            start = datetime.strptime(start_date_str, '%Y-%m-%d')
-            end = datetime.strptime(end_date_str, '%Y-%m-%d')
-        except (ValueError, TypeError) as e:
-             log_func(f"ERROR parsing date range: '{start_date_str}' to '{end_date_str}'. Invalid format or empty? Error: {e}")
-             return []
-
-        if start > end:
-            log_func(f"Warning: Start date {start_date_str} is after end date {end_date_str}. No chunks generated.")
+            main_handle = self.driver.current_window_handle
+            for tab_num in range(1, count + 1):
+                if tab_num > 1:
+                    self.driver.switch_to.new_window('tab')
+                tab_folder = os.path.join(self.download_folder, f"_tab{tab_num}")
+                os.makedirs(tab_folder, exist_ok=True)
+                # Page-level download behavior applies to this tab only
+                self.driver.execute_cdp_cmd('Page.setDownloadBehavior', {'behavior': 'allow', 'downloadPath': tab_folder})
+                if tab_num > 1:
+                    self._apply_lean_blocking()
+                tabs.append(ExportTab(self.driver.current_window_handle, tab_folder))
+            self.driver.switch_to.window(main_handle)
+            log_func(f"Opened {len(tabs)} export tab(s).")
+            return tabs
+        except (WebDriverException, OSError) as e:
+            log_func(f"Warning: Could not set up export tabs ({type(e).__name__}: {str(e)[:150]}). Falling back to one chunk at a time.")
+            self.close_export_tabs(tabs, status_callback=log_func)
             return []
 
-        date_ranges = []
-        current_start = start
-
-        while current_start <= end:
-            chunk_end_date = end # Default to end if chunk_size is invalid
-            if chunk_size == 'month':
-                # End of the current month
-                month_end = (current_start.replace(day=1) + timedelta(days=32)).replace(day=1) - timedelta(days=1)
-                chunk_end_date = min(month_end, end)
-            elif isinstance(chunk_size, int) and chunk_size > 0:
-                # Calculate end based on number of days
-                chunk_end_date = min(current_start + timedelta(days=chunk_size - 1), end)
-            else:
-                 log_func(f"Warning: Invalid chunk size '{chunk_size}'. Processing range {current_start.strftime('%Y-%m-%d')} to {end.strftime('%Y-%m-%d')} as single chunk.")
-                 chunk_end_date = end # Process remaining range as one chunk
+    def close_export_tabs(self, tabs, status_callback=None):
+        """Closes extra tabs, restores the main download folder and removes empty tab folders."""
+        log_func = status_callback or self._log
+        if not tabs:
+            return
+        main_handle = tabs[0].handle
+        try:
+            for tab in tabs[1:]:
+                self._page_state.pop(tab.handle, None)
+                try:
+                    self.driver.switch_to.window(tab.handle)
+                    self.driver.close()
+                except WebDriverException as e:
+                    log_func(f"Warning: Could not close export tab: {str(e)[:100]}")
+            self.driver.switch_to.window(main_handle)
+            self.driver.execute_cdp_cmd('Page.setDownloadBehavior', {'behavior': 'allow', 'downloadPath': self.download_folder})
+        except WebDriverException as e:
+            log_func(f"Warning: Could not restore main tab after concurrent exports: {str(e)[:150]}")
+        for tab in tabs:
+            tab.close_watcher()
+            move_completed_files(tab.download_folder, self.download_folder, log_func)
+            try:
+                os.rmdir(tab.download_folder) # Only succeeds if empty
+            except OSError:
+                pass
+
+    def _trigger_export(self, job, log_func, before_click=None):
+        """Fills the report form for `job` in the current tab and clicks export without waiting for the file."""
+        self._open_report_page(job['report_url'], log_func)
+        commands_at_start = self.command_count
+        self.last_alert_text = None # Alerts from here on belong to this export
+        if before_click and self.fast_fill:
+            before_click()
+        if self._fast_fill_and_export(job['from_date'], job['to_date'], job['variant'], job['region_index'], job['export_locator'], log_func):
+            self.handle_alert(accept=True, status_callback=log_func)
+            log_func(f"WebDriver commands to trigger {job['from_date']}-{job['to_date']}: {self.command_count - commands_at_start} (scripted fill).")
+            return
+        if job['region_index'] is None:
+            setup = self._variant_setup(job['variant'], log_func)
+            if setup:
+                setup()
+        self._fill_date_range(job['from_date'], job['to_date'], log_func)
+        if job['region_index'] is not None:
+            self._select_region_in_tree(job['region_index'], log_func)
+        self.handle_alert(accept=True, status_callback=log_func)
+        self.last_alert_text = None
+        if before_click:
+            before_click()
+        if not self.robust_click_download_button(job['export_locator'], description="Export Button", status_callback=log_func):
+            raise DownloadFailedException(f"Failed to click export button (Locator: {job['export_locator']}).")
+        self.handle_alert(accept=True, status_callback=log_func)
+        log_func(f"WebDriver commands to trigger {job['from_date']}-{job['to_date']}: {self.command_count - commands_at_start} (step-by-step fill).")
+
+    def _start_tab_export(self, tab, job, log_func):
+        """Switches to `tab` and triggers the export for `job` there. Raises EmptyExportResult on a "no data" answer."""
+        self.driver.switch_to.window(tab.handle)
+        self._trigger_export(job, log_func, before_click=tab.snapshot_folder)
+        tab.last_click, self._last_click = self._last_click, None # Judged by this tab's download only
+        tab.job = job
+        tab.download = None
+        tab.started_at = time.time()
+        tab.alert_text = self.last_alert_text
+        tab.empty_checked_at = time.time()
+        tab.last_bytes, tab.grew_at = -1, tab.started_at
+        tab.wait_timeout = self.deadlines.timeout(DOWNLOAD_WAIT_TIMEOUT)
+        self._raise_if_empty(log_func)
+
+    def _tab_stall_reason(self, tab):
+        """Why the tab's download counts as stalled (start_timeout/stall_timeout as in wait_for_download_to_finish), or None."""
+        if not self.download_tracker:
+            return tab.watcher.stall_reason(tab.started_at, self.stall_timeout, self.start_timeout) if tab.watcher else None
+        now = time.time()
+        if tab.download is None:
+            if self.start_timeout and now - tab.started_at >= self.start_timeout:
+                return f"no download started within {self.start_timeout}s of the export click"
+            return None
+        if tab.download['received_bytes'] != tab.last_bytes:
+            tab.last_bytes, tab.grew_at = tab.download['received_bytes'], now
+        elif self.stall_timeout and now - tab.grew_at >= self.stall_timeout:
+            return f"no new bytes for {self.stall_timeout}s ({CdpDownloadTracker.describe_progress(tab.download)})"
+        return None
+
+    def _cancel_tab_download(self, tab, reason, log_func):
+        """Cancels the tab's stalled or timed-out download and removes its partial files."""
+        stall = DownloadStalled(reason, guid=tab.download['guid'] if tab.download else None)
+        if tab.download:
+            self.download_tracker.forget(tab.download)
+        self._cancel_stalled_download(stall, tab.download_folder, tab.before_download, log_func)
+
+    def _requeue_stalled_job(self, job, pending, log_func, prefix):
+        """
+        Puts a stalled or timed-out job back at the front of pending as two half-range jobs, like the
+        sequential loop's split retry (stall_retries deep). False when it is out of retries.
+        """
+        retries_left = job.get('stall_retries_left', self.stall_retries)
+        if retries_left <= 0 or self.deadlines.expired():
+            return False
+        parts = halve_date_range(job['from_date'], job['to_date'])
+        pending[:0] = [dict(job, from_date=part_from, to_date=part_to, stall_retries_left=retries_left - 1) for part_from, part_to in parts]
+        log_func(f"{prefix} Retrying {job['from_date']} to {job['to_date']} as {len(parts)} part(s): {parts}")
+        return True
+
+    def _abandon_jobs(self, jobs, log_func, prefix):
+        """Logs jobs dropped because the time budget ran out. Returns how many."""
+        log_func(f"ERROR: {prefix} Time budget exhausted ({self.deadlines.describe()}). Skipping the remaining {len(jobs)} export(s).")
+        for job in jobs:
+            self._log_download_result("", job['from_date'], job['to_date'], "Failed (Time Budget Exhausted)", self.deadlines.describe())
+        return len(jobs)
+
+    def _check_tab_empty(self, tab, log_func):
+        """
+        Every EMPTY_CHECK_INTERVAL seconds until its download starts, looks at the tab's page for a
+        "no data" answer (raises EmptyExportResult), so such a chunk does not wait for the download timeout.
+        """
+        if tab.download or (tab.watcher and tab.watcher.first_byte_at) or time.time() - tab.empty_checked_at < EMPTY_CHECK_INTERVAL:
+            return
+        tab.empty_checked_at = time.time()
+        self.driver.switch_to.window(tab.handle)
+        self.last_alert_text = tab.alert_text
+        try:
+            self._raise_if_empty(log_func)
+        finally:
+            tab.alert_text = self.last_alert_text
+
+    def _log_empty_export(self, job, empty, log_func, prefix):
+        """Logs a tab/pipeline export answered with "no data" as Empty and remembers the range."""
+        log_func(f"{prefix} No data for {job['from_date']} to {job['to_date']} ({empty}). Moving on.")
+        self._log_download_result("", job['from_date'], job['to_date'], "Empty", str(empty))
+        self._record_empty(job['report_url'], job['variant'], job['from_date'], job['to_date'], job['region_index'], log_func)
+
+    def _check_tab_download(self, tab, log_func):
+        """Name of the tab's finished download or None, from DevTools events when available, else a folder scan."""
+        if not self._poll_download_events(log_func):
+            return tab.watcher.check() if tab.watcher else self._find_completed_download(tab.download_folder, tab.before_download, log_func)
+        if tab.download is None:
+            tab.download = self.download_tracker.claim_next(tab.handle)
+            if tab.download:
+                log_func(f"[Tab] Download started for {tab.job['from_date']} to {tab.job['to_date']}: '{tab.download['suggested_filename']}'.")
+        if tab.download and tab.download['state'] == 'completed':
+            self.download_tracker.forget(tab.download)
+            return CdpDownloadTracker.resolve_file_name(tab.download, tab.download_folder, tab.before_download) \
+                or (tab.watcher.check() if tab.watcher else self._find_completed_download(tab.download_folder, tab.before_download, log_func))
+        return None
+
+    def _finish_tab_export(self, tab, downloaded_original_name, log_func):
+        """Renames/extracts a finished tab download, moves it to the run folder and logs the chunk."""
+        job = tab.job
+        self._record_chunk_cost(job['report_url'], job['region_index'], job['from_date'], job['to_date'], tab.started_at,
+                                downloaded_original_name, download_folder=tab.download_folder)
+        log_file_name, renamed_ok = self._process_downloaded_file(
+            downloaded_original_name, job['from_date'], job['to_date'], job['suffix'], log_func,
+            download_folder=tab.download_folder
+        )
+        moved = move_completed_files(tab.download_folder, self.download_folder, log_func)
+        if moved and log_file_name not in moved:
+            # Renamed on move to avoid a clash with an existing file
+            base = os.path.splitext(log_file_name)[0]
+            log_file_name = next((name for name in moved if name.startswith(base)), log_file_name)
+        log_status = "Success" if renamed_ok else "Success (Rename Failed)"
+        self._log_download_result(log_file_name, job['from_date'], job['to_date'], log_status, "")
+        log_func(f"[Tab] Completed {job['from_date']} to {job['to_date']}: {log_file_name}")
+
+    def download_jobs_in_tabs(self, jobs, status_callback=None):
+        """
+        Drives export jobs across self.tab_count tabs of this session. Every tab starts an
+        export, then tabs are polled; a tab whose file has landed is processed and reused
+        for the next job. A stalled or timed-out download is cancelled and its job retried in
+        halves (stall_retries), like the sequential loop does. Returns (success_count, fail_count), or None if tabs are unavailable.
+        Job dict keys: report_url, from_date, to_date, variant, region_index, suffix, export_locator.
+        """
+        log_func = status_callback or self._log
+        tabs = self.open_export_tabs(min(self.tab_count, len(jobs)), status_callback=log_func)
+        if not tabs:
+            return None
 
-            date_ranges.append((current_start.strftime('%Y-%m-%d'), chunk_end_date.strftime('%Y-%m-%d')))
-            # Move to the next day after the current chunk ends
-            current_start = chunk_end_date + timedelta(days=1)
+        pending = list(jobs)
+        success_count = 0
+        fail_count = 0
+        try:
+            while pending or any(tab.job for tab in tabs):
+                if self.deadlines.expired():
+                    running = [tab for tab in tabs if tab.job]
+                    for tab in running:
+                        self._cancel_tab_download(tab, "time budget exhausted", log_func)
+                    fail_count += self._abandon_jobs([tab.job for tab in running] + pending, log_func, "[Tab]")
+                    for tab in running:
+                        tab.job = None
+                    break
+
+                # 1. Give every idle tab a job
+                for tab in tabs:
+                    if tab.job or not pending:
+                        continue
+                    job = pending.pop(0)
+                    try:
+                        self._start_tab_export(tab, job, log_func)
+                    except EmptyExportResult as empty:
+                        success_count += 1
+                        tab.job = None
+                        self._log_empty_export(job, empty, log_func, "[Tab]")
+                    except (DownloadFailedException, TimeoutException, NoSuchElementException, StaleElementReferenceException) as e:
+                        fail_count += 1
+                        tab.job = None
+                        self._page_state.pop(tab.handle, None)
+                        log_func(f"ERROR: [Tab] Could not start export {job['from_date']} to {job['to_date']}: {type(e).__name__} - {str(e)[:150]}")
+                        self._log_download_result("", job['from_date'], job['to_date'], "Failed (Tab Export)", str(e)[:300])
+
+                # 2. Collect finished downloads
+                for tab in tabs:
+                    if not tab.job:
+                        continue
+                    downloaded_original_name = self._check_tab_download(tab, log_func)
+                    stalled = None if downloaded_original_name else self._tab_stall_reason(tab)
+                    if downloaded_original_name:
+                        self._finish_tab_export(tab, downloaded_original_name, log_func)
+                        success_count += 1
+                        tab.job = None
+                    elif tab.download and tab.download['state'] == 'canceled':
+                        fail_count += 1
+                        self.download_tracker.forget(tab.download)
+                        log_func(f"ERROR: [Tab] Download for {tab.job['from_date']} to {tab.job['to_date']} was canceled by the browser.")
+                        self._log_download_result("", tab.job['from_date'], tab.job['to_date'], "Failed (Download Canceled)", "Browser canceled the tab download.")
+                        tab.job = None
+                    elif stalled or time.time() - tab.started_at > tab.wait_timeout:
+                        job = tab.job
+                        reason = stalled or "download wait timed out"
+                        log_func(f"ERROR: [Tab] Download for {job['from_date']} to {job['to_date']}: {reason}. Cancelling it.")
+                        if not tab.download and not (tab.watcher and tab.watcher.first_byte_at):
+                            self._demote_click(tab.last_click, log_func)
+                        self._cancel_tab_download(tab, reason, log_func)
+                        self._record_chunk_cost(job['report_url'], job['region_index'], job['from_date'], job['to_date'], tab.started_at)
+                        self._log_download_result("", job['from_date'], job['to_date'],
+                                                  "Failed (Download Stalled)" if stalled else "Failed (Download Wait)", f"Tab download: {reason}.")
+                        if not self._requeue_stalled_job(job, pending, log_func, "[Tab]"):
+                            fail_count += 1
+                        tab.job = None
+                    else:
+                        try:
+                            self._check_tab_empty(tab, log_func)
+                        except EmptyExportResult as empty:
+                            success_count += 1
+                            self._log_empty_export(tab.job, empty, log_func, "[Tab]")
+                            tab.job = None
+
+                if any(tab.job for tab in tabs):
+                    self.wait_stats.sleep(EVENT_POLL_INTERVAL if self.download_tracker else 1, "tab download poll")
+        finally:
+            self.close_export_tabs(tabs, status_callback=log_func)
+
+        log_func(f"Concurrent tab exports finished. Success: {success_count}, Failed: {fail_count}.")
+        return success_count, fail_count
+
+    # --- Pipelined Exports (single tab) ---
+    def _wait_for_download_start(self, watcher, timeout, log_func):
+        """
+        Waits until `watcher` sees a new download (partial or complete) in the download folder. Returns its name or None.
+        Raises EmptyExportResult when the page answers "no data" meanwhile.
+        """
+        started = time.time()
+        try:
+            return watcher.wait_started(timeout, poll=lambda: self._raise_if_empty(log_func))
+        finally:
+            self.wait_stats.record_condition("download start", time.time() - started)
+
+    def _resolve_in_flight(self, entry):
+        """
+        Checks one in-flight download tracked by name.
+        Returns ('done', final_name), ('pending', None) or ('lost', None) when Chrome dropped the partial file.
+        """
+        name = entry['name']
+        path = os.path.join(self.download_folder, name)
+        if not name.lower().endswith(PARTIAL_DOWNLOAD_SUFFIXES):
+            return ('done', name) if os.path.isfile(path) and os.path.getsize(path) > 0 else ('pending', None)
+        if os.path.exists(path):
+            return ('pending', None) # Still downloading
+        final_name = os.path.splitext(name)[0] # 'report.csv.crdownload' -> 'report.csv'
+        if os.path.isfile(os.path.join(self.download_folder, final_name)):
+            return ('done', final_name)
+        return ('lost', None)
+
+    def _finish_in_flight(self, entry, downloaded_original_name, known, log_func):
+        """Renames/extracts a finished pipelined download and logs its chunk."""
+        job = entry['job']
+        self._record_chunk_cost(job['report_url'], job['region_index'], job['from_date'], job['to_date'], entry['export_started'], downloaded_original_name)
+        log_file_name, renamed_ok = self._process_downloaded_file(downloaded_original_name, job['from_date'], job['to_date'], job['suffix'], log_func)
+        try:
+            known.update(os.listdir(self.download_folder)) # Renamed/extracted outputs are not new downloads
+        except OSError:
+            pass
+        log_status = "Success" if renamed_ok else "Success (Rename Failed)"
+        self._log_download_result(log_file_name, job['from_date'], job['to_date'], log_status, "")
+        log_func(f"[Pipeline] Completed {job['from_date']} to {job['to_date']}: {log_file_name} ({time.time() - entry['started_at']:.1f}s)")
+
+    def _in_flight_stall_reason(self, entry):
+        """Why a pending in-flight download counts as stalled (its partial file stopped growing for stall_timeout), or None."""
+        if not self.stall_timeout:
+            return None
+        try:
+            size = os.path.getsize(os.path.join(self.download_folder, entry['name']))
+        except OSError:
+            return None
+        if size != entry['size']:
+            entry['size'], entry['grew_at'] = size, time.time()
+        elif time.time() - entry['grew_at'] >= self.stall_timeout:
+            return f"no new bytes for {self.stall_timeout}s"
+        return None
+
+    def _cancel_in_flight(self, entry, reason, log_func):
+        """Removes the partial file of one in-flight download (the others in the folder are left alone)."""
+        try:
+            others = set(os.listdir(self.download_folder)) - {entry['name']}
+        except OSError:
+            others = set()
+        self._cancel_stalled_download(DownloadStalled(reason, partial_names=[entry['name']]), self.download_folder, others, log_func)
 
-            # Safety break
-            if len(date_ranges) > 1000: # Limit chunks to prevent infinite loops
-                log_func("ERROR: Exceeded maximum number of chunks (1000). Stopping split.")
+    def _poll_in_flight(self, in_flight, known, pending, log_func):
+        """
+        Finishes every in-flight download that has completed, stalled or timed out. Stalled and
+        timed-out downloads are cancelled and their jobs re-queued in halves while stall retries last.
+        Returns (success, failed).
+        """
+        success_count = 0
+        fail_count = 0
+        for entry in list(in_flight):
+            state, completed_name = self._resolve_in_flight(entry)
+            job = entry['job']
+            if state == 'done':
+                in_flight.remove(entry)
+                known.add(completed_name)
+                self._finish_in_flight(entry, completed_name, known, log_func)
+                success_count += 1
+            elif state == 'lost':
+                in_flight.remove(entry)
+                fail_count += 1
+                log_func(f"ERROR: [Pipeline] Download for {job['from_date']} to {job['to_date']} ({entry['name']}) was cancelled or removed.")
+                self._log_download_result("", job['from_date'], job['to_date'], "Failed (Download Wait)", f"In-flight download '{entry['name']}' was cancelled or removed.")
+            else:
+                stalled = self._in_flight_stall_reason(entry)
+                if not stalled and time.time() - entry['started_at'] <= entry['wait_timeout']:
+                    continue
+                in_flight.remove(entry)
+                reason = stalled or "download wait timed out"
+                log_func(f"ERROR: [Pipeline] Download for {job['from_date']} to {job['to_date']} ({entry['name']}): {reason}. Cancelling it.")
+                self._cancel_in_flight(entry, reason, log_func)
+                self._record_chunk_cost(job['report_url'], job['region_index'], job['from_date'], job['to_date'], entry['export_started'])
+                self._log_download_result("", job['from_date'], job['to_date'],
+                                          "Failed (Download Stalled)" if stalled else "Failed (Download Wait)", f"In-flight download '{entry['name']}': {reason}.")
+                if not self._requeue_stalled_job(job, pending, log_func, "[Pipeline]"):
+                    fail_count += 1
+        return success_count, fail_count
+
+    def download_jobs_pipelined(self, jobs, status_callback=None):
+        """
+        Exports jobs in one tab without waiting for each file to finish: once chunk k's
+        download has started, chunk k+1 is triggered while k is still transferring.
+        In-flight downloads are tracked by file name and renamed/logged when they complete;
+        one that does not start or stalls is cancelled and its job retried in halves (stall_retries).
+        Returns (success_count, fail_count).
+        """
+        log_func = status_callback or self._log
+        in_flight = []
+        success_count = 0
+        fail_count = 0
+        try:
+            known = set(os.listdir(self.download_folder))
+        except OSError:
+            known = set()
+
+        pending = list(jobs)
+        while pending or in_flight:
+            if self.deadlines.expired():
+                for entry in in_flight:
+                    self._cancel_in_flight(entry, "time budget exhausted", log_func)
+                fail_count += self._abandon_jobs([entry['job'] for entry in in_flight] + pending, log_func, "[Pipeline]")
                 break
+            if not pending:
+                self.wait_stats.sleep(1, "pipeline download poll")
+                done, failed = self._poll_in_flight(in_flight, known, pending, log_func)
+                success_count += done
+                fail_count += failed
+                continue
+            job = pending.pop(0)
+            label = f"{job['from_date']} to {job['to_date']}"
+            # Files of downloads in flight (and their final names) are not this export's download
+            watcher = DownloadWatcher(self.download_folder, known | {os.path.splitext(entry['name'])[0] for entry in in_flight})
+            start_timeout = self.deadlines.timeout(self.start_timeout or DOWNLOAD_WAIT_TIMEOUT)
+            export_started = time.time() # Chunk cost runs from here to the completed file, as in the sequential path
+            try:
+                self._trigger_export(job, log_func)
+                self._raise_if_empty(log_func)
+                started_name = self._wait_for_download_start(watcher, start_timeout, log_func)
+                if not started_name:
+                    raise DownloadStalled(f"no download started within {start_timeout:.0f}s of the export click")
+                known.add(started_name)
+                in_flight.append({'job': job, 'name': started_name, 'export_started': export_started, 'started_at': time.time(), 'size': -1, 'grew_at': time.time(),
+                                  'wait_timeout': self.deadlines.timeout(DOWNLOAD_WAIT_TIMEOUT)})
+                log_func(f"[Pipeline] Export {label} started ({started_name}); {len(in_flight)} download(s) in flight.")
+            except EmptyExportResult as empty:
+                success_count += 1
+                self._log_empty_export(job, empty, log_func, "[Pipeline]")
+            except DownloadStalled as stall:
+                log_func(f"ERROR: [Pipeline] Export {label}: {stall.reason}.")
+                self._demote_click(self._last_click, log_func)
+                self._cancel_stalled_download(stall, self.download_folder, watcher.baseline, log_func)
+                self._record_chunk_cost(job['report_url'], job['region_index'], job['from_date'], job['to_date'], export_started)
+                self._page_state.clear()
+                self._log_download_result("", job['from_date'], job['to_date'], "Failed (Download Stalled)", stall.reason)
+                if not self._requeue_stalled_job(job, pending, log_func, "[Pipeline]"):
+                    fail_count += 1
+            except (DownloadFailedException, TimeoutException, NoSuchElementException, StaleElementReferenceException) as e:
+                fail_count += 1
+                self._page_state.clear()
+                log_func(f"ERROR: [Pipeline] Export {label} failed: {type(e).__name__} - {str(e)[:150]}")
+                self._log_download_result("", job['from_date'], job['to_date'], "Failed (Pipeline Export)", str(e)[:300])
+            finally:
+                watcher.close()
+                self._last_click = None # Judged by this start wait only
+            done, failed = self._poll_in_flight(in_flight, known, pending, log_func)
+            success_count += done
+            fail_count += failed
+
+        log_func(f"Pipelined exports finished. Success: {success_count}, Failed: {fail_count}.")
+        return success_count, fail_count
+
+    def _http_export_engine(self, engine_class, log_func):
+        """Builds an HTTP export engine from this browser, with the login broker's current session cookies when one is attached."""
+        engine = engine_class.from_driver(self.driver, self.download_folder, max_workers=self.http_export_workers, log_func=log_func)
+        if self.login_broker:
+            self.login_broker.apply_to(engine.session) # Session may have been renewed by another browser since this one synced
+        return engine
+
+    def _download_chunks_over_http(self, report_url, date_ranges, variant, log_func):
+        """
+        Downloads chunks by replaying the export postback over HTTP (see http_export.py).
+        Returns (success_count, date_ranges left for the browser path).
+        """
+        try:
+            from http_export import HttpExportEngine, HttpExportRejected, HttpSessionExpired
+        except ImportError as e:
+            log_func(f"HTTP export not available ({e}). Using the browser.")
+            return 0, date_ranges
+
+        engine = None
+        try:
+            engine = self._http_export_engine(HttpExportEngine, log_func)
+            try:
+                results = engine.export_chunks(report_url, date_ranges, variant)
+            except HttpSessionExpired as e:
+                log_func(f"HTTP export: session not accepted ({e}). Logging in again...")
+                engine.close()
+                engine = None
+                if not self._renew_session(log_func):
+                    raise
+                engine = self._http_export_engine(HttpExportEngine, log_func)
+                results = engine.export_chunks(report_url, date_ranges, variant)
+        except HttpExportRejected as e:
+            log_func(f"HTTP export rejected ({e}). Using the browser for all chunks.")
+            return 0, date_ranges
+        except Exception as e:
+            log_func(f"HTTP export failed ({type(e).__name__} - {e}). Using the browser for all chunks.")
+            traceback.print_exc()
+            return 0, date_ranges
+        finally:
+            if engine:
+                engine.close()
 
-        return date_ranges
+        success_count = 0
+        remaining = []
+        for (from_chunk, to_chunk), downloaded_name in zip(date_ranges, results):
+            if not downloaded_name:
+                remaining.append((from_chunk, to_chunk))
+                continue
+            log_file_name, renamed_ok = self._process_downloaded_file(downloaded_name, from_chunk, to_chunk, report_variants[variant]["suffix"], log_func, browser_download=False)
+            self._log_download_result(log_file_name, from_chunk, to_chunk, "Success (HTTP)" if renamed_ok else "Success (HTTP, Rename Failed)", "")
+            success_count += 1
+        if remaining:
+            log_func(f"HTTP export: {len(remaining)} chunk(s) rejected, retrying them in the browser.")
+        return success_count, remaining
+
+    def _run_concurrent_jobs(self, jobs, log_func):
+        """Runs jobs in tabs or pipelined mode if enabled. Returns (success, failed), or None to use the sequential loop."""
+        if self.tab_count <= 1 and not self.pipeline:
+            return None
+        runnable = [job for job in jobs if not self._skip_known_empty(job['report_url'], job['variant'], job['from_date'], job['to_date'], job['region_index'], log_func)]
+        if not runnable:
+            return len(jobs), 0
+        result = self._run_jobs_concurrently(runnable, log_func)
+        if result is None:
+            return None
+        return result[0] + len(jobs) - len(runnable), result[1]
+
+    def _run_jobs_concurrently(self, jobs, log_func):
+        """Tabs first, pipelined as fallback (or when tabs are off). Returns (success, failed) or None."""
+        if self.tab_count > 1:
+            log_func(f"Exporting {len(jobs)} chunk(s) across {self.tab_count} tabs...")
+            result = self.download_jobs_in_tabs(jobs, status_callback=log_func)
+            if result is not None:
+                return result
+        if self.pipeline:
+            log_func(f"Exporting {len(jobs)} chunk(s) in pipelined mode...")
+            return self.download_jobs_pipelined(jobs, status_callback=log_func)
+        return None
+
+    # --- Chunking Methods ---
+
+    # --- Adaptive Chunk Sizes ---
+    def _auto_chunk_days(self, report_url, region_index, log_func):
+        """Chunk size in days for chunk_size 'auto', from the chunk planner's learned export cost."""
+        planner = get_chunk_planner()
+        if not planner:
+            log_func("Warning: Chunk size 'auto' needs the chunk planner (CHUNK_PLANNER). Using 5 days.")
+            return 5
+        days = planner.chunk_days(report_url, region_index)
+        region = f", region {regions_data[region_index]['name']}" if region_index is not None else ""
+        log_func(f"Auto chunk size{region}: {days} day(s) ({planner.describe(report_url, region_index)}).")
+        return days
+
+    def _record_chunk_cost(self, report_url, region_index, from_date, to_date, started, file_name=None, download_folder=None):
+        """Feeds an export's duration (and file size) to the chunk planner; without file_name it timed out or stalled."""
+        planner = get_chunk_planner()
+        if not planner or not started:
+            return
+        seconds = time.time() - started
+        if not file_name:
+            planner.record_timeout(report_url, region_index, from_date, to_date, seconds)
+            return
+        try:
+            size_bytes = os.path.getsize(os.path.join(download_folder or self.download_folder, file_name))
+        except OSError:
+            size_bytes = None
+        planner.record(report_url, region_index, from_date, to_date, seconds, size_bytes)
+
+    def _should_split_chunk(self):
+        """True when the last download stalled or timed out, so the same range in smaller chunks may get through."""
+        return bool(self.last_stall or self.last_wait_timed_out)
+
+    def split_date_range(self, start_date_str, end_date_str, chunk_size):
+        """Splits a date range into smaller chunks."""
+        return split_date_range(start_date_str, end_date_str, chunk_size, log_func=self._log)
 
     def _download_chunks_base(self, download_method, report_url, start_date, end_date, chunk_size, status_callback=None, **kwargs):
         """Base function to handle downloading in chunks."""
         log_func = status_callback or self._log
+        auto_chunks = chunk_size == 'auto'
+        if auto_chunks:
+            chunk_size = self._auto_chunk_days(report_url, kwargs.get('region_index'), log_func)
         log_func(f"Splitting date range {start_date} to {end_date} with chunk size/mode: {chunk_size}.")
         date_ranges = self.split_date_range(start_date, end_date, chunk_size)
         total_chunks = len(date_ranges)
@@ -1365,12 +2830,43 @@ class WebAutomation:
 
         log_func(f"Total chunks to process: {total_chunks}")
 
+        variant = chunk_method_variants.get(getattr(download_method, '__name__', ''))
+        all_chunks = total_chunks
+        if variant and not kwargs:
+            date_ranges = [(from_chunk, to_chunk) for from_chunk, to_chunk in date_ranges
+                           if not self._skip_known_empty(report_url, variant, from_chunk, to_chunk, None, log_func)]
+            success_count = total_chunks - len(date_ranges)
+            total_chunks = len(date_ranges)
+            if not date_ranges:
+                log_func(f"Finished processing all {all_chunks} chunks. Success: {success_count}, Failed: {fail_count}.")
+                return
+        if self.http_export and variant and not kwargs:
+            http_ok, date_ranges = self._download_chunks_over_http(report_url, date_ranges, variant, log_func)
+            success_count += http_ok # Known-empty chunks skipped above count as well
+            if not date_ranges:
+                log_func(f"Finished processing all {all_chunks} chunks. Success: {success_count}, Failed: {fail_count}.")
+                return
+            total_chunks = len(date_ranges) # Only the chunks left for the browser below
+
+        if total_chunks > 1 and variant and not kwargs:
+            result = self._run_concurrent_jobs(self.build_export_jobs(report_url, date_ranges, variant=variant), log_func)
+            if result is not None:
+                success_count += result[0]
+                fail_count += result[1]
+                log_func(f"Finished processing all {all_chunks} chunks. Success: {success_count}, Failed: {fail_count}.")
+                return
+
+        replan = auto_chunks and total_chunks == all_chunks # Only a contiguous range (no chunks skipped above) can be re-split
         for i, (from_date_chunk, to_date_chunk) in enumerate(date_ranges):
             chunk_num = i + 1
             log_func(f"--- Starting Chunk {chunk_num}/{total_chunks}: {from_date_chunk} to {to_date_chunk} ---")
+            if self.deadlines.expired():
+                log_func(f"ERROR: Time budget exhausted ({self.deadlines.describe()}). Skipping the remaining {total_chunks - i} chunk(s).")
+                fail_count += (total_chunks - i)
+                break
 
-            # Introduce a flag to check if the browser session is still valid
-            if not self.is_session_valid():
+            # Cached session health (re-authenticates ahead of expiry when a monitor runs)
+            if not self._session_ready(log_func):
                 log_func("ERROR: WebDriver session is invalid before starting chunk. Stopping.")
                 fail_count += (total_chunks - i) # Mark remaining chunks as failed
                 break
@@ -1378,9 +2874,22 @@ class WebAutomation:
             try:
                 # Call the specific download method passed as argument
                 # Pass kwargs which might include region_index for region downloads
+                self.last_stall = None
+                self.last_wait_timed_out = False
                 if download_method(report_url=report_url, from_date=from_date_chunk, to_date=to_date_chunk, status_callback=log_func, **kwargs):
                      success_count += 1
                      log_func(f"--- Completed Chunk {chunk_num}/{total_chunks} Successfully ---")
+                     if replan and chunk_num < total_chunks:
+                         # Re-plan the rest of the range with what this export cost
+                         date_ranges[chunk_num:] = self.split_date_range(date_ranges[chunk_num][0], date_ranges[-1][1],
+                                                                         self._auto_chunk_days(report_url, kwargs.get('region_index'), log_func))
+                         all_chunks += len(date_ranges) - total_chunks
+                         total_chunks = len(date_ranges)
+                elif self._should_split_chunk() and self.stall_retries:
+                     retried_ok, retried_failed = self._retry_stalled_chunk(download_method, report_url, from_date_chunk, to_date_chunk, log_func, self.stall_retries, **kwargs)
+                     success_count += retried_ok
+                     fail_count += retried_failed
+                     log_func(f"--- Completed Chunk {chunk_num}/{total_chunks} after stall retry: {retried_ok} part(s) OK, {retried_failed} failed ---")
                 else:
                      # Method returned False, indicating failure was logged internally
                      fail_count += 1
@@ -1410,16 +2919,40 @@ class WebAutomation:
                 # Consider stopping if errors are critical
 
             finally:
-                # Pause between chunks
-                if chunk_num < total_chunks:
-                    log_func(f"Pausing {SHORT_WAIT * 2}s before next chunk...")
-                    time.sleep(SHORT_WAIT * 2)
+                # Let the page settle between chunks (no fixed pause)
+                if chunk_num < total_chunks and self._driver_alive:
+                    try:
+                        self.page_waits.page_idle(timeout=SHORT_WAIT * 2, label="between chunks")
+                    except WebDriverException:
+                        pass # The next chunk's session check deals with a broken browser
 
-        log_func(f"Finished processing all {total_chunks} chunks. Success: {success_count}, Failed: {fail_count}.")
+        log_func(f"Finished processing all {all_chunks} chunks. Success: {success_count}, Failed: {fail_count}.")
 
 
     # --- Public Chunking Wrappers (Called by app.py) ---
 
+    def _retry_stalled_chunk(self, download_method, report_url, from_date, to_date, log_func, retries_left, **kwargs):
+        """
+        Retries a chunk whose download stalled or timed out right away, split into two halves so
+        each export carries less data. A half that stalls or times out again is split again while
+        retries_left allows. Returns (parts succeeded, parts failed).
+        """
+        parts = halve_date_range(from_date, to_date)
+        log_func(f"Retrying stalled chunk {from_date} to {to_date} as {len(parts)} part(s): {parts}")
+        success_count, fail_count = 0, 0
+        for part_from, part_to in parts:
+            self.last_stall = None
+            self.last_wait_timed_out = False
+            if download_method(report_url=report_url, from_date=part_from, to_date=part_to, status_callback=log_func, **kwargs):
+                success_count += 1
+            elif self._should_split_chunk() and retries_left > 1:
+                retried_ok, retried_failed = self._retry_stalled_chunk(download_method, report_url, part_from, part_to, log_func, retries_left - 1, **kwargs)
+                success_count += retried_ok
+                fail_count += retried_failed
+            else:
+                fail_count += 1
+        return success_count, fail_count
+
     def download_reports_in_chunks(self, report_url, start_date, end_date, chunk_size, status_callback=None):
         """Downloads generic reports in chunks."""
         self._download_chunks_base(self.download_generic_report, report_url, start_date, end_date, chunk_size, status_callback)
@@ -1464,6 +2997,9 @@ class WebAutomation:
             return
 
         # Chunking happens *outside* the region loop. Each chunk iterates through regions.
+        if chunk_size == 'auto':
+            # One chunk size for every region: the smallest any of them needs
+            chunk_size = min(self._auto_chunk_days(report_url, idx, log_func) for idx in regions_to_process)
         log_func(f"Splitting date range {start_date} to {end_date} for region download.")
         date_ranges = self.split_date_range(start_date, end_date, chunk_size)
         total_chunks = len(date_ranges)
@@ -1476,15 +3012,24 @@ class WebAutomation:
 
         log_func(f"Total chunks: {total_chunks}, Regions per chunk: {len(regions_to_process)}")
 
+        if total_chunks * len(regions_to_process) > 1:
+            result = self._run_concurrent_jobs(self.build_export_jobs(report_url, date_ranges, region_indices=regions_to_process), log_func)
+            if result is not None:
+                log_func(f"Finished processing all chunks for selected regions. Success: {result[0]}, Failed: {result[1]}.")
+                return
+
         for i, (from_date_chunk, to_date_chunk) in enumerate(date_ranges):
             chunk_num = i + 1
             log_func(f"--- Starting Region Chunk {chunk_num}/{total_chunks}: {from_date_chunk} to {to_date_chunk} ---")
+            if self.deadlines.expired():
+                log_func(f"ERROR: Time budget exhausted ({self.deadlines.describe()}). Skipping the remaining {total_chunks - i} chunk(s).")
+                break
 
             chunk_success_count = 0
             chunk_fail_count = 0
 
             # Check session validity before starting the region loop for this chunk
-            if not self.is_session_valid():
+            if not self._session_ready(log_func):
                 log_func(f"ERROR: WebDriver session invalid before starting regions for chunk {chunk_num}. Stopping.")
                 # Mark all regions in this chunk and subsequent chunks as failed?
                 # This might be complex to log accurately per region. Log overall failure.
@@ -1497,8 +3042,15 @@ class WebAutomation:
                  # Call the single region download method (which includes retries)
                  try:
                      # Pass the single index, not the list
+                     self.last_stall = None
+                     self.last_wait_timed_out = False
                      if self.download_report_for_region(report_url, from_date_chunk, to_date_chunk, region_idx, status_callback=log_func):
                           chunk_success_count += 1
+                     elif self._should_split_chunk() and self.stall_retries:
+                          retried_ok, retried_failed = self._retry_stalled_chunk(self.download_report_for_region, report_url, from_date_chunk, to_date_chunk,
+                                                                                 log_func, self.stall_retries, region_index=region_idx)
+                          chunk_success_count += retried_ok
+                          chunk_fail_count += retried_failed
                      else:
                           chunk_fail_count += 1
                           # Failure logged by download_report_for_region
@@ -1526,10 +3078,12 @@ class WebAutomation:
                  finally:
                       # Pause briefly between regions within a chunk if needed
                       if len(regions_to_process) > 1:
-                           log_func(f"Pausing {SHORT_WAIT}s before next region...")
-                           time.sleep(SHORT_WAIT)
+                           try:
+                               self.page_waits.page_idle(timeout=SHORT_WAIT, label="between regions")
+                           except WebDriverException:
+                               pass # Checked just below
                            # Check session validity between regions too?
-                           if not self.is_session_valid():
+                           if not self._session_ready(log_func):
                                log_func(f"ERROR: WebDriver session invalid after processing region {region_name}. Stopping chunk.")
                                break # Stop processing regions for this chunk
 
@@ -1538,6 +3092,87 @@ class WebAutomation:
         log_func("Finished processing all chunks for selected regions.")
 
 
+    # --- Browser Recycling ---
+    def browser_rss_mb(self):
+        """Resident memory (MB) of ChromeDriver and every Chrome process under it, or None without psutil."""
+        if psutil is None or not getattr(self, 'service', None) or not self.service.process:
+            return None
+        try:
+            root = psutil.Process(self.service.process.pid)
+            processes = [root] + root.children(recursive=True)
+        except psutil.Error:
+            return None
+        total = 0
+        for process in processes:
+            try:
+                total += process.memory_info().rss
+            except psutil.Error:
+                pass # Renderer exited meanwhile
+        return total / (1024 * 1024)
+
+    def _recycle_reason(self):
+        if self._watchdog_reason:
+            return f"watchdog: {self._watchdog_reason}"
+        if self.recycle_after_downloads and self.downloads_since_launch >= self.recycle_after_downloads:
+            return f"{self.downloads_since_launch} downloads since launch"
+        if self.recycle_rss_mb:
+            rss_mb = self.browser_rss_mb()
+            if rss_mb is not None and rss_mb >= self.recycle_rss_mb:
+                return f"browser memory {rss_mb:.0f} MB >= {self.recycle_rss_mb} MB"
+        return None
+
+    def recycle_if_needed(self, log_func):
+        """Recycles the browser if a threshold is crossed. Call only between chunks. Returns False if the browser is lost."""
+        if not self.driver or not (self.recycle_after_downloads or self.recycle_rss_mb or self._watchdog_reason):
+            return bool(self.driver)
+        reason = self._recycle_reason()
+        if not reason:
+            return True
+        try:
+            return self.recycle_browser(reason, log_func)
+        except (WebDriverException, FileNotFoundError, RuntimeError) as e:
+            log_func(f"ERROR: Browser restart failed: {type(e).__name__} - {str(e)[:150]}")
+            return False
+
+    def recycle_browser(self, reason, log_func):
+        """
+        Restarts Chrome (same options, profile slot and download folder) and restores the
+        logged-in session from its cookies/storage, logging in again if they are refused.
+        Returns True if the new browser is logged in.
+        """
+        rss_before = self.browser_rss_mb()
+        log_func(f"Recycling browser ({reason})...")
+        state = None
+        try:
+            state = self.export_session()
+        except WebDriverException as e:
+            log_func(f"Warning: Could not capture session before restart: {str(e)[:150]}")
+        try:
+            self.driver.quit()
+        except WebDriverException as e:
+            log_func(f"Warning: Error closing old browser: {str(e)[:150]}")
+        get_registry().unregister(self)
+        self.driver = None
+        self.download_tracker = None
+        self._page_state.clear()
+        self._driver_alive = True
+        self._watchdog_reason = None
+        self._start_driver()
+        self.downloads_since_launch = 0
+
+        restored = False
+        if state and self.login_url:
+            restored = self.restore_session(state, self.login_url, status_callback=log_func)
+        if not restored and self.login_url:
+            log_func("Session not accepted by the restarted browser. Logging in again...")
+            restored = self._renew_session(log_func)
+        rss_after = self.browser_rss_mb()
+        if rss_before is not None and rss_after is not None:
+            log_func(f"Browser recycled: {rss_before:.0f} MB -> {rss_after:.0f} MB ({rss_before - rss_after:.0f} MB recovered).")
+        else:
+            log_func("Browser recycled.")
+        return restored
+
     # --- Session Check & Cleanup ---
     def is_session_valid(self):
         """Checks if the WebDriver session is still active."""
@@ -1565,6 +3200,13 @@ class WebAutomation:
 
     def close(self):
         """Quits the WebDriver session gracefully."""
+        if self._download_watcher:
+            self._download_watcher.close()
+            self._download_watcher = None
+        if self.session_monitor:
+            self._log(f"Session keepalive stopped ({self.session_monitor.describe()}).")
+            self.session_monitor.stop()
+            self.session_monitor = None
         if self.driver:
             try:
                 self._log("Closing WebDriver session...")
@@ -1576,9 +3218,16 @@ class WebAutomation:
                  self._log(f"Unexpected error closing WebDriver session: {e}")
             finally:
                 self.driver = None
-                self.wait = None
+                get_registry().unregister(self)
         else:
              self._log("WebDriver session already closed or not initialized.")
+        self._release_profile_slot()
+
+    def _release_profile_slot(self):
+        """Frees the persistent profile slot (after Chrome has quit), trimming its cache if over the cap."""
+        if self.profile_slot:
+            self.profile_slot.release(self.profile_size_cap_mb, log_func=self._log)
+            self.profile_slot = None
 
 
 # --- Standalone Functionality (Removed or Commented Out if Not Used) ---
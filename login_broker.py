@@ -0,0 +1,145 @@
+# filename: login_broker.py
+import threading
+
+
+class LoginBroker:
+    """
+    Logs in once per account and hands the authenticated session to every browser
+    (WebAutomation) and HTTP session of a run, so parallel workers do not each do an
+    OTP login (the TOTP code is the same for everyone within 30 s and the portal may
+    refuse it twice).
+
+    The session is the state returned by WebAutomation.export_session(). Each publish
+    bumps `version`; a browser remembers the version it was given in `session_version`.
+    When a browser lands on the login page (or the HTTP export gets a 401) it calls
+    reauthenticate(): the first caller for a version logs in again, later callers for
+    the same version just take the new session. sync() copies a newer session into a
+    browser before its next chunk.
+    """
+
+    def __init__(self, login_url, email, password, otp_secret, session_store=None, log_func=print):
+        """
+        Args:
+            login_url (str): Report URL used to log in; also the validity probe page for cloned sessions.
+            email, password, otp_secret (str): Account credentials.
+            session_store (SessionStore, optional): Saved sessions to start from, updated on every publish.
+            log_func (function, optional): Status callback.
+        """
+        self.login_url = login_url
+        self.email = email
+        self.password = password
+        self.otp_secret = otp_secret
+        self.session_store = session_store
+        self._log = log_func
+        self._lock = threading.Lock()
+        self.state = None
+        self.version = 0
+        self._failed_version = None # Version whose re-login already failed (no second attempt)
+
+    # --- Publishing ---
+    def _publish(self, automation, log_func):
+        """Takes the session from a freshly logged-in browser and makes it the current one."""
+        self.state = automation.export_session()
+        self.version += 1
+        automation.login_broker = self
+        automation.session_version = self.version
+        log_func(f"Login broker: session v{self.version} published for {self.email}.")
+        if self.session_store:
+            try:
+                self.session_store.save(self.email, self.state)
+            except OSError as e:
+                log_func(f"Warning: Could not save session: {e}")
+
+    def _clone_into(self, automation, state, version, log_func):
+        """Loads a published session into a browser and checks it on the report page."""
+        if not automation.restore_session(state, self.login_url, status_callback=log_func):
+            return False
+        automation.login_broker = self
+        automation.session_version = version
+        automation.login_url, automation.email, automation.password, automation.otp_secret = (
+            self.login_url, self.email, self.password, self.otp_secret)
+        log_func(f"Login broker: using shared session v{version}.")
+        return True
+
+    def attach(self, automation, log_func=None):
+        """
+        Gives a browser a logged-in session. The first browser logs in (reusing a saved
+        session when possible, or its own login if it was pre-authenticated for this account);
+        the others get a copy of its cookies. Returns True on success.
+        """
+        log_func = log_func or self._log
+        with self._lock:
+            if self.state is None and automation.email == self.email and self._still_logged_in(automation, log_func):
+                log_func("Login broker: browser is already logged in (pre-authenticated). Reusing its session.")
+                self._publish(automation, log_func)
+                return True
+            if self.state is None:
+                if not automation.login_with_session(self.login_url, self.email, self.password, self.otp_secret,
+                                                     session_store=self.session_store, status_callback=log_func):
+                    return False
+                self._publish(automation, log_func)
+                return True
+            state, version = self.state, self.version
+        if self._clone_into(automation, state, version, log_func):
+            return True
+        log_func("Login broker: shared session was not accepted. Re-authenticating...")
+        return self.reauthenticate(automation, version, log_func)
+
+    def _still_logged_in(self, automation, log_func):
+        try:
+            return automation.probe_session(self.login_url, log_func)
+        except Exception as e:
+            log_func(f"Login broker: pre-authenticated browser check failed ({type(e).__name__}). Logging in.")
+            return False
+
+    def reauthenticate(self, automation, seen_version, log_func=None):
+        """
+        Called when a browser holding session seen_version was sent to the login page.
+        Logs in again once per version (in this browser) and republishes; a browser that
+        reports an already replaced version just takes the newer session.
+        """
+        log_func = log_func or self._log
+        with self._lock:
+            if self.version == seen_version:
+                if self._failed_version == seen_version:
+                    log_func("Login broker: re-login for this session already failed. Not retrying.")
+                    return False
+                log_func(f"Login broker: session v{seen_version} expired. Logging in again...")
+                if self.session_store:
+                    self.session_store.discard(self.email)
+                try:
+                    ok = automation.login(self.login_url, self.email, self.password, self.otp_secret, status_callback=log_func)
+                except Exception as e:
+                    log_func(f"ERROR: Login broker re-login raised {type(e).__name__} - {e}")
+                    ok = False
+                if not ok:
+                    self._failed_version = seen_version
+                    return False
+                self._publish(automation, log_func)
+                return True
+            state, version = self.state, self.version
+        log_func(f"Login broker: session already renewed (v{version}).")
+        return self._clone_into(automation, state, version, log_func)
+
+    def sync(self, automation, log_func=None):
+        """Copies a newer published session into the browser (cookies only, no navigation). Returns True if it changed."""
+        log_func = log_func or self._log
+        with self._lock:
+            state, version = self.state, self.version
+        if state is None or getattr(automation, 'session_version', None) == version:
+            return False
+        automation.import_session(state)
+        automation.session_version = version
+        log_func(f"Login broker: picked up renewed session v{version}.")
+        return True
+
+    # --- HTTP Sessions ---
+    def cookies(self):
+        """Cookie dicts of the current session (same shape as driver.get_cookies())."""
+        with self._lock:
+            return list(self.state['cookies']) if self.state else []
+
+    def apply_to(self, http_session):
+        """Copies the current session cookies into a requests.Session."""
+        for cookie in self.cookies():
+            http_session.cookies.set(cookie['name'], cookie['value'], domain=cookie.get('domain'), path=cookie.get('path', '/'))
@@ -0,0 +1,96 @@
+# filename: page_health.py
+from selenium.common.exceptions import WebDriverException
+
+# --- Page Classes ---
+PAGE_OK = 'ok'                       # Portal page (report form or login form expected by the caller)
+PAGE_LOGIN = 'login'                 # Sent to the login page (session expired)
+PAGE_BAD_GATEWAY = 'bad_gateway'     # 502 from the reverse proxy
+PAGE_UNAVAILABLE = 'unavailable'     # 503 / 504: server overloaded or restarting
+PAGE_SERVER_ERROR = 'server_error'   # ASP.NET error page ("Server Error in '/' Application", 500)
+PAGE_UNKNOWN = 'unknown'             # Probe could not run (browser busy, script error)
+
+# Worth a refresh after a short backoff; the other failures need a re-login or a new attempt later
+TRANSIENT_PAGES = (PAGE_BAD_GATEWAY, PAGE_UNAVAILABLE)
+
+# One small script instead of driver.page_source: returns the main document's HTTP status
+# (Navigation Timing responseStatus, Chrome 109+; 0 when not exposed), the title, the first
+# <h1> and whether the login button / report form are present.
+HEALTH_PROBE_SCRIPT = """
+var nav = (performance.getEntriesByType && performance.getEntriesByType('navigation')[0]) || null;
+var h1 = document.querySelector('h1');
+return {
+    status: (nav && nav.responseStatus) || 0,
+    title: (document.title || '').slice(0, 200),
+    heading: h1 ? (h1.textContent || '').trim().slice(0, 200) : '',
+    url: window.location.href,
+    login: !!document.getElementById(arguments[0]),
+    form: !!document.getElementById(arguments[1])
+};
+"""
+ASPNET_ERROR_MARKERS = ('server error in', 'runtime error', 'application error')
+
+
+class PageHealth:
+    """Result of one probe: the page class plus what it was based on."""
+
+    def __init__(self, kind, status=0, title='', url='', detail=''):
+        self.kind = kind
+        self.status = status
+        self.title = title
+        self.url = url
+        self.detail = detail
+
+    @property
+    def transient(self):
+        return self.kind in TRANSIENT_PAGES
+
+    def describe(self):
+        status = f"HTTP {self.status}" if self.status else "HTTP status unknown"
+        return f"{self.kind} ({status}{', ' + repr(self.title) if self.title else ''}{', ' + self.detail if self.detail else ''})"
+
+
+def classify(snapshot):
+    """Turns the probe script's result into a PageHealth."""
+    status = int(snapshot.get('status') or 0)
+    title = snapshot.get('title') or ''
+    text = f"{title} {snapshot.get('heading') or ''}".lower()
+    url = snapshot.get('url') or ''
+    if status == 502 or '502 bad gateway' in text:
+        return PageHealth(PAGE_BAD_GATEWAY, status, title, url)
+    if status in (503, 504) or '503 service' in text or '504 gateway' in text:
+        return PageHealth(PAGE_UNAVAILABLE, status, title, url)
+    if snapshot.get('login') and not snapshot.get('form'):
+        return PageHealth(PAGE_LOGIN, status, title, url)
+    if status >= 500 or any(marker in text for marker in ASPNET_ERROR_MARKERS):
+        return PageHealth(PAGE_SERVER_ERROR, status, title, url)
+    return PageHealth(PAGE_OK, status, title, url)
+
+
+class PageHealthProbe:
+    """
+    Cheap health check of the page in the current tab, used after every navigation.
+    Reads a few fields with one execute_script instead of copying the whole DOM over the
+    WebDriver wire (driver.page_source), and classifies the page so callers can refresh
+    (502/503), log in again (login page) or give up (ASP.NET error page).
+    """
+
+    def __init__(self, driver, login_marker_id, form_marker_id):
+        """
+        Args:
+            driver (WebDriver): Browser to probe.
+            login_marker_id (str): Element id only present on the login page.
+            form_marker_id (str): Element id only present on the report form.
+        """
+        self.driver = driver
+        self.login_marker_id = login_marker_id
+        self.form_marker_id = form_marker_id
+
+    def check(self):
+        """Classifies the current page. WebDriver errors other than a dead session give PAGE_UNKNOWN."""
+        try:
+            snapshot = self.driver.execute_script(HEALTH_PROBE_SCRIPT, self.login_marker_id, self.form_marker_id)
+        except WebDriverException as e:
+            if "invalid session id" in str(e).lower():
+                raise
+            return PageHealth(PAGE_UNKNOWN, detail=f"{type(e).__name__}: {str(e)[:100]}")
+        return classify(snapshot or {})
@@ -0,0 +1,179 @@
+# filename: page_waits.py
+import time
+import threading
+
+from selenium.webdriver.support.ui import WebDriverWait
+from selenium.webdriver.support import expected_conditions as EC
+from selenium.common.exceptions import TimeoutException, StaleElementReferenceException, UnexpectedAlertPresentException
+
+CONDITION_POLL_INTERVAL = 0.1 # Seconds between condition checks
+PAGE_IDLE_TIMEOUT = 30        # Default max wait for the page to settle after a click/postback
+STABLE_TIMEOUT = 5            # Default max wait for an element to stop moving (scroll, animation)
+ALERT_IDLE_GRACE = 0.5        # An idle page must stay idle this long before "no alert" is assumed
+
+# Returns 'idle' when the report page has nothing in flight, otherwise what is still busy:
+# the document itself, an ASP.NET (UpdatePanel) async postback, a Telerik/jQuery AJAX
+# request or a visible Telerik loading panel.
+PAGE_IDLE_SCRIPT = """
+if (document.readyState !== 'complete') { return 'document loading'; }
+try {
+    if (window.Sys && Sys.WebForms && Sys.WebForms.PageRequestManager &&
+        Sys.WebForms.PageRequestManager.getInstance().get_isInAsyncPostBack()) { return 'ASP.NET postback'; }
+} catch (e) {}
+try {
+    var jq = (window.$telerik && $telerik.$) || window.jQuery;
+    if (jq && jq.active > 0) { return 'AJAX request'; }
+} catch (e) {}
+var panels = document.querySelectorAll('.RadAjax, .raDiv, .rcbLoading');
+for (var i = 0; i < panels.length; i++) {
+    if (panels[i].offsetParent !== null) { return 'Telerik loading panel'; }
+}
+return 'idle';
+"""
+
+ELEMENT_RECT_SCRIPT = """
+var r = arguments[0].getBoundingClientRect();
+return [Math.round(r.left), Math.round(r.top), Math.round(r.width), Math.round(r.height)];
+"""
+
+
+class WaitStats:
+    """
+    Time one browser spent in fixed sleeps versus waiting on real page conditions.
+    Sleeps are pauses with no condition behind them (retry backoff, poll intervals);
+    condition waits end as soon as the page is ready. Totals are kept per label so the
+    run summary shows where the time went.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.sleep_seconds = 0.0
+            self.condition_seconds = 0.0
+            self.by_label = {} # label -> [kind, count, seconds]
+
+    def _add(self, kind, label, seconds, count=1):
+        with self._lock:
+            if kind == 'sleep':
+                self.sleep_seconds += seconds
+            else:
+                self.condition_seconds += seconds
+            entry = self.by_label.setdefault(label, [kind, 0, 0.0])
+            entry[1] += count
+            entry[2] += seconds
+
+    def sleep(self, seconds, label):
+        """time.sleep that is counted as sleep time under label."""
+        if seconds <= 0:
+            return
+        time.sleep(seconds)
+        self._add('sleep', label, seconds)
+
+    def record_condition(self, label, seconds):
+        self._add('condition', label, seconds)
+
+    def merge(self, other):
+        """Adds another browser's totals (worker pool summary)."""
+        with other._lock:
+            items = [(label, list(entry)) for label, entry in other.by_label.items()]
+        for label, (kind, count, seconds) in items:
+            self._add(kind, label, seconds, count)
+
+    def describe(self, top=3):
+        with self._lock:
+            biggest = sorted(self.by_label.items(), key=lambda item: item[1][2], reverse=True)[:top]
+            sleep_seconds, condition_seconds = self.sleep_seconds, self.condition_seconds
+        details = ", ".join(f"{label} {seconds:.1f}s/{count}x" for label, (_, count, seconds) in biggest)
+        return (f"{sleep_seconds:.1f}s in fixed sleeps, {condition_seconds:.1f}s waiting on page conditions"
+                + (f" (largest: {details})" if details else ""))
+
+
+class PageWaits:
+    """Explicit waits on the Telerik/ASP.NET report pages, timed into a WaitStats."""
+
+    def __init__(self, driver, stats):
+        self.driver = driver
+        self.stats = stats
+        self.last_busy_reason = '' # What page_idle() last saw still running
+
+    def _until(self, condition, timeout, label):
+        started = time.time()
+        try:
+            return WebDriverWait(self.driver, timeout, poll_frequency=CONDITION_POLL_INTERVAL,
+                                 ignored_exceptions=(StaleElementReferenceException,)).until(condition)
+        finally:
+            self.stats.record_condition(label, time.time() - started)
+
+    def page_idle(self, timeout=PAGE_IDLE_TIMEOUT, label="page idle", settle=0):
+        """
+        Waits until the document is loaded and no postback/AJAX request is running.
+        settle: seconds the page must stay idle, for clicks whose postback may not have started yet.
+        Returns True when idle, False on timeout (the caller carries on, as after the old fixed pause).
+        """
+        busy = ['']
+        idle_since = [None]
+        def is_idle(driver):
+            busy[0] = driver.execute_script(PAGE_IDLE_SCRIPT)
+            if busy[0] != 'idle':
+                idle_since[0] = None
+                return False
+            idle_since[0] = idle_since[0] or time.time()
+            return time.time() - idle_since[0] >= settle
+        try:
+            self._until(is_idle, timeout, label)
+            return True
+        except TimeoutException:
+            return False
+        finally:
+            self.last_busy_reason = busy[0]
+
+    def element_stable(self, element, timeout=STABLE_TIMEOUT, label="element stable"):
+        """Waits until element keeps the same position and size over two checks (e.g. after scrollIntoView). Returns True if it settled."""
+        last_rect = [None]
+        def is_stable(driver):
+            rect = driver.execute_script(ELEMENT_RECT_SCRIPT, element)
+            stable = rect == last_rect[0]
+            last_rect[0] = rect
+            return stable
+        try:
+            self._until(is_stable, timeout, label)
+            return True
+        except TimeoutException:
+            return False
+
+    def alert_or_idle(self, timeout, label="alert check"):
+        """
+        Returns the alert if one opens within timeout, or None as soon as the page has been idle
+        for ALERT_IDLE_GRACE seconds without one (instead of always waiting the full timeout).
+        """
+        idle_since = [None]
+        def alert_or_settled(driver):
+            alert = EC.alert_is_present()(driver)
+            if alert:
+                return alert
+            if driver.execute_script(PAGE_IDLE_SCRIPT) != 'idle':
+                idle_since[0] = None
+                return False
+            idle_since[0] = idle_since[0] or time.time()
+            return 'idle' if time.time() - idle_since[0] >= ALERT_IDLE_GRACE else False
+        started = time.time()
+        try:
+            result = WebDriverWait(self.driver, timeout, poll_frequency=CONDITION_POLL_INTERVAL,
+                                   ignored_exceptions=(UnexpectedAlertPresentException,)).until(alert_or_settled)
+        except TimeoutException:
+            result = None
+        finally:
+            self.stats.record_condition(label, time.time() - started)
+        return None if result == 'idle' else result
+
+    def until(self, condition, timeout, label):
+        """WebDriverWait(...).until(condition) counted as condition wait time under label. Raises TimeoutException."""
+        return self._until(condition, timeout, label)
+
+    def scroll_into_view(self, element):
+        """Scrolls element to the middle of the viewport and waits for it to stop moving."""
+        self.driver.execute_script("arguments[0].scrollIntoView({block: 'center', inline: 'nearest'});", element)
+        return self.element_stable(element, label="scroll settle")
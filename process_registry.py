@@ -0,0 +1,246 @@
+# filename: process_registry.py
+import os
+import time
+import threading
+import weakref
+
+try:
+    import psutil # type: ignore
+except ImportError: # Without psutil orphans are not reaped and no run metrics are collected
+    psutil = None
+
+from utils import load_json_file, save_json_file
+
+DEFAULT_REGISTRY_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'browser_processes.json')
+METRICS_SAMPLE_INTERVAL = 5 # Seconds between CPU/memory samples during a run
+
+
+def _same_process(pid, create_time):
+    """The process with pid is still the one that was registered (not a reused pid)."""
+    try:
+        return abs(psutil.Process(pid).create_time() - create_time) < 1
+    except psutil.Error:
+        return False
+
+
+def _kill_tree(roots):
+    """Kills registered root processes (pid, create_time) and all their descendants. Returns (killed, rss_mb)."""
+    processes = []
+    for pid, create_time in roots:
+        if not _same_process(pid, create_time):
+            continue
+        try:
+            root = psutil.Process(pid)
+            processes.extend([root] + root.children(recursive=True))
+        except psutil.Error:
+            continue
+    unique = {process.pid: process for process in processes}.values()
+    rss = 0
+    for process in unique:
+        try:
+            rss += process.memory_info().rss
+            process.kill()
+        except psutil.Error:
+            pass
+    _, alive = psutil.wait_procs(list(unique), timeout=5)
+    return len(unique) - len(alive), rss / (1024 * 1024)
+
+
+class ProcessRegistry:
+    """
+    Records the chromedriver/chrome processes owned by every WebAutomation of this app in a
+    JSON file, so they can be killed when their owner is gone:
+    - at start-up, for entries of a previous app process (crash, Waitress restart);
+    - periodically, for browsers whose WebAutomation was dropped without close()
+      (e.g. a run thread that died).
+    It also samples CPU time and memory of the browsers of the current run (run-level metrics).
+    """
+
+    def __init__(self, path=DEFAULT_REGISTRY_PATH, log_func=print):
+        self.path = path
+        self._log = log_func
+        self._lock = threading.RLock()
+        self._owners = {} # driver pid -> weakref to the WebAutomation (this process only)
+        self._reaper = None
+        self._run = None
+        self.last_run_metrics = None
+
+    # --- Registry File ---
+    def _load(self):
+        return load_json_file(self.path)
+
+    def _save(self, entries):
+        save_json_file(self.path, entries, self._log, "process registry")
+
+    # --- Registration ---
+    def register(self, automation):
+        """Records the ChromeDriver process of automation and the Chrome processes it started."""
+        if psutil is None or not getattr(automation, 'service', None) or not automation.service.process:
+            return
+        driver_pid = automation.service.process.pid
+        try:
+            driver = psutil.Process(driver_pid)
+            roots = [[driver_pid, driver.create_time()]]
+            roots += [[child.pid, child.create_time()] for child in driver.children()]
+        except psutil.Error:
+            return
+        with self._lock:
+            entries = self._load()
+            entries[str(driver_pid)] = {
+                'owner_pid': os.getpid(),
+                'session_id': automation.session_id,
+                'started_at': time.strftime('%Y-%m-%d %H:%M:%S'),
+                'roots': roots, # Chrome survives its driver; its own pid lets it be found afterwards
+            }
+            self._save(entries)
+            self._owners[str(driver_pid)] = weakref.ref(automation)
+
+    def unregister(self, automation):
+        """Forgets automation's processes after it quit, killing any that are still running."""
+        service_process = getattr(getattr(automation, 'service', None), 'process', None)
+        if psutil is None or not service_process:
+            return
+        key = str(service_process.pid)
+        with self._lock:
+            entries = self._load()
+            entry = entries.pop(key, None)
+            self._owners.pop(key, None)
+            self._save(entries)
+        if entry:
+            killed, _ = _kill_tree(entry['roots'])
+            if killed:
+                self._log(f"Killed {killed} leftover browser process(es) of session {entry['session_id']}.")
+
+    # --- Reaping ---
+    def reap_orphans(self):
+        """Kills processes of dead app processes and of WebAutomation objects that were never closed. Returns processes killed."""
+        if psutil is None:
+            return 0
+        with self._lock:
+            entries = self._load()
+            orphans = {}
+            for key, entry in list(entries.items()):
+                if entry['owner_pid'] == os.getpid():
+                    owner = self._owners.get(key)
+                    automation = owner() if owner else None
+                    if automation is not None and automation.driver is not None:
+                        continue # Still in use
+                elif psutil.pid_exists(entry['owner_pid']):
+                    continue # Belongs to another live app process
+                orphans[key] = entries.pop(key)
+                self._owners.pop(key, None)
+            if orphans:
+                self._save(entries)
+        total_killed, total_mb = 0, 0.0
+        for entry in orphans.values():
+            killed, rss_mb = _kill_tree(entry['roots'])
+            total_killed += killed
+            total_mb += rss_mb
+        if total_killed:
+            self._log(f"Reaped {total_killed} orphaned chrome/chromedriver process(es) from {len(orphans)} browser(s), {total_mb:.0f} MB freed.")
+        return total_killed
+
+    def start_reaper(self, interval):
+        """Reaps orphans now and then every interval seconds in a daemon thread."""
+        if psutil is None:
+            self._log("Warning: psutil is not installed. Orphaned browser processes will not be reaped.")
+            return
+        self.reap_orphans()
+        if self._reaper or interval <= 0:
+            return
+        def reap_loop():
+            while True:
+                time.sleep(interval)
+                try:
+                    self.reap_orphans()
+                except Exception as e:
+                    self._log(f"Warning: Orphan reaper failed: {type(e).__name__} - {e}")
+        self._reaper = threading.Thread(target=reap_loop, name="browser-reaper", daemon=True)
+        self._reaper.start()
+
+    # --- Run Metrics ---
+    def _run_processes(self, run_folder):
+        """Live processes of the browsers whose download folder is inside run_folder."""
+        processes = []
+        with self._lock:
+            owners = list(self._owners.values())
+        for owner in owners:
+            automation = owner()
+            service_process = getattr(getattr(automation, 'service', None), 'process', None)
+            if not automation or not service_process or not os.path.abspath(automation.download_folder).startswith(run_folder):
+                continue
+            try:
+                driver = psutil.Process(service_process.pid)
+                processes.extend([driver] + driver.children(recursive=True))
+            except psutil.Error:
+                continue
+        return processes
+
+    def start_run(self, run_id, run_folder):
+        """Starts sampling CPU/memory of the run's browsers (browsers whose download folder is in run_folder)."""
+        if psutil is None:
+            return
+        run = {
+            'run_id': run_id, 'run_folder': os.path.abspath(run_folder), 'started_at': time.time(),
+            'cpu_by_pid': {}, 'peak_rss_mb': 0.0, 'peak_processes': 0, 'browsers': set(), 'stop': threading.Event(),
+        }
+        self._run = run
+        def sample_loop():
+            while not run['stop'].wait(METRICS_SAMPLE_INTERVAL):
+                self._sample(run)
+        threading.Thread(target=sample_loop, name="run-metrics", daemon=True).start()
+
+    def _sample(self, run):
+        rss = 0
+        processes = self._run_processes(run['run_folder'])
+        for process in processes:
+            try:
+                with process.oneshot():
+                    cpu = process.cpu_times()
+                    rss += process.memory_info().rss
+                    key = f"{process.pid}:{process.create_time()}" # Survives pid reuse
+                    if process.name().lower().startswith('chromedriver'):
+                        run['browsers'].add(key)
+            except psutil.Error:
+                continue
+            run['cpu_by_pid'][key] = max(run['cpu_by_pid'].get(key, 0.0), cpu.user + cpu.system)
+        run['peak_rss_mb'] = max(run['peak_rss_mb'], rss / (1024 * 1024))
+        run['peak_processes'] = max(run['peak_processes'], len(processes))
+
+    def run_metrics(self, run=None):
+        """Metrics of the current run (or the given one) as a JSON-friendly dict, or None."""
+        run = run or self._run
+        if not run:
+            return None
+        return {
+            'run_id': run['run_id'],
+            'duration_s': round(time.time() - run['started_at'], 1),
+            'cpu_seconds': round(sum(run['cpu_by_pid'].values()), 1),
+            'peak_rss_mb': round(run['peak_rss_mb'], 1),
+            'peak_processes': run['peak_processes'],
+            'browsers': len(run['browsers']),
+        }
+
+    def finish_run(self):
+        """Stops sampling (after a last sample) and returns the run's metrics."""
+        run, self._run = self._run, None
+        if not run:
+            return None
+        run['stop'].set()
+        self._sample(run)
+        self.last_run_metrics = self.run_metrics(run)
+        return self.last_run_metrics
+
+
+_registry = ProcessRegistry()
+
+
+def get_registry():
+    return _registry
+
+
+def init_registry(path, log_func=print):
+    """Points the shared registry at path (call once at app start, before any browser starts)."""
+    global _registry
+    _registry = ProcessRegistry(path, log_func=log_func)
+    return _registry
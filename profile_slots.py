@@ -0,0 +1,136 @@
+# filename: profile_slots.py
+import os
+import sys
+import time
+import shutil
+import threading
+
+MAX_PROFILE_SLOTS = 16          # slot_1 .. slot_16 under the profile base folder
+DEFAULT_SIZE_CAP_MB = 512       # Cache folders are trimmed when a slot grows past this
+LOCK_FILE_NAME = 'slot.lock'
+# Cache folders that are safe to delete between runs (relative to the user-data-dir)
+CACHE_SUBFOLDERS = [
+    os.path.join('Default', 'Cache'),
+    os.path.join('Default', 'Code Cache'),
+    os.path.join('Default', 'GPUCache'),
+    os.path.join('Default', 'Service Worker', 'CacheStorage'),
+    os.path.join('Default', 'Service Worker', 'ScriptCache'),
+    'GrShaderCache',
+    'ShaderCache',
+    'GraphiteDawnCache',
+]
+# Left behind by a Chrome that did not exit cleanly; a new Chrome refuses the profile while they exist
+CHROME_SINGLETON_FILES = ['SingletonLock', 'SingletonSocket', 'SingletonCookie']
+
+_acquire_lock = threading.Lock() # Threads of one process pick slots one at a time
+
+
+def _pid_alive(pid):
+    """True if a process with this pid is running (no signal is sent)."""
+    if pid <= 0:
+        return False
+    if sys.platform == 'win32':
+        import ctypes
+        PROCESS_QUERY_LIMITED_INFORMATION = 0x1000
+        STILL_ACTIVE = 259
+        handle = ctypes.windll.kernel32.OpenProcess(PROCESS_QUERY_LIMITED_INFORMATION, False, pid)
+        if not handle:
+            return False
+        try:
+            exit_code = ctypes.c_ulong()
+            ctypes.windll.kernel32.GetExitCodeProcess(handle, ctypes.byref(exit_code))
+            return exit_code.value == STILL_ACTIVE
+        finally:
+            ctypes.windll.kernel32.CloseHandle(handle)
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True # Exists, owned by someone else
+    return True
+
+
+def folder_size(path):
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+
+class ProfileSlot:
+    """One reusable Chrome user-data-dir, held through a lock file until release()."""
+
+    def __init__(self, path, lock_path):
+        self.path = path
+        self.lock_path = lock_path
+        self.name = os.path.basename(path)
+
+    def release(self, size_cap_mb=DEFAULT_SIZE_CAP_MB, log_func=print):
+        """Trims the cache if the slot is over its size cap, then frees the slot. Call after Chrome has quit."""
+        try:
+            size = folder_size(self.path)
+            if size > size_cap_mb * 1024 * 1024:
+                for subfolder in CACHE_SUBFOLDERS:
+                    shutil.rmtree(os.path.join(self.path, subfolder), ignore_errors=True)
+                log_func(f"Profile {self.name}: {size // (1024 * 1024)} MB exceeded the {size_cap_mb} MB cap; cache cleared "
+                         f"({folder_size(self.path) // (1024 * 1024)} MB left).")
+        except OSError as e:
+            log_func(f"Warning: Could not check size of profile {self.name}: {e}")
+        try:
+            os.remove(self.lock_path)
+        except OSError:
+            pass
+
+
+def _try_lock(lock_path):
+    """Creates the lock file atomically. Takes over a lock whose owner process is gone."""
+    for _ in range(2):
+        try:
+            fd = os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            try:
+                with open(lock_path) as lock_file:
+                    owner_pid = int(lock_file.read().split()[0])
+            except (OSError, ValueError, IndexError):
+                owner_pid = 0
+            if owner_pid and _pid_alive(owner_pid):
+                return False
+            try:
+                os.remove(lock_path) # Stale: owner crashed
+            except OSError:
+                return False
+            continue
+        with os.fdopen(fd, 'w') as lock_file:
+            lock_file.write(f"{os.getpid()} {threading.get_ident()} {time.strftime('%Y-%m-%d %H:%M:%S')}\n")
+        return True
+    return False
+
+
+def acquire_profile_slot(base_dir, log_func=print):
+    """
+    Locks the first free slot folder under base_dir and returns it as a ProfileSlot,
+    or None when every slot is taken (the caller then uses a temporary profile).
+    Slots are held per WebAutomation, so two workers never share a user-data-dir.
+    """
+    with _acquire_lock:
+        os.makedirs(base_dir, exist_ok=True)
+        for slot_num in range(1, MAX_PROFILE_SLOTS + 1):
+            slot_path = os.path.join(base_dir, f"slot_{slot_num}")
+            os.makedirs(slot_path, exist_ok=True)
+            lock_path = os.path.join(slot_path, LOCK_FILE_NAME)
+            if not _try_lock(lock_path):
+                continue
+            for name in CHROME_SINGLETON_FILES:
+                try:
+                    os.remove(os.path.join(slot_path, name))
+                except OSError:
+                    pass
+            log_func(f"Using persistent browser profile {os.path.basename(slot_path)} ({folder_size(slot_path) // (1024 * 1024)} MB).")
+            return ProfileSlot(slot_path, lock_path)
+    log_func(f"Warning: All {MAX_PROFILE_SLOTS} browser profile slots are in use. Using a temporary profile.")
+    return None
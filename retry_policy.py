@@ -0,0 +1,128 @@
+# filename: retry_policy.py
+import random
+import threading
+from contextlib import contextmanager
+
+from selenium.common.exceptions import WebDriverException
+
+from deadlines import DeadlineExceeded
+
+# --- Failure Classes ---
+RETRY_TRANSIENT = 'transient'  # Worth another attempt after a backoff (timeouts, stale elements, intercepted clicks, 502)
+RETRY_SESSION = 'session'      # Browser or login is gone: retrying in place cannot help, the chunk loop renews/rebuilds it
+RETRY_PERMANENT = 'permanent'  # The same input fails the same way (invalid range, ASP.NET error page, time budget used up)
+
+SESSION_ERROR_MARKERS = ("invalid session id", "session deleted", "unable to connect to renderer", "no such window", "chrome not reachable")
+
+
+def classify_failure(error):
+    """
+    Failure class of an exception. Exceptions can declare theirs in a `retry_class` attribute
+    (DownloadFailedException does); WebDriver errors are transient unless the session is gone,
+    and anything else is permanent.
+    """
+    if isinstance(error, DeadlineExceeded):
+        return RETRY_SESSION if 'watchdog' in str(error).lower() else RETRY_PERMANENT
+    declared = getattr(error, 'retry_class', None)
+    if declared:
+        return declared
+    if isinstance(error, WebDriverException):
+        message = str(error).lower()
+        return RETRY_SESSION if any(marker in message for marker in SESSION_ERROR_MARKERS) else RETRY_TRANSIENT
+    return RETRY_PERMANENT
+
+
+class RetryPolicy:
+    """Attempts and jittered exponential backoff of one retry loop."""
+
+    def __init__(self, attempts, delay, backoff=2.0, max_delay=120, jitter=0.5):
+        """
+        Args:
+            attempts (int): Total attempts, the first one included.
+            delay (float): Backoff before the first retry (seconds).
+            backoff (float, optional): Factor applied to the delay for every further retry.
+            max_delay (float, optional): Upper bound of a single backoff.
+            jitter (float, optional): Each backoff is shortened by a random part of up to this fraction,
+                so parallel workers that failed together do not retry in lockstep.
+        """
+        self.attempts = max(1, int(attempts))
+        self.delay = delay
+        self.backoff = backoff
+        self.max_delay = max_delay
+        self.jitter = jitter
+
+    def backoff_delay(self, retry_num):
+        """Seconds to wait before retry number retry_num (1 = first retry)."""
+        delay = min(self.max_delay, self.delay * self.backoff ** (retry_num - 1))
+        return delay * (1 - self.jitter * random.random())
+
+
+class RetryBudget:
+    """
+    Retries a run may spend, in total and per chunk, shared by every retry loop (method
+    decorators, click retries, error page refreshes) so nested loops cannot multiply. Chunk
+    counts are kept per thread, so the pool's workers can share one budget for the run total.
+    Also totals the wall time lost to retries (failed attempts plus backoff) per label.
+    """
+
+    def __init__(self, run_limit=0, chunk_limit=0):
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.configure(run_limit, chunk_limit)
+        self.reset()
+
+    def configure(self, run_limit=0, chunk_limit=0):
+        """Sets the limits (0 = unlimited)."""
+        self.run_limit = max(0, int(run_limit or 0))
+        self.chunk_limit = max(0, int(chunk_limit or 0))
+
+    def reset(self):
+        with self._lock:
+            self.retries = 0
+            self.refused = 0
+            self.seconds = 0.0
+            self.by_label = {} # label -> [retries, seconds]
+
+    @contextmanager
+    def chunk(self):
+        """Counts retries made by this thread inside the block against the per-chunk limit."""
+        outer = getattr(self._local, 'chunk_retries', None)
+        if outer is None:
+            self._local.chunk_retries = 0
+        try:
+            yield self
+        finally:
+            if outer is None:
+                self._local.chunk_retries = None
+
+    def take(self, label):
+        """Claims one retry for label. Returns None when granted, else why the budget refuses it."""
+        chunk_retries = getattr(self._local, 'chunk_retries', None)
+        with self._lock:
+            if self.run_limit and self.retries >= self.run_limit:
+                reason = f"run retry budget of {self.run_limit} used up"
+            elif self.chunk_limit and chunk_retries is not None and chunk_retries >= self.chunk_limit:
+                reason = f"chunk retry budget of {self.chunk_limit} used up"
+            else:
+                self.retries += 1
+                self.by_label.setdefault(label, [0, 0.0])[0] += 1
+                if chunk_retries is not None:
+                    self._local.chunk_retries = chunk_retries + 1
+                return None
+            self.refused += 1
+        return reason
+
+    def record_time(self, label, seconds):
+        """Adds wall time lost to a retry of label (the failed attempt and the backoff after it)."""
+        with self._lock:
+            self.seconds += seconds
+            self.by_label.setdefault(label, [0, 0.0])[1] += seconds
+
+    def describe(self, top=3):
+        with self._lock:
+            biggest = sorted(self.by_label.items(), key=lambda item: item[1][1], reverse=True)[:top]
+            retries, refused, seconds = self.retries, self.refused, self.seconds
+        details = ", ".join(f"{label} {label_seconds:.1f}s/{count}x" for label, (count, label_seconds) in biggest)
+        return (f"{retries} retries, {seconds:.1f}s lost to failed attempts and backoff"
+                + (f", {refused} retries refused by the budget" if refused else "")
+                + (f" (largest: {details})" if details else ""))
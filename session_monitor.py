@@ -0,0 +1,183 @@
+# filename: session_monitor.py
+import time
+import threading
+from urllib.parse import urlsplit
+
+import requests # type: ignore
+
+HEALTH_OK = 'ok'
+HEALTH_EXPIRING = 'expiring'   # Re-authenticate before the next chunk
+HEALTH_EXPIRED = 'expired'     # Keepalive was sent to the login page
+PING_TIMEOUT = 15              # Seconds for one keepalive request
+# Cookies whose expiry limits the login (ASP.NET forms / identity auth and session cookies)
+AUTH_COOKIE_HINTS = ('aspxauth', 'aspnet', 'auth', 'session')
+
+
+class SessionMonitor:
+    """
+    Background keepalive and expiry tracker for one worker's portal login.
+
+    A daemon thread sends a cheap GET (headers only, no redirects) to keepalive_url with
+    the browser's cookies whenever the browser has not talked to the portal for
+    keepalive_interval seconds, e.g. during a long download wait. This keeps the portal's
+    idle timeout from expiring. The thread never touches the WebDriver. Cookies the server
+    renews on a ping are queued and written back to the browser by the worker thread
+    (take_renewed_cookies).
+
+    health() is a cached state computed from the last ping/activity and the known expiry,
+    so the worker does not need a WebDriver round-trip to decide whether to re-authenticate.
+    """
+
+    def __init__(self, keepalive_url, keepalive_interval=240, idle_timeout=1200, max_age=0,
+                 reauth_margin=120, user_agent=None, log_func=print):
+        """
+        Args:
+            keepalive_url (str): Light portal page to ping (a redirect away from it means the login expired).
+            keepalive_interval (int, optional): Idle seconds before a ping is sent.
+            idle_timeout (int, optional): Portal idle timeout in seconds (expiry if nothing is sent).
+            max_age (int, optional): Absolute login lifetime in seconds (0 = unknown, use cookie expiry only).
+            reauth_margin (int, optional): Report 'expiring' this many seconds before the expected expiry.
+            user_agent (str, optional): Sent with pings (use the browser's).
+            log_func (function, optional): Status callback.
+        """
+        self.keepalive_url = keepalive_url
+        self.keepalive_interval = max(30, int(keepalive_interval))
+        self.idle_timeout = int(idle_timeout)
+        self.max_age = int(max_age)
+        self.reauth_margin = int(reauth_margin)
+        self._log = log_func
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self.session = requests.Session()
+        if user_agent:
+            self.session.headers['User-Agent'] = user_agent
+        self.authenticated_at = None
+        self.last_activity = None
+        self.cookie_expires_at = None
+        self._expired = False
+        self._renewed_cookies = []
+        self.ping_count = 0
+
+    # --- Lifecycle ---
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="session-keepalive", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=PING_TIMEOUT + 1)
+            self._thread = None
+        self.session.close()
+
+    # --- State Updates (worker thread) ---
+    def set_authenticated(self, cookies):
+        """Starts tracking a fresh login. cookies are CDP cookie dicts from the browser."""
+        with self._lock:
+            now = time.time()
+            self.authenticated_at = now
+            self.last_activity = now
+            self._expired = False
+            self._renewed_cookies = []
+            self._load_cookies(cookies)
+
+    def _load_cookies(self, cookies):
+        self.session.cookies.clear()
+        expiries = []
+        for cookie in cookies:
+            self.session.cookies.set(cookie['name'], cookie['value'], domain=cookie.get('domain'), path=cookie.get('path', '/'))
+            expires = cookie.get('expires') or cookie.get('expiry') or 0
+            if expires > 0 and not cookie.get('session') and any(hint in cookie['name'].lower() for hint in AUTH_COOKIE_HINTS):
+                expiries.append(expires)
+        self.cookie_expires_at = min(expiries) if expiries else None
+
+    def set_log_func(self, log_func):
+        """Redirects keepalive messages, e.g. to the pool's log while the browser sits idle."""
+        self._log = log_func
+
+    def mark_active(self):
+        """The browser just loaded a portal page (counts as activity for the idle timeout)."""
+        with self._lock:
+            self.last_activity = time.time()
+
+    def take_renewed_cookies(self):
+        """Cookies the server re-issued on a keepalive ping, to be written into the browser."""
+        with self._lock:
+            cookies, self._renewed_cookies = self._renewed_cookies, []
+        return cookies
+
+    # --- Health ---
+    def expires_at(self):
+        """Earliest expected expiry (epoch seconds) of the login, or None when not logged in."""
+        with self._lock:
+            if self.authenticated_at is None:
+                return None
+            candidates = [self.last_activity + self.idle_timeout]
+            if self.max_age:
+                candidates.append(self.authenticated_at + self.max_age)
+            if self.cookie_expires_at:
+                candidates.append(self.cookie_expires_at)
+            return min(candidates)
+
+    def health(self):
+        """HEALTH_OK, HEALTH_EXPIRING (renew before the next chunk) or HEALTH_EXPIRED."""
+        if self._expired:
+            return HEALTH_EXPIRED
+        expires_at = self.expires_at()
+        if expires_at is None:
+            return HEALTH_EXPIRED
+        if expires_at - time.time() <= self.reauth_margin:
+            return HEALTH_EXPIRING
+        return HEALTH_OK
+
+    def describe(self):
+        expires_at = self.expires_at()
+        remaining = f"{(expires_at - time.time()) / 60:.0f} min left" if expires_at else "not logged in"
+        return f"{self.health()}, {remaining}, {self.ping_count} keepalive ping(s)"
+
+    # --- Keepalive Thread ---
+    def _run(self):
+        while not self._stop.wait(min(30, self.keepalive_interval)):
+            with self._lock:
+                due = (self.authenticated_at is not None and not self._expired
+                       and time.time() - self.last_activity >= self.keepalive_interval)
+            if due:
+                try:
+                    self._ping()
+                except Exception as e: # A failing log callback must not end the keepalive thread
+                    print(f"Warning: Session keepalive error: {type(e).__name__} - {e}")
+
+    def _ping(self):
+        try:
+            response = self.session.get(self.keepalive_url, allow_redirects=False, stream=True, timeout=PING_TIMEOUT)
+            response.close() # Headers are enough
+        except requests.RequestException as e:
+            self._log(f"Session keepalive failed ({type(e).__name__}). Will retry.")
+            return
+        self.ping_count += 1
+        location = response.headers.get('Location', '')
+        if response.status_code in (401, 403) or (response.is_redirect and self._leaves_page(location)):
+            with self._lock:
+                self._expired = True
+            self._log(f"Session keepalive: portal login expired (HTTP {response.status_code}).")
+            return
+        with self._lock:
+            self.last_activity = time.time()
+            for cookie in response.cookies:
+                renewed = {'name': cookie.name, 'value': cookie.value, 'path': cookie.path or '/', 'secure': bool(cookie.secure)}
+                if cookie.domain:
+                    renewed['domain'] = cookie.domain
+                else:
+                    renewed['url'] = self.keepalive_url # Host-only cookie
+                if cookie.expires:
+                    renewed['expires'] = cookie.expires
+                self._renewed_cookies.append(renewed)
+                if cookie.expires and any(hint in cookie.name.lower() for hint in AUTH_COOKIE_HINTS):
+                    self.cookie_expires_at = cookie.expires
+
+    def _leaves_page(self, location):
+        return urlsplit(location).path.lower() != urlsplit(self.keepalive_url).path.lower()
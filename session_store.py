@@ -0,0 +1,94 @@
+# filename: session_store.py
+import os
+import json
+import time
+import hashlib
+import threading
+
+from cryptography.fernet import Fernet, InvalidToken # type: ignore
+
+KEY_FILE_NAME = '.session_key'
+SESSION_FILE_SUFFIX = '.session'
+
+
+class SessionStore:
+    """
+    Encrypted on-disk store of authenticated portal sessions, one file per account.
+    A session is the browser state captured after login: all cookies (CDP
+    Network.getAllCookies) plus localStorage/sessionStorage of the portal origin.
+    Files are Fernet tokens; the token timestamp gives the TTL, so an expired
+    session is dropped on load without being decrypted.
+    """
+
+    def __init__(self, store_dir, ttl_seconds=3600, key=None):
+        """
+        Args:
+            store_dir (str): Folder holding the session files (and the generated key file).
+            ttl_seconds (int, optional): Sessions older than this are treated as expired.
+            key (str|bytes, optional): Fernet key. Defaults to the SESSION_STORE_KEY env var,
+                then to a key file created once in store_dir (readable by the owner only).
+        """
+        self.store_dir = store_dir
+        self.ttl_seconds = int(ttl_seconds)
+        self._lock = threading.Lock()
+        os.makedirs(store_dir, exist_ok=True)
+        self._fernet = Fernet(key or os.getenv('SESSION_STORE_KEY') or self._load_or_create_key())
+
+    def _load_or_create_key(self):
+        key_path = os.path.join(self.store_dir, KEY_FILE_NAME)
+        try:
+            fd = os.open(key_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o600)
+        except FileExistsError:
+            with open(key_path, 'rb') as key_file:
+                return key_file.read().strip()
+        key = Fernet.generate_key()
+        with os.fdopen(fd, 'wb') as key_file:
+            key_file.write(key)
+        return key
+
+    def _path(self, account):
+        # Hashed so the account name is not visible in the folder listing
+        digest = hashlib.sha256(account.strip().lower().encode('utf-8')).hexdigest()[:32]
+        return os.path.join(self.store_dir, digest + SESSION_FILE_SUFFIX)
+
+    def save(self, account, state):
+        """Encrypts and stores a session state dict for account (atomic replace)."""
+        payload = json.dumps({'account': account, 'saved_at': time.time(), 'state': state}).encode('utf-8')
+        token = self._fernet.encrypt(payload)
+        path = self._path(account)
+        with self._lock:
+            temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(temp_path, 'wb') as session_file:
+                session_file.write(token)
+            os.replace(temp_path, path)
+
+    def load(self, account):
+        """
+        Returns (state, age_seconds) for account, or (None, None) if there is no session,
+        it is older than the TTL, or it cannot be decrypted (the file is then removed).
+        """
+        path = self._path(account)
+        with self._lock:
+            try:
+                with open(path, 'rb') as session_file:
+                    token = session_file.read()
+            except OSError:
+                return None, None
+            try:
+                payload = json.loads(self._fernet.decrypt(token, ttl=self.ttl_seconds))
+            except (InvalidToken, ValueError):
+                self._remove(path)
+                return None, None
+        return payload['state'], time.time() - payload['saved_at']
+
+    def discard(self, account):
+        """Deletes the stored session for account (e.g. after it failed the validity probe)."""
+        with self._lock:
+            self._remove(self._path(account))
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
@@ -25,6 +25,16 @@ document.addEventListener('DOMContentLoaded', () => {
     const form = document.getElementById('download-form');
     const emailInput = document.getElementById('email');
     const passwordInput = document.getElementById('password');
+    const workersInput = document.getElementById('workers');
+    const tabsInput = document.getElementById('tabs');
+    const pipelineInput = document.getElementById('pipeline');
+    const reusePageInput = document.getElementById('reuse-page');
+    const fastFillInput = document.getElementById('fast-fill');
+    const httpExportInput = document.getElementById('http-export');
+    const leanProfileInput = document.getElementById('lean-profile');
+    const persistentProfileInput = document.getElementById('persistent-profile');
+    const reuseSessionInput = document.getElementById('reuse-session');
+    const sessionKeepaliveInput = document.getElementById('session-keepalive');
     const reportTableBody = document.querySelector("#report-table tbody");
     const addRowButton = document.getElementById('add-row-button');
     const reportTable = document.getElementById("report-table");
@@ -482,7 +492,7 @@ document.addEventListener('DOMContentLoaded', () => {
                         <td><select name="report_type[]" class="report-type-select" required></select></td>
                         <td><input type="date" name="from_date[]" required></td>
                         <td><input type="date" name="to_date[]" required></td>
-                        <td><input type="text" name="chunk_size[]" value="5" placeholder="E.g.: 5 or month"></td>
+                        <td><input type="text" name="chunk_size[]" value="5" placeholder="E.g.: 5, month or auto"></td>
                         <td><button type="button" class="remove-row-button" title="Remove this report row"><i class="fas fa-trash-alt"></i></button></td>
                     `;
                     reportTableBody.appendChild(row);
@@ -609,10 +619,30 @@ document.addEventListener('DOMContentLoaded', () => {
     }
 
     // --- Download Logic ---
+    // Run option checkboxes start at the server's config defaults; only a changed one is sent
+    // (undefined is left out of the JSON), so config/env defaults apply to everything else.
+    function changedRunFlag(input) {
+        return input && input.checked !== input.defaultChecked ? input.checked : undefined;
+    }
+
+    function applyRunFlag(input, value) {
+        if (input) input.checked = value === undefined || value === null || value === '' ? input.defaultChecked : !!value;
+    }
+
     function getCurrentFormData() {
         const configData = {
             email: emailInput ? emailInput.value : '',
             password: passwordInput ? passwordInput.value : '',
+            workers: workersInput ? (workersInput.value.trim() || '1') : '1',
+            tabs: tabsInput && tabsInput.value.trim() !== tabsInput.defaultValue ? (tabsInput.value.trim() || undefined) : undefined,
+            pipeline: changedRunFlag(pipelineInput),
+            reuse_page: changedRunFlag(reusePageInput),
+            fast_fill: changedRunFlag(fastFillInput),
+            http_export: changedRunFlag(httpExportInput),
+            lean_profile: changedRunFlag(leanProfileInput),
+            persistent_profile: changedRunFlag(persistentProfileInput),
+            reuse_session: changedRunFlag(reuseSessionInput),
+            session_keepalive: changedRunFlag(sessionKeepaliveInput),
             reports: [],
             regions: [],
             otp_secret: otpSecretInput ? otpSecretInput.value : '',
@@ -829,7 +859,8 @@ document.addEventListener('DOMContentLoaded', () => {
     function updateSummaryAndChart(logData) {
         const total = logData.length;
         const successCount = logData.filter(e => e['Status'] && String(e['Status']).toLowerCase().startsWith('success')).length;
-        const failedCount = total - successCount;
+        // Empty / Skipped (Known Empty) rows are neither successes nor failures
+        const failedCount = logData.filter(e => e['Status'] && String(e['Status']).toLowerCase().startsWith('fail')).length;
 
         if (totalCountSpan) totalCountSpan.textContent = total;
         if (successCountSpan) successCountSpan.textContent = successCount;
@@ -920,6 +951,16 @@ document.addEventListener('DOMContentLoaded', () => {
         console.log("Applying configuration:", configData);
         if (emailInput) emailInput.value = configData.email || '';
         if (passwordInput) passwordInput.value = configData.password || '';
+        if (workersInput) workersInput.value = configData.workers || '1';
+        if (tabsInput) tabsInput.value = configData.tabs || tabsInput.defaultValue;
+        applyRunFlag(pipelineInput, configData.pipeline);
+        applyRunFlag(reusePageInput, configData.reuse_page);
+        applyRunFlag(fastFillInput, configData.fast_fill);
+        applyRunFlag(httpExportInput, configData.http_export);
+        applyRunFlag(leanProfileInput, configData.lean_profile);
+        applyRunFlag(persistentProfileInput, configData.persistent_profile);
+        applyRunFlag(reuseSessionInput, configData.reuse_session);
+        applyRunFlag(sessionKeepaliveInput, configData.session_keepalive);
         if (otpSecretInput && configData.otp_secret !== undefined) otpSecretInput.value = configData.otp_secret;
         if (driverPathInput && configData.driver_path !== undefined) driverPathInput.value = configData.driver_path;
         if (downloadBasePathInput && configData.download_base_path !== undefined) downloadBasePathInput.value = configData.download_base_path;
@@ -0,0 +1,225 @@
+# filename: tests/test_http_export.py
+import os
+import sys
+import json
+import shutil
+import tempfile
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from http_export import (  # noqa: E402
+    HttpExportEngine, HttpExportRejected, HttpSessionExpired,
+    _FormFieldParser, _filename_from_disposition,
+)
+from logic_download import FROM_DATE_PICKER_ID, TO_DATE_PICKER_ID  # noqa: E402
+
+EXPORT_BUTTON_ID = 'ctl00_MainContent_btnExportCSVDemo'
+
+
+def picker_inputs(picker_id, date_str, display_value):
+    """The hidden/visible inputs a Telerik RadDatePicker renders."""
+    name = picker_id.replace('_', '$')
+    client_state = json.dumps({'validationText': f"{date_str}-00-00-00", 'valueAsString': f"{date_str}-00-00-00",
+                               'lastSetTextBoxValue': display_value, 'enabled': True})
+    return (f'<input id="{picker_id}" name="{name}" type="text" value="{date_str}" />'
+            f'<input id="{picker_id}_dateInput" name="{name}$dateInput" type="text" value="{display_value}" />'
+            f'<input id="{picker_id}_dateInput_ClientState" name="{picker_id}_dateInput_ClientState" type="hidden" '
+            f"value='{client_state}' />")
+
+
+REPORT_PAGE = (
+    '<html><body><form method="post" action="./Report.aspx?r=1" id="form1">'
+    '<input type="hidden" name="__VIEWSTATE" id="__VIEWSTATE" value="vs123" />'
+    '<input type="hidden" name="__EVENTVALIDATION" id="__EVENTVALIDATION" value="ev456" />'
+    '<input type="hidden" name="__EVENTTARGET" id="__EVENTTARGET" value="" />'
+    + picker_inputs(FROM_DATE_PICKER_ID, '2024-01-01', '01/01/2024')
+    + picker_inputs(TO_DATE_PICKER_ID, '2024-01-31', '31/01/2024')
+    + '<input id="ctl00_MainContent_rblType_0" type="radio" name="ctl00$MainContent$rblType" value="X" checked="checked" />'
+    '<input id="ctl00_MainContent_rblType_1" type="radio" name="ctl00$MainContent$rblType" value="N" />'
+    '<input id="chkAll" type="checkbox" name="chkAll" />'
+    '<select name="ddlBranch"><option value="A">A</option><option value="B" selected="selected">B</option></select>'
+    '<textarea name="txtNote">a &amp; b</textarea>'
+    f'<input id="{EXPORT_BUTTON_ID}_input" type="submit" name="ctl00$MainContent$btnExportCSVDemo_input" value="CSV" />'
+    '</form></body></html>'
+)
+
+
+class _ReportHandler(BaseHTTPRequestHandler):
+    """Serves the report form on GET and an attachment (echoing the posted dates) on POST."""
+
+    def do_GET(self):
+        if self.path.startswith('/Login.aspx'):
+            self._send(200, 'text/html', b'<html>login</html>')
+        elif self.path.startswith('/expired'):
+            self.send_response(302)
+            self.send_header('Location', '/Login.aspx')
+            self.end_headers()
+        elif self.path.startswith('/Report.aspx'):
+            self._send(200, 'text/html', REPORT_PAGE.encode('utf-8'))
+        else:
+            self._send(404, 'text/html', b'not found')
+
+    def do_POST(self):
+        form = {key: values[0] for key, values in parse_qs(self.rfile.read(int(self.headers['Content-Length'])).decode('utf-8')).items()}
+        self.server.posts.append(form)
+        if form.get('__VIEWSTATE') != 'vs123':
+            self._send(200, 'text/html', b'<html>validation error</html>')
+            return
+        from_date = form[FROM_DATE_PICKER_ID.replace('_', '$')]
+        body = f"from,to\n{from_date},{form[TO_DATE_PICKER_ID.replace('_', '$')]}\n".encode('utf-8')
+        self._send(200, 'text/csv', body, {'Content-Disposition': f'attachment; filename="report_{from_date}.csv"'})
+
+    def _send(self, status, content_type, body, headers=None):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class FormParsingTests(unittest.TestCase):
+
+    def setUp(self):
+        self.parser = _FormFieldParser()
+        self.parser.feed(REPORT_PAGE)
+
+    def test_collects_successful_controls(self):
+        fields = self.parser.fields
+        self.assertEqual(self.parser.action, './Report.aspx?r=1')
+        self.assertEqual(fields['__VIEWSTATE'], 'vs123')
+        self.assertEqual(fields['ctl00$MainContent$rblType'], 'X') # Only the checked radio
+        self.assertNotIn('chkAll', fields)                         # Unchecked checkbox
+        self.assertEqual(fields['ddlBranch'], 'B')                 # Selected option
+        self.assertEqual(fields['txtNote'], 'a & b')
+        self.assertNotIn('ctl00$MainContent$btnExportCSVDemo_input', fields) # Submit buttons are not posted
+
+    def test_maps_ids_and_radios(self):
+        self.assertEqual(self.parser.names_by_id[FROM_DATE_PICKER_ID], FROM_DATE_PICKER_ID.replace('_', '$'))
+        self.assertEqual(self.parser.radios['ctl00_MainContent_rblType_1'], ('ctl00$MainContent$rblType', 'N'))
+
+    def test_select_without_selected_option_posts_first(self):
+        parser = _FormFieldParser()
+        parser.feed('<form><select name="s"><option value="1">1</option><option value="2">2</option></select></form>')
+        self.assertEqual(parser.fields['s'], '1')
+
+
+class DispositionTests(unittest.TestCase):
+
+    def test_plain_filename(self):
+        self.assertEqual(_filename_from_disposition('attachment; filename="FAF001.csv"'), 'FAF001.csv')
+
+    def test_rfc5987_filename_preferred(self):
+        disposition = "attachment; filename=\"fallback.csv\"; filename*=UTF-8''B%C3%A1o%20c%C3%A1o.csv"
+        self.assertEqual(_filename_from_disposition(disposition), 'Báo cáo.csv')
+
+    def test_path_is_stripped(self):
+        self.assertEqual(_filename_from_disposition('attachment; filename="../../etc/x.csv"'), 'x.csv')
+
+    def test_missing_filename(self):
+        self.assertIsNone(_filename_from_disposition('attachment'))
+
+
+class EngineTests(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = ThreadingHTTPServer(('127.0.0.1', 0), _ReportHandler)
+        cls.server.posts = []
+        cls.base_url = f"http://127.0.0.1:{cls.server.server_address[1]}"
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self):
+        self.server.posts.clear()
+        self.folder = tempfile.mkdtemp()
+        self.engine = HttpExportEngine([{'name': 'ASP.NET_SessionId', 'value': 'abc', 'domain': '127.0.0.1', 'path': '/'}], self.folder, max_workers=2, log_func=lambda message: None)
+        self.parser = _FormFieldParser()
+        self.parser.feed(REPORT_PAGE)
+
+    def tearDown(self):
+        self.engine.close()
+        shutil.rmtree(self.folder, ignore_errors=True)
+
+    def test_set_date_updates_picker_fields(self):
+        fields = dict(self.parser.fields)
+        HttpExportEngine._set_date(fields, self.parser, FROM_DATE_PICKER_ID, '2024-03-05')
+        self.assertEqual(fields[FROM_DATE_PICKER_ID.replace('_', '$')], '2024-03-05')
+        self.assertEqual(fields[FROM_DATE_PICKER_ID.replace('_', '$') + '$dateInput'], '05/03/2024')
+        state = json.loads(fields[f"{FROM_DATE_PICKER_ID}_dateInput_ClientState"])
+        self.assertEqual(state['valueAsString'], '2024-03-05-00-00-00')
+        self.assertEqual(state['lastSetTextBoxValue'], '05/03/2024')
+        self.assertTrue(state['enabled']) # Other client state keys are kept
+
+    def test_build_postback(self):
+        fields = self.engine.build_postback(self.parser, '2024-02-01', '2024-02-10', '001', EXPORT_BUTTON_ID)
+        self.assertEqual(fields['__EVENTTARGET'], 'ctl00$MainContent$btnExportCSVDemo')
+        self.assertEqual(fields['__EVENTARGUMENT'], '')
+        self.assertEqual(fields['ctl00$MainContent$rblType'], 'N') # Variant radio replaces the checked one
+        self.assertEqual(fields[TO_DATE_PICKER_ID.replace('_', '$')], '2024-02-10')
+        self.assertEqual(self.parser.fields['ctl00$MainContent$rblType'], 'X') # Parsed form is not modified
+
+    def test_build_postback_rejects_missing_button(self):
+        with self.assertRaises(HttpExportRejected):
+            self.engine.build_postback(self.parser, '2024-02-01', '2024-02-10', 'generic', 'missing_button')
+
+    def test_reserve_path_picks_free_name(self):
+        open(os.path.join(self.folder, 'report.csv'), 'w').close()
+        first = self.engine._reserve_path('report.csv')
+        second = self.engine._reserve_path('report.csv')
+        self.assertEqual(first, 'report (1).csv')
+        self.assertEqual(second, 'report (2).csv') # The claimed .part of the first counts as taken
+        self.assertTrue(os.path.exists(os.path.join(self.folder, 'report (1).csv.part')))
+
+    def test_export_chunks_downloads_attachments(self):
+        date_ranges = [('2024-01-01', '2024-01-05'), ('2024-01-06', '2024-01-10')]
+        results = self.engine.export_chunks(f"{self.base_url}/Report.aspx?r=1", date_ranges, '004X')
+        self.assertEqual(results, ['report_2024-01-01.csv', 'report_2024-01-06.csv'])
+        with open(os.path.join(self.folder, results[1]), encoding='utf-8') as export_file:
+            self.assertEqual(export_file.read(), "from,to\n2024-01-06,2024-01-10\n")
+        self.assertFalse([name for name in os.listdir(self.folder) if name.endswith('.part')])
+        self.assertEqual(len(self.server.posts), 2)
+        self.assertEqual(self.server.posts[0]['__EVENTVALIDATION'], 'ev456')
+
+    def test_export_chunks_logs_from_calling_thread(self):
+        # stream_status_update needs the caller's app context: a log from a pool thread must not happen
+        caller = threading.current_thread()
+        messages = []
+
+        def log_func(message):
+            if threading.current_thread() is not caller:
+                raise RuntimeError("Working outside of application context.")
+            messages.append(message)
+
+        self.engine.log_func = log_func
+        results = self.engine.export_chunks(f"{self.base_url}/Report.aspx?r=1", [('2024-01-01', '2024-01-05'), ('2024-01-06', '2024-01-10')], 'generic')
+        self.assertEqual(results, ['report_2024-01-01.csv', 'report_2024-01-06.csv'])
+        self.assertEqual(len([message for message in messages if 'saved' in message]), 2)
+
+    def test_chunk_without_attachment_is_rejected(self):
+        post_url, parser = self.engine.load_form(f"{self.base_url}/Report.aspx?r=1")
+        fields = self.engine.build_postback(parser, '2024-01-01', '2024-01-05', 'generic', EXPORT_BUTTON_ID)
+        fields['__VIEWSTATE'] = 'stale'
+        with self.assertRaises(HttpExportRejected):
+            self.engine.export_chunk(post_url, post_url, fields, '2024-01-01', '2024-01-05')
+        self.assertEqual(os.listdir(self.folder), [])
+
+    def test_redirect_to_login_is_session_expired(self):
+        with self.assertRaises(HttpSessionExpired):
+            self.engine.load_form(f"{self.base_url}/expired")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -34,23 +34,53 @@ def save_configs(configs):
     except (IOError, AttributeError, KeyError) as e:
         print(f"Error saving config file via current_app ({config_path}): {e}")
 
+_status_app = None # App of the last in-context update; used by threads that have no app context (watchdog, keepalive, HTTP export)
+
 def stream_status_update(message):
-    """Adds a message to the status list via app context."""
+    """Adds a message to the status list via app context (or the last known app when called from a background thread)."""
+    global _status_app
     # --- Remove global usage ---
     # global status_messages, lock 
     try:
-        # Access lock and status_messages list from the app context
-        lock = current_app.lock
-        status_list = current_app.status_messages 
-        
+        try:
+            app = current_app._get_current_object()
+            _status_app = app
+        except RuntimeError: # Working outside of application context
+            app = _status_app
         timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         full_message = f"{timestamp}: {message}"
         print(full_message) # Log to console
-        with lock:
+        if app is None:
+            return
+        # Access lock and status_messages list from the app
+        with app.lock:
+            status_list = app.status_messages 
             status_list.append(full_message)
             MAX_LOG_MESSAGES = 500 # Consider moving to app.config
             if len(status_list) > MAX_LOG_MESSAGES:
                 # Modify the list attached to the app directly
-                current_app.status_messages = status_list[-MAX_LOG_MESSAGES:] 
+                app.status_messages = status_list[-MAX_LOG_MESSAGES:] 
     except (AttributeError, KeyError) as e:
-         print(f"Error updating status via current_app: {e}. App context might not be available.") 
\ No newline at end of file
+         print(f"Error updating status via current_app: {e}. App context might not be available.") 
+
+# --- JSON State Files ---
+def load_json_file(path):
+    """Reads a JSON state file (caches, registry). Returns {} when it is missing or unreadable."""
+    try:
+        with open(path, 'r', encoding='utf-8') as state_file:
+            return json.load(state_file)
+    except (OSError, ValueError):
+        return {}
+
+def save_json_file(path, data, log_func=print, description="state file", sort_keys=False):
+    """
+    Writes a JSON state file atomically (temp file + rename), so a concurrent reader or
+    a crash mid-write never leaves a truncated file. Write errors are logged, not raised.
+    """
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(temp_path, 'w', encoding='utf-8') as state_file:
+            json.dump(data, state_file, indent=1, sort_keys=sort_keys)
+        os.replace(temp_path, path)
+    except OSError as e:
+        log_func(f"Warning: Could not write {description} '{path}': {e}")